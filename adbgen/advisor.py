@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+
+import doctest
+import sqlite3
+from schema import Table
+from ddl import table_ddl
+
+def load_tables(json_object):
+    return [Table(name, json_object[name]) for name in json_object['tables']]
+
+def create_database(tables):
+    '''
+    An in-memory SQLite database holding the tables and indexes the
+    generated classes create.
+    '''
+    db = sqlite3.connect(':memory:')
+    for table in tables:
+        for sql in table_ddl(table):
+            db.execute(sql)
+    return db
+
+def order_term(table, term):
+    '''
+    >>> print order_term(Table('dot'), 'added_at desc')
+    added_at_column DESC
+    '''
+    parts = term.split()
+    column = '%s_column' % (parts[0]) if parts[0] != '_id' else '_id'
+    return ' '.join([column] + [part.upper() for part in parts[1:]])
+
+def pattern_sql(table, pattern):
+    '''
+    The query of a declared access pattern (``"queries"`` of a table):
+    equality on ``where``, a range on ``range`` and ``order_by``.
+
+    >>> print pattern_sql(Table('content'), {'where': ['album_id'], 'range': 'added_at', 'order_by': ['type desc']})
+    SELECT * FROM content_table WHERE album_id_column = ? AND added_at_column > ? ORDER BY type_column DESC
+    '''
+    conditions = ['%s_column = ?' % (column) for column in pattern.get('where', [])]
+    if pattern.get('range'):
+        conditions.append('%s_column > ?' % (pattern['range']))
+    sql = 'SELECT * FROM %s' % (table.sql_name)
+    if conditions:
+        sql += ' WHERE ' + ' AND '.join(conditions)
+    if pattern.get('order_by'):
+        sql += ' ORDER BY ' + ', '.join(order_term(table, term) for term in pattern['order_by'])
+    return sql
+
+def query_plan(db, sql):
+    return [row[-1] for row in db.execute('EXPLAIN QUERY PLAN ' + sql, [None] * sql.count('?'))]
+
+def proposed_index(pattern):
+    '''
+    Equality columns first, then the sort columns, or the range column when
+    there is no sort to serve.
+
+    >>> print json_index(proposed_index({'where': ['album_id'], 'range': 'added_at', 'order_by': ['type']}))
+    {"columns": ["album_id", "type"], "unique": false}
+    '''
+    columns = list(pattern.get('where', []))
+    if pattern.get('order_by'):
+        columns += [term.split()[0] for term in pattern['order_by']]
+    elif pattern.get('range'):
+        columns.append(pattern['range'])
+    return {'columns': columns, 'unique': False}
+
+def check_patterns(db, table):
+    problems = []
+    for pattern in table.definition.get('queries') or []:
+        sql = pattern_sql(table, pattern)
+        plan = query_plan(db, sql)
+        full_scan = bool(pattern.get('where') or pattern.get('range')) and \
+            any(detail.startswith('SCAN') for detail in plan)
+        temp_sort = any('USE TEMP B-TREE' in detail for detail in plan)
+        if full_scan or temp_sort:
+            problems.append({'table': table.name, 'query': sql, 'plan': plan,
+                'full_scan': full_scan, 'temp_sort': temp_sort, 'proposal': proposed_index(pattern)})
+    return problems
+
+def table_indexes(db, table):
+    '''
+    Every index SQLite keeps for the table, including the ones behind
+    unique columns, as ``(name, unique, [column names])``.
+    '''
+    names = dict((column.sql_name, column.name) for column in table.columns)
+    indexes = []
+    for row in db.execute('PRAGMA index_list(%s)' % (table.sql_name)):
+        name, unique = str(row[1]), bool(row[2])
+        columns = [names.get(info[2], str(info[2])) for info in db.execute('PRAGMA index_info(%s)' % (name))]
+        indexes.append((name, unique, columns))
+    return sorted(indexes)
+
+def redundant_indexes(db, table):
+    '''
+    Indexes whose columns are a prefix of another index (or the same
+    columns): any lookup they serve the other one serves too. A unique index
+    only counts as redundant when the other one enforces the same
+    uniqueness. The indexes SQLite creates for unique columns are never
+    reported, as they cannot be dropped.
+
+    >>> table = Table('content', {'columns': [{'name': 'album_id', 'type': 'integer'}, {'name': 'type', 'type': 'integer'}],
+    ...     'indexes': [{'columns': ['album_id']}, {'columns': ['album_id', 'type']}]})
+    >>> print redundant_indexes(create_database([table]), table)
+    [('content__album_id__idx', 'content__album_id__type__idx')]
+    '''
+    indexes = table_indexes(db, table)
+    redundant = []
+    for name, unique, columns in indexes:
+        if name.startswith('sqlite_autoindex_'):
+            continue
+        for other, other_unique, other_columns in indexes:
+            if other == name or other_columns[:len(columns)] != columns:
+                continue
+            if unique and not (other_unique and other_columns == columns):
+                continue
+            if other_columns == columns and (other, name) in redundant:
+                continue
+            redundant.append((name, other))
+            break
+    return redundant
+
+def advise(json_object):
+    '''
+    Check the declared access patterns of every table and look for
+    redundant indexes.
+
+    >>> report = advise({'tables': ['content'], 'content': {'columns': [{'name': 'album_id', 'type': 'integer'},
+    ...     {'name': 'added_at', 'type': 'timestamp'}], 'queries': [{'where': ['album_id'], 'order_by': ['added_at']}]}})
+    >>> print [(problem['full_scan'], problem['temp_sort'], json_index(problem['proposal'])) for problem in report['queries']]
+    [(True, True, '{"columns": ["album_id", "added_at"], "unique": false}')]
+    '''
+    tables = load_tables(json_object)
+    db = create_database(tables)
+    report = {'queries': [], 'redundant': []}
+    for table in tables:
+        report['queries'] += check_patterns(db, table)
+        report['redundant'] += [(table.name, name, other) for name, other in redundant_indexes(db, table)]
+    db.close()
+    return report
+
+def format_report(report):
+    '''
+    >>> print format_report({'queries': [], 'redundant': [('content', 'content__album_id__idx', 'content__album_id__type__idx')]})
+    content: index content__album_id__idx is covered by content__album_id__type__idx
+    0 query problem(s), 1 redundant index(es)
+    '''
+    lines = []
+    for problem in report['queries']:
+        issues = [issue for issue, found in (('full scan', problem['full_scan']),
+            ('temp b-tree sort', problem['temp_sort'])) if found]
+        lines.append('%s: %s: %s' % (problem['table'], ' and '.join(issues), problem['query']))
+        lines += ['    plan: %s' % (detail) for detail in problem['plan']]
+        lines.append('    proposed index: %s' % (json_index(problem['proposal'])))
+    for table, name, other in report['redundant']:
+        lines.append('%s: index %s is covered by %s' % (table, name, other))
+    lines.append('%d query problem(s), %d redundant index(es)' % (len(report['queries']), len(report['redundant'])))
+    return '\n'.join(lines)
+
+def json_index(index):
+    return '{"columns": [%s], "unique": %s}' % (', '.join('"%s"' % (column) for column in index['columns']),
+        'true' if index['unique'] else 'false')
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import csv
+import doctest
+import json
+import os
+import sqlite3
+from schema import Table, Settings
+from ddl import table_ddl
+from migration import schema_version
+
+def seed_path(json_object, path):
+    base_dir = getattr(json_object, 'base_dir', None)
+    return os.path.join(base_dir, path) if base_dir else path
+
+def read_seed(path):
+    '''
+    Rows of a seed file: CSV with a header row (empty cells are NULL) or
+    JSON lines, one object per row.
+    '''
+    with open(path, 'rb') as fin:
+        if path.endswith('.jsonl'):
+            return [json.loads(line) for line in fin if line.strip()]
+        return [dict((key, value if value != '' else None) for key, value in row.items())
+            for row in csv.DictReader(fin)]
+
+def insert_rows(db, table, rows):
+    '''
+    Insert the rows, keyed by column name (or _id), with one statement per
+    distinct set of columns.
+
+    >>> table = Table('dot', {'columns': [{'name': 'x', 'type': 'integer'}, {'name': 'label', 'type': 'text'}]})
+    >>> db = sqlite3.connect(':memory:')
+    >>> for sql in table_ddl(table):
+    ...     _ = db.execute(sql)
+    >>> insert_rows(db, table, [{'_id': 7, 'x': 1}, {'x': 2, 'label': 'b'}])
+    2
+    >>> print db.execute('SELECT _id, x_column, label_column FROM dot_table').fetchall()
+    [(7, 1, None), (8, 2, u'b')]
+    >>> insert_rows(db, table, [{'y': 1}])
+    Traceback (most recent call last):
+    ...
+    ValueError: dot has no column y
+    '''
+    sql_names = dict((column.name, column.sql_name) for column in table.columns)
+    sql_names['_id'] = '_id'
+    groups = {}
+    for row in rows:
+        for key in row:
+            if key not in sql_names:
+                raise ValueError('%s has no column %s' % (table.name, key))
+        keys = tuple(sorted(row))
+        groups.setdefault(keys, []).append(tuple(row[key] for key in keys))
+    for keys, values in groups.items():
+        sql = 'INSERT INTO %s (%s) VALUES (%s)' % (table.sql_name,
+            ', '.join(sql_names[key] for key in keys), ', '.join('?' * len(keys)))
+        db.executemany(sql, values)
+    return len(rows)
+
+def build_asset(json_object, file_name):
+    '''
+    Create the database the generated classes would create, load the seed
+    file of every table (``"seed"``) in one transaction, ANALYZE and VACUUM
+    it and stamp it with the schema version, so the open helper opens it
+    without calling onCreate. Returns the number of rows per table.
+    '''
+    temp_name = '%s.%d.tmp' % (file_name, os.getpid())
+    if os.path.exists(temp_name):
+        os.remove(temp_name)
+    settings = Settings(json_object.get('settings'))
+    counts = {}
+    db = sqlite3.connect(temp_name, isolation_level=None)
+    try:
+        for pragma in settings.pragmas:
+            if pragma.startswith('page_size'):
+                db.execute('PRAGMA %s' % (pragma))
+        tables = [Table(name, json_object[name]) for name in json_object['tables']]
+        db.execute('BEGIN')
+        for table in tables:
+            for sql in table_ddl(table):
+                db.execute(sql)
+            seed = table.definition.get('seed')
+            if seed:
+                counts[table.name] = insert_rows(db, table, read_seed(seed_path(json_object, seed)))
+        db.execute('COMMIT')
+        db.execute('ANALYZE')
+        db.execute('PRAGMA user_version = %d' % (schema_version(json_object)))
+        db.execute('VACUUM')
+    except:
+        db.close()
+        os.remove(temp_name)
+        raise
+    db.close()
+    os.rename(temp_name, file_name)
+    return counts
+
+def format_counts(file_name, counts):
+    '''
+    >>> print format_counts('omu.db', {'album': 2, 'content': 10})
+    omu.db: album 2 rows, content 10 rows
+    '''
+    return '%s: %s' % (file_name, ', '.join('%s %d rows' % (table, counts[table]) for table in sorted(counts))
+        or 'no seed data')
+
+if __name__ == '__main__':
+    doctest.testmod()
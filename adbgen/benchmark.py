@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+import doctest
+import json
+import multiprocessing
+import platform
+import random
+import resource
+import time
+from writer import SourceWriter
+from schema import Table
+from runner import table_generators, global_generators
+
+DEFAULT_SIZES = [10, 100, 1000, 5000]
+COLUMN_TYPES = ['varchar(100)', 'varchar(1024)', 'text', 'integer', 'timestamp', 'real', 'float', 'boolean']
+COLUMN_OPTIONS = [None, None, None, 'unique', 'not null', 'default current_timestamp']
+
+class NullStream(object):
+    '''
+    Stream that drops everything, so only generation cost is measured
+    '''
+
+    def write(self, fragment):
+        pass
+
+def synthesize_schema(tables, max_columns=12, max_indexes=3, seed=0):
+    '''
+    Build a schema with the same shape as schema.js
+
+    >>> schema = synthesize_schema(3, seed=1)
+    >>> print schema['tables']
+    ['table_0', 'table_1', 'table_2']
+    >>> sorted(schema['table_0'].keys())
+    ['columns', 'indexes']
+    >>> synthesize_schema(3, seed=1) == schema
+    True
+    '''
+    rng = random.Random(seed)
+    json_object = {
+        'package': 'com.example.benchmark',
+        'prefix': 'bench',
+        'database': 'bench.db',
+        'tables': ['table_%d' % (i) for i in range(tables)],
+    }
+    for table in json_object['tables']:
+        columns = []
+        for i in range(rng.randint(1, max_columns)):
+            column = {'name': 'column_%d' % (i), 'type': rng.choice(COLUMN_TYPES)}
+            options = rng.choice(COLUMN_OPTIONS)
+            if options:
+                column['options'] = options
+            columns.append(column)
+        indexes = []
+        for i in range(rng.randint(0, max_indexes)):
+            names = [column['name'] for column in columns]
+            indexes.append({
+                'columns': rng.sample(names, rng.randint(1, min(2, len(names)))),
+                'unique': rng.random() < 0.2
+            })
+        json_object[table] = {'columns': columns, 'indexes': indexes}
+    return json_object
+
+def new_stats():
+    return {'seconds': 0.0, 'bytes': 0, 'calls': 0}
+
+def add_stats(stats, seconds, size):
+    stats['seconds'] += seconds
+    stats['bytes'] += size
+    stats['calls'] += 1
+
+def measure(generators, results):
+    '''
+    Emit every generator into a null stream, timing each class and each of
+    its string_attrs sections.
+    '''
+    for generator in generators:
+        name = generator.__class__.__name__
+        result = results.setdefault(name, dict(new_stats(), sections={}))
+        sections = result['sections']
+        writer = SourceWriter(NullStream())
+
+        def emit_section(writer, string_attr, emit_section=generator.emit_section):
+            start, size = time.time(), writer.bytes_written
+            emit_section(writer, string_attr)
+            add_stats(sections.setdefault(string_attr, new_stats()),
+                time.time() - start, writer.bytes_written - size)
+        generator.emit_section = emit_section
+
+        start = time.time()
+        generator.emit(writer)
+        add_stats(result, time.time() - start, writer.bytes_written)
+
+def run_size(tables, max_columns, max_indexes, seed):
+    '''
+    Benchmark one synthesized schema size
+
+    >>> result = run_size(10, 4, 2, 0)
+    >>> print result['tables'], sorted(result['generators'])
+    10 ['AndroidContentProvider', 'AndroidModelBase', 'AndroidOpenHelper', 'AndroidTable']
+    >>> result['generators']['AndroidTable']['calls']
+    10
+    '''
+    json_object = synthesize_schema(tables, max_columns, max_indexes, seed)
+    result = {
+        'tables': tables,
+        'columns': sum(len(json_object[table]['columns']) for table in json_object['tables']),
+        'indexes': sum(len(json_object[table]['indexes']) for table in json_object['tables']),
+        'generators': {},
+    }
+
+    start = time.time()
+    compiled = [Table(table, json_object[table]) for table in json_object['tables']]
+    result['compile_seconds'] = time.time() - start
+
+    start = time.time()
+    for table in compiled:
+        measure(table_generators(json_object['package'], table), result['generators'])
+    measure(global_generators(json_object, compiled), result['generators'])
+    result['seconds'] = time.time() - start
+    result['bytes'] = sum(generator['bytes'] for generator in result['generators'].values())
+    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return result
+
+def run_size_isolated(args):
+    # a fresh process per size, so peak_rss_kb belongs to that size only
+    return run_size(*args)
+
+def run(sizes=DEFAULT_SIZES, max_columns=12, max_indexes=3, seed=0):
+    results = []
+    for tables in sizes:
+        pool = multiprocessing.Pool(1, maxtasksperchild=1)
+        try:
+            results.append(pool.apply(run_size_isolated, ((tables, max_columns, max_indexes, seed),)))
+        finally:
+            pool.close()
+            pool.join()
+    return {
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'parameters': {'max_columns': max_columns, 'max_indexes': max_indexes, 'seed': seed},
+        'results': results,
+    }
+
+def summary(report, baseline=None):
+    '''
+    One line per schema size and generator, with the change against a
+    previous report when one is given.
+
+    >>> report = {'results': [{'tables': 10, 'seconds': 0.5, 'bytes': 100, 'peak_rss_kb': 9000,
+    ...     'generators': {'AndroidTable': {'seconds': 0.2, 'bytes': 60, 'calls': 10}}}]}
+    >>> baseline = {'results': [{'tables': 10, 'seconds': 0.25, 'bytes': 100, 'peak_rss_kb': 9000,
+    ...     'generators': {'AndroidTable': {'seconds': 0.1, 'bytes': 60, 'calls': 10}}}]}
+    >>> print summary(report, baseline)
+    tables  generator                   seconds       bytes  peak kb  change
+        10  (all)                        0.5000         100     9000   +100%
+        10  AndroidTable                 0.2000          60        -   +100%
+    '''
+    previous = {}
+    for result in (baseline or {}).get('results', []):
+        previous[(result['tables'], '(all)')] = result['seconds']
+        for name, stats in result['generators'].items():
+            previous[(result['tables'], name)] = stats['seconds']
+
+    def change(key, seconds):
+        if not previous.get(key):
+            return ''
+        return '%+.0f%%' % ((seconds / previous[key] - 1) * 100)
+
+    lines = ['%6s  %-24s %10s %11s %8s  %s' % ('tables', 'generator', 'seconds', 'bytes', 'peak kb', 'change')]
+    for result in report['results']:
+        lines.append('%6d  %-24s %10.4f %11d %8d  %6s' % (result['tables'], '(all)', result['seconds'],
+            result['bytes'], result['peak_rss_kb'], change((result['tables'], '(all)'), result['seconds'])))
+        for name in sorted(result['generators']):
+            stats = result['generators'][name]
+            lines.append('%6d  %-24s %10.4f %11d %8s  %6s' % (result['tables'], name, stats['seconds'],
+                stats['bytes'], '-', change((result['tables'], name), stats['seconds'])))
+    return '\n'.join(line.rstrip() for line in lines)
+
+def save(report, file_name):
+    with open(file_name, 'w') as fout:
+        json.dump(report, fout, indent=4, sort_keys=True)
+
+def load(file_name):
+    with open(file_name) as fin:
+        return json.load(fin)
+
+if __name__ == '__main__':
+    doctest.testmod()
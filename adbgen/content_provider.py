@@ -2,7 +2,160 @@
 
 import doctest
 from generator import AndroidClassGenerator
+from writer import SourceWriter, streaming
 from utils import camel_variable_name
+from schema import as_table
+from template import CaseTemplate
+
+INSERT_CASES = CaseTemplate('''\
+        case %(constant)sS:
+            id = %(class_name)sTable.statements(database).insert(values);
+            if (id != -1) {
+                notifyChange(uri);
+            }
+            return Uri.parse("content://" + AUTHORITY + "/" + %(constant)s_PATH + "/" + id);\n''')
+
+BULK_INSERT_CASES = CaseTemplate('''\
+            case %(constant)sS:
+                %(class_name)sTable.Statements %(variable)sStatements = %(class_name)sTable.statements(database);
+                for (ContentValues row : values) {
+                    if (%(variable)sStatements.insert(row) != -1) {
+                        inserted++;
+                    }
+                }
+                break;\n''')
+
+QUERY_CASES = CaseTemplate('''\
+        case %(constant)sS:
+            queryBuilder.setTables(%(class_name)sTable.TABLE_NAME);
+            break;
+        case %(constant)s_ID:
+            queryBuilder.setTables(%(class_name)sTable.TABLE_NAME);
+            queryBuilder.appendWhere(BaseColumns._ID + "=" + uri.getLastPathSegment());
+            break;\n''')
+
+UPDATE_CASES = CaseTemplate('''\
+        case %(constant)sS:
+            rowsUpdated = database.update(%(class_name)sTable.TABLE_NAME, values, selection, selectionArgs);
+            break;
+        case %(constant)s_ID:
+            String %(variable)sId = uri.getLastPathSegment();
+            if (TextUtils.isEmpty(selection)) {
+                rowsUpdated = %(class_name)sTable.statements(database).updateById(Long.parseLong(%(variable)sId), values);
+            } else {
+                rowsUpdated = database.update(%(class_name)sTable.TABLE_NAME, values, BaseColumns._ID + "=" + %(variable)sId + " AND " + selection, selectionArgs);
+            }
+            break;\n''')
+
+DELETE_CASES = CaseTemplate('''\
+        case %(constant)sS:
+            rowsDeleted = database.delete(%(class_name)sTable.TABLE_NAME, selection, selectionArgs);
+            break;
+        case %(constant)s_ID:
+            String %(variable)sId = uri.getLastPathSegment();
+            if (TextUtils.isEmpty(selection)) {
+                rowsDeleted = %(class_name)sTable.statements(database).deleteById(Long.parseLong(%(variable)sId));
+            } else {
+                rowsDeleted = database.delete(%(class_name)sTable.TABLE_NAME, BaseColumns._ID + "=" + %(variable)sId + " AND " + selection, selectionArgs);
+            }
+            break;\n''')
+
+# per relation (see relation_fields): a nested URI listing the rows of a
+# parent (albums/#/contents) and a URI joining the parent (contents_with_album)
+RELATION_PROPERTIES = '''\
+    private static final int %(relation)s_%(table)sS = %(nested_code)d;
+    private static final int %(table)sS_WITH_%(relation)s = %(joined_code)d;
+    public static final String %(table)s_WITH_%(relation)s_PATH = "%(name)ss_with_%(relation_name)s";
+    public static final Uri %(table)s_WITH_%(relation)s_CONTENT_URI = Uri.parse("content://" + AUTHORITY + "/" + %(table)s_WITH_%(relation)s_PATH);
+    private static final String %(table)s_WITH_%(relation)s_TABLES = %(class_name)sTable.TABLE_NAME
+        + " LEFT OUTER JOIN " + %(parent_class)sTable.TABLE_NAME + " AS %(relation_name)s ON ("
+        + %(class_name)sTable.TABLE_NAME + "." + %(class_name)sTable.%(columns_class)s.%(column)s + " = %(relation_name)s." + BaseColumns._ID + ")";
+    private static final Map<String, String> %(table)s_WITH_%(relation)s_PROJECTION_MAP = new HashMap<String, String>();
+    static {
+        sURIMatcher.addURI(AUTHORITY, %(parent)s_PATH + "/#/" + %(segment)s, %(relation)s_%(table)sS);
+        sURIMatcher.addURI(AUTHORITY, %(table)s_WITH_%(relation)s_PATH, %(table)sS_WITH_%(relation)s);
+        putColumns(%(table)s_WITH_%(relation)s_PROJECTION_MAP, %(class_name)sTable.TABLE_NAME, "", %(class_name)sTable.PROJECTION_ALL);
+        putColumns(%(table)s_WITH_%(relation)s_PROJECTION_MAP, "%(relation_name)s", %(class_name)sTable.%(prefix)s, %(parent_class)sTable.PROJECTION_ALL);
+    }
+
+    public static Uri %(uri_method)s(long %(id_variable)s) {
+        return Uri.withAppendedPath(%(parent)s_CONTENT_URI, %(id_variable)s + "/" + %(segment)s);
+    }
+
+'''
+
+RELATION_QUERY_CASES = '''\
+        case %(relation)s_%(table)sS:
+            queryBuilder.setTables(%(class_name)sTable.TABLE_NAME);
+            queryBuilder.appendWhere(%(class_name)sTable.%(columns_class)s.%(column)s + "=" + uri.getPathSegments().get(1));
+            notificationUri = %(table)s_CONTENT_URI;
+            break;
+        case %(table)sS_WITH_%(relation)s:
+            queryBuilder.setTables(%(table)s_WITH_%(relation)s_TABLES);
+            queryBuilder.setProjectionMap(%(table)s_WITH_%(relation)s_PROJECTION_MAP);
+            idColumn = %(class_name)sTable.TABLE_NAME + "." + BaseColumns._ID;
+            notificationUri = AUTHORITY_URI;
+            break;\n'''
+
+# per table with "fts" columns: a search URI taking the full-text query in
+# the search parameter (contents/search?q=...)
+SEARCH_PROPERTIES = '''\
+    private static final int %(constant)s_SEARCH = %(code)d;
+    public static final Uri %(constant)s_SEARCH_URI = Uri.withAppendedPath(%(constant)s_CONTENT_URI, "search");
+    static {
+        sURIMatcher.addURI(AUTHORITY, %(constant)s_PATH + "/search", %(constant)s_SEARCH);
+    }
+
+    public static Uri %(variable)sSearchUri(String query) {
+        return %(constant)s_SEARCH_URI.buildUpon().appendQueryParameter(QUERY_PARAMETER_SEARCH, query).build();
+    }
+
+'''
+
+SEARCH_QUERY_CASES = CaseTemplate('''\
+        case %(constant)s_SEARCH:
+            String %(variable)sSearch = uri.getQueryParameter(QUERY_PARAMETER_SEARCH);
+            if (TextUtils.isEmpty(%(variable)sSearch)) {
+                throw new IllegalArgumentException("Missing search query: " + uri);
+            }
+            queryBuilder.setTables(%(class_name)sTable.TABLE_NAME);
+            queryBuilder.appendWhere(BaseColumns._ID + " IN (SELECT rowid FROM " + %(class_name)sTable.FTS_TABLE_NAME
+                + " WHERE " + %(class_name)sTable.FTS_TABLE_NAME + " MATCH ");
+            queryBuilder.appendWhereEscapeString(%(variable)sSearch);
+            queryBuilder.appendWhere(")");
+            notificationUri = %(constant)s_CONTENT_URI;
+            break;\n''')
+
+def relation_fields(table, column):
+    '''
+    >>> from schema import Table
+    >>> table = Table('content', {'columns': [{'name': 'album_id', 'type': 'integer', 'references': 'album'}]})
+    >>> fields = relation_fields(table, table.relations[0])
+    >>> print fields['segment'], fields['uri_method'], fields['id_variable']
+    CONTENT_PATH albumContentsUri albumId
+    '''
+    segment = '%s_PATH' % (table.constant)
+    if column.relation != column.references:
+        segment += ' + "_by_%s"' % (column.relation)
+    return {'table': table.constant, 'class_name': table.class_name, 'columns_class': table.columns_class,
+        'name': table.name, 'column': column.constant, 'parent': column.references.upper(),
+        'parent_class': column.references_class, 'relation': column.relation.upper(),
+        'relation_name': column.relation, 'prefix': column.prefix_constant, 'segment': segment,
+        'uri_method': '%sUri' % (camel_variable_name('%s_%ss' % (column.relation, table.name))),
+        'id_variable': column.variable}
+
+def reference_errors(tables):
+    '''
+    ``[(table name, message), ...]`` for the columns referencing a table
+    that is not in the schema.
+
+    >>> from schema import Table
+    >>> print reference_errors([Table('content', {'columns': [{'name': 'album_id', 'type': 'integer', 'references': 'album'}]})])
+    [('content', 'album_id references unknown table album')]
+    '''
+    names = set(table.name for table in tables)
+    return [(table.name, '%s references unknown table %s' % (column.name, column.references))
+        for table in tables for column in table.relations if column.references not in names]
 
 class AndroidContentProvider(AndroidClassGenerator):
     '''
@@ -12,10 +165,16 @@ class AndroidContentProvider(AndroidClassGenerator):
     def __init__(self, package, prefix, tables):
         self.package = package
         self.prefix = prefix
-        self.tables = tables
-        self.file_name = '%sProvider.java' % (camel_variable_name(self.prefix, upper=True))
+        self.tables = [as_table(table) for table in tables]
+        self.relations = [(table, column) for table in self.tables for column in table.relations]
+        self.searchable = [table for table in self.tables if table.fts_columns]
+        for table, message in reference_errors(self.tables):
+            raise ValueError('%s.%s' % (table, message))
+        self.prefix_class = camel_variable_name(self.prefix, upper=True)
+        self.file_name = '%sProvider.java' % (self.prefix_class)
         self.string_attrs = ['properties_string', 'create_string', 'get_type_string', 'insert_string', 
-            'query_string', 'delete_string', 'update_string']
+            'bulk_insert_string', 'query_string', 'delete_string', 'update_string',
+            'apply_batch_string', 'call_string']
                 
     def header_string(self):
         '''
@@ -24,27 +183,46 @@ class AndroidContentProvider(AndroidClassGenerator):
         package com.example.test;
         <BLANKLINE>
         import android.content.ContentProvider;
+        import android.content.ContentProviderOperation;
+        import android.content.ContentProviderResult;
         import android.content.ContentResolver;
         import android.content.ContentValues;
+        import android.content.OperationApplicationException;
         import android.content.UriMatcher;
         import android.database.Cursor;
         import android.database.sqlite.SQLiteDatabase;
         import android.database.sqlite.SQLiteQueryBuilder;
         import android.net.Uri;
+        import android.os.Bundle;
         import android.text.TextUtils;
         import android.provider.BaseColumns;
+        <BLANKLINE>
+        import java.util.ArrayList;
+        import java.util.LinkedHashSet;
+        import java.util.Set;
         '''
         result  = 'package %s;\n\n' % (self.package)
         result += 'import android.content.ContentProvider;\n'
+        result += 'import android.content.ContentProviderOperation;\n'
+        result += 'import android.content.ContentProviderResult;\n'
         result += 'import android.content.ContentResolver;\n'
         result += 'import android.content.ContentValues;\n'
+        result += 'import android.content.OperationApplicationException;\n'
         result += 'import android.content.UriMatcher;\n'
         result += 'import android.database.Cursor;\n'
         result += 'import android.database.sqlite.SQLiteDatabase;\n'
         result += 'import android.database.sqlite.SQLiteQueryBuilder;\n'
         result += 'import android.net.Uri;\n'
+        result += 'import android.os.Bundle;\n'
         result += 'import android.text.TextUtils;\n'
-        result += 'import android.provider.BaseColumns;'
+        result += 'import android.provider.BaseColumns;\n\n'
+        result += 'import java.util.ArrayList;\n'
+        if self.relations:
+            result += 'import java.util.HashMap;\n'
+        result += 'import java.util.LinkedHashSet;\n'
+        if self.relations:
+            result += 'import java.util.Map;\n'
+        result += 'import java.util.Set;'
         return result
         
     def class_string(self):
@@ -55,18 +233,30 @@ class AndroidContentProvider(AndroidClassGenerator):
         %s
         }
         '''
-        result  = 'public class %sProvider extends ContentProvider {\n' % (self.prefix)
+        result  = 'public class %sProvider extends ContentProvider {\n' % (self.prefix_class)
         result += '%s\n'
         result += '}'
         return result
         
-    def properties_string(self):
+    @streaming
+    def properties_string(self, writer=None):
         '''
         >>> provider = AndroidContentProvider('com.example.test', 'Test', ['user', 'group'])
         >>> print provider.properties_string()
             private TestOpenHelper dbHelper;
             private SQLiteDatabase database;
+            private final ThreadLocal<Set<Uri>> pendingNotifications = new ThreadLocal<Set<Uri>>();
+            private final Set<Uri> deferredNotifications = new LinkedHashSet<Uri>();
             public static final String AUTHORITY = "com.example.test.contentprovider";
+            public static final Uri AUTHORITY_URI = Uri.parse("content://" + AUTHORITY);
+            public static final String QUERY_PARAMETER_LIMIT = "limit";
+            public static final String QUERY_PARAMETER_OFFSET = "offset";
+            public static final String QUERY_PARAMETER_AFTER_ID = "after_id";
+            public static final String QUERY_PARAMETER_COUNT = "count";
+            public static final String QUERY_PARAMETER_DEFER_NOTIFY = "defer_notify";
+            public static final String METHOD_FLUSH_NOTIFICATIONS = "flush_notifications";
+            private static final String TRUE = "true";
+            private static final String[] COUNT_PROJECTION = { "COUNT(*) AS " + BaseColumns._COUNT };
             private static final UriMatcher sURIMatcher = new UriMatcher(UriMatcher.NO_MATCH);
         <BLANKLINE>
             private static final int USERS = 1001;
@@ -94,25 +284,53 @@ class AndroidContentProvider(AndroidClassGenerator):
         <BLANKLINE>
         '''
         auto_id = 1000
-        result  = '    private %sOpenHelper dbHelper;\n' % (self.prefix)
-        result += '    private SQLiteDatabase database;\n'
-        result += '    public static final String AUTHORITY = "%s.contentprovider";\n' % (self.package)
-        result += '    private static final UriMatcher sURIMatcher = new UriMatcher(UriMatcher.NO_MATCH);\n\n'
+        out = writer or SourceWriter()
+        out.write('    private %sOpenHelper dbHelper;\n' % (self.prefix_class))
+        out.write('    private SQLiteDatabase database;\n')
+        out.write('    private final ThreadLocal<Set<Uri>> pendingNotifications = new ThreadLocal<Set<Uri>>();\n')
+        out.write('    private final Set<Uri> deferredNotifications = new LinkedHashSet<Uri>();\n')
+        out.write('    public static final String AUTHORITY = "%s.contentprovider";\n' % (self.package))
+        out.write('    public static final Uri AUTHORITY_URI = Uri.parse("content://" + AUTHORITY);\n')
+        out.write('    public static final String QUERY_PARAMETER_LIMIT = "limit";\n')
+        out.write('    public static final String QUERY_PARAMETER_OFFSET = "offset";\n')
+        out.write('    public static final String QUERY_PARAMETER_AFTER_ID = "after_id";\n')
+        out.write('    public static final String QUERY_PARAMETER_COUNT = "count";\n')
+        out.write('    public static final String QUERY_PARAMETER_DEFER_NOTIFY = "defer_notify";\n')
+        if self.searchable:
+            out.write('    public static final String QUERY_PARAMETER_SEARCH = "q";\n')
+        out.write('    public static final String METHOD_FLUSH_NOTIFICATIONS = "flush_notifications";\n')
+        out.write('    private static final String TRUE = "true";\n')
+        out.write('    private static final String[] COUNT_PROJECTION = { "COUNT(*) AS " + BaseColumns._COUNT };\n')
+        out.write('    private static final UriMatcher sURIMatcher = new UriMatcher(UriMatcher.NO_MATCH);\n\n')
         for table in self.tables:
             auto_id += 1
-            result += '    private static final int %sS = %d;\n' % (table.upper(), auto_id)
+            out.write('    private static final int %sS = %d;\n' % (table.constant, auto_id))
             auto_id += 1
-            result += '    private static final int %s_ID = %d;\n' % (table.upper(), auto_id)
-            result += '    public static final String %s_PATH = "%ss";\n' % (table.upper(), table)
-            result += '    public static final Uri %s_CONTENT_URI = Uri.parse("content://" + AUTHORITY + "/" + %s_PATH);\n' % (table.upper(), table.upper())
-            result += '    public static final String %s_CONTENT_TYPE = ContentResolver.CURSOR_DIR_BASE_TYPE + "/%ss";\n' % (table.upper(), table)
-            result += '    public static final String %s_CONTENT_ITEM_TYPE = ContentResolver.CURSOR_ITEM_BASE_TYPE + "/%s";\n' % (table.upper(), table)
-            result += '    static {\n'
-            result += '        sURIMatcher.addURI(AUTHORITY, %s_PATH, %sS);\n' % (table.upper(), table.upper())
-            result += '        sURIMatcher.addURI(AUTHORITY, %s_PATH + "/#", %s_ID);\n' % (table.upper(), table.upper())
-            result += '    }\n'
-            result += '\n'
-        return result
+            out.write('    private static final int %s_ID = %d;\n' % (table.constant, auto_id))
+            out.write('    public static final String %s_PATH = "%ss";\n' % (table.constant, table.name))
+            out.write('    public static final Uri %s_CONTENT_URI = Uri.parse("content://" + AUTHORITY + "/" + %s_PATH);\n' % (table.constant, table.constant))
+            out.write('    public static final String %s_CONTENT_TYPE = ContentResolver.CURSOR_DIR_BASE_TYPE + "/%ss";\n' % (table.constant, table.name))
+            out.write('    public static final String %s_CONTENT_ITEM_TYPE = ContentResolver.CURSOR_ITEM_BASE_TYPE + "/%s";\n' % (table.constant, table.name))
+            out.write('    static {\n')
+            out.write('        sURIMatcher.addURI(AUTHORITY, %s_PATH, %sS);\n' % (table.constant, table.constant))
+            out.write('        sURIMatcher.addURI(AUTHORITY, %s_PATH + "/#", %s_ID);\n' % (table.constant, table.constant))
+            out.write('    }\n')
+            out.write('\n')
+        for table, column in self.relations:
+            fields = relation_fields(table, column)
+            fields['nested_code'], fields['joined_code'] = auto_id + 1, auto_id + 2
+            auto_id += 2
+            out.write(RELATION_PROPERTIES % fields)
+        for table in self.searchable:
+            auto_id += 1
+            out.write(SEARCH_PROPERTIES % {'constant': table.constant, 'variable': table.variable, 'code': auto_id})
+        if self.relations:
+            out.write('    private static void putColumns(Map<String, String> map, String table, String prefix, String[] columns) {\n')
+            out.write('        for (String column : columns) {\n')
+            out.write('            map.put(prefix + column, table + "." + column + " AS " + prefix + column);\n')
+            out.write('        }\n')
+            out.write('    }\n\n')
+        return out.getvalue()
     
     def create_string(self):
         '''
@@ -127,13 +345,14 @@ class AndroidContentProvider(AndroidClassGenerator):
         '''
         result  = '    @Override\n'
         result += '    public boolean onCreate() {\n'
-        result += '        dbHelper = new %sOpenHelper(getContext());\n' % (self.prefix)
+        result += '        dbHelper = new %sOpenHelper(getContext());\n' % (self.prefix_class)
         result += '        database = dbHelper.getWritableDatabase();\n'
         result += '        return true;\n'
         result += '    }'
         return result
         
-    def get_type_string(self):
+    @streaming
+    def get_type_string(self, writer=None):
         '''
         >>> provider = AndroidContentProvider('com.example.test', 'test', ['user', 'group'])
         >>> print provider.get_type_string()
@@ -153,30 +372,33 @@ class AndroidContentProvider(AndroidClassGenerator):
                 return null;
             }
         '''
-        result  = '    @Override\n'
-        result += '    public String getType(Uri uri) {\n'
-        result += '        int uriType = sURIMatcher.match(uri);\n'
-        result += '        switch (uriType) {\n'
+        out = writer or SourceWriter()
+        out.write('    @Override\n')
+        out.write('    public String getType(Uri uri) {\n')
+        out.write('        int uriType = sURIMatcher.match(uri);\n')
+        out.write('        switch (uriType) {\n')
         for table in self.tables:
-            result += '        case %sS:\n' % (table.upper())
-            result += '            return %s_CONTENT_TYPE;\n' % (table.upper())
-            result += '        case %s_ID:\n' % (table.upper())
-            result += '            return %s_CONTENT_ITEM_TYPE;\n' % (table.upper())            
-        result += '        }\n'
-        result += '        return null;\n'
-        result += '    }'
-        return result
+            out.write('        case %sS:\n' % (table.constant))
+            out.write('            return %s_CONTENT_TYPE;\n' % (table.constant))
+            out.write('        case %s_ID:\n' % (table.constant))
+            out.write('            return %s_CONTENT_ITEM_TYPE;\n' % (table.constant))
+        for table, column in self.relations:
+            out.write('        case %s_%sS:\n' % (column.relation.upper(), table.constant))
+            out.write('        case %sS_WITH_%s:\n' % (table.constant, column.relation.upper()))
+            out.write('            return %s_CONTENT_TYPE;\n' % (table.constant))
+        for table in self.searchable:
+            out.write('        case %s_SEARCH:\n' % (table.constant))
+            out.write('            return %s_CONTENT_TYPE;\n' % (table.constant))
+        out.write('        }\n')
+        out.write('        return null;\n')
+        out.write('    }')
+        return out.getvalue()
         
     def insert_cases_string(self, table):
-        result = '''\
-        case %sS:
-            id = database.insert(%sTable.TABLE_NAME, null, values);
-            getContext().getContentResolver().notifyChange(uri, null);
-            return Uri.parse("content://" + AUTHORITY + "/" + %s_PATH + "/" + id);\n''' % \
-                (table.upper(), camel_variable_name(table, upper=True), table.upper())
-        return result    
+        return INSERT_CASES.render(table)
         
-    def insert_string(self):
+    @streaming
+    def insert_string(self, writer=None):
         '''
         >>> provider = AndroidContentProvider('com.example.test', 'test', ['user', 'group'])
         >>> print provider.insert_string()
@@ -186,12 +408,16 @@ class AndroidContentProvider(AndroidClassGenerator):
                 long id = 0;
                 switch (uriType) {
                 case USERS:
-                    id = database.insert(UserTable.TABLE_NAME, null, values);
-                    getContext().getContentResolver().notifyChange(uri, null);
+                    id = UserTable.statements(database).insert(values);
+                    if (id != -1) {
+                        notifyChange(uri);
+                    }
                     return Uri.parse("content://" + AUTHORITY + "/" + USER_PATH + "/" + id);
                 case GROUPS:
-                    id = database.insert(GroupTable.TABLE_NAME, null, values);
-                    getContext().getContentResolver().notifyChange(uri, null);
+                    id = GroupTable.statements(database).insert(values);
+                    if (id != -1) {
+                        notifyChange(uri);
+                    }
                     return Uri.parse("content://" + AUTHORITY + "/" + GROUP_PATH + "/" + id);
                 default:
                     throw new IllegalArgumentException("Unknown URI: " + uri);
@@ -209,30 +435,92 @@ class AndroidContentProvider(AndroidClassGenerator):
             throw new IllegalArgumentException("Unknown URI: " + uri);
         }
     }'''
-        cases = ''
-        for table in self.tables:
-            cases += self.insert_cases_string(table)
-        return result % (cases.rstrip())
+        out = writer or SourceWriter()
+        out.write_template(result, INSERT_CASES.render_all(self.tables))
+        return out.getvalue()
         
-    def query_cases_string(self, table):
+    def bulk_insert_cases_string(self, table):
+        return BULK_INSERT_CASES.render(table)
+        
+    @streaming
+    def bulk_insert_string(self, writer=None):
+        '''
+        Insert all rows in one transaction through the compiled INSERT of the
+        table, and notify once at the end.
+
+        >>> provider = AndroidContentProvider('com.example.test', 'test', ['user'])
+        >>> print provider.bulk_insert_string()
+            @Override
+            public int bulkInsert(Uri uri, ContentValues[] values) {
+                int uriType = sURIMatcher.match(uri);
+                int inserted = 0;
+                database.beginTransaction();
+                try {
+                    switch (uriType) {
+                    case USERS:
+                        UserTable.Statements userStatements = UserTable.statements(database);
+                        for (ContentValues row : values) {
+                            if (userStatements.insert(row) != -1) {
+                                inserted++;
+                            }
+                        }
+                        break;
+                    default:
+                        throw new IllegalArgumentException("Unknown URI: " + uri);
+                    }
+                    database.setTransactionSuccessful();
+                } finally {
+                    database.endTransaction();
+                }
+                if (inserted > 0) {
+                    notifyChange(uri);
+                }
+                return inserted;
+            }
+        '''
         result = '''\
-        case %sS:
-            queryBuilder.setTables(%sTable.TABLE_NAME);
-            break;
-        case %s_ID:
-            queryBuilder.setTables(%sTable.TABLE_NAME);
-            queryBuilder.appendWhere(BaseColumns._ID + "=" + uri.getLastPathSegment());
-            break;\n''' % (table.upper(), camel_variable_name(table, upper=True), table.upper(), camel_variable_name(table, upper=True))
-        return result    
+    @Override
+    public int bulkInsert(Uri uri, ContentValues[] values) {
+        int uriType = sURIMatcher.match(uri);
+        int inserted = 0;
+        database.beginTransaction();
+        try {
+            switch (uriType) {
+%s
+            default:
+                throw new IllegalArgumentException("Unknown URI: " + uri);
+            }
+            database.setTransactionSuccessful();
+        } finally {
+            database.endTransaction();
+        }
+        if (inserted > 0) {
+            notifyChange(uri);
+        }
+        return inserted;
+    }'''
+        out = writer or SourceWriter()
+        out.write_template(result, BULK_INSERT_CASES.render_all(self.tables))
+        return out.getvalue()
         
-    def query_string(self):
+    def query_cases_string(self, table):
+        return QUERY_CASES.render(table)
+        
+    @streaming
+    def query_string(self, writer=None):
         '''
+        Queries honor the limit, offset and after_id (keyset paging on _id)
+        query parameters of the URI; count=true returns a single _count row
+        with the number of matching rows instead.
+
         >>> provider = AndroidContentProvider('com.example.test', 'test', ['user', 'group'])
         >>> print provider.query_string()
             @Override
             public Cursor query(Uri uri, String[] projection, String selection, String[] selectionArgs, String sortOrder) {
                 int uriType = sURIMatcher.match(uri);
                 SQLiteQueryBuilder queryBuilder = new SQLiteQueryBuilder();
+                Uri notificationUri = uri;
+                String idColumn = BaseColumns._ID;
                 switch (uriType) {
                 case USERS:
                     queryBuilder.setTables(UserTable.TABLE_NAME);
@@ -251,49 +539,117 @@ class AndroidContentProvider(AndroidClassGenerator):
                 default:
                     throw new IllegalArgumentException("Unknown URI: " + uri);        
                 }
-                Cursor cursor = queryBuilder.query(database, projection, selection, selectionArgs, null, null, sortOrder);
-                cursor.setNotificationUri(getContext().getContentResolver(), uri);
+                String afterId = uri.getQueryParameter(QUERY_PARAMETER_AFTER_ID);
+                if (afterId != null) {
+                    String keyset = idColumn + ">" + Long.parseLong(afterId);
+                    selection = TextUtils.isEmpty(selection) ? keyset : "(" + selection + ") AND " + keyset;
+                    if (TextUtils.isEmpty(sortOrder)) {
+                        sortOrder = idColumn;
+                    }
+                }
+                String limit = limit(uri);
+                if (TRUE.equals(uri.getQueryParameter(QUERY_PARAMETER_COUNT))) {
+                    projection = COUNT_PROJECTION;
+                    sortOrder = null;
+                    limit = null;
+                }
+                Cursor cursor = queryBuilder.query(database, projection, selection, selectionArgs, null, null, sortOrder, limit);
+                cursor.setNotificationUri(getContext().getContentResolver(), notificationUri);
                 return cursor;
             }
+        <BLANKLINE>
+            private static String limit(Uri uri) {
+                String limit = uri.getQueryParameter(QUERY_PARAMETER_LIMIT);
+                String offset = uri.getQueryParameter(QUERY_PARAMETER_OFFSET);
+                if (limit == null && offset == null) {
+                    return null;
+                }
+                long count = limit == null ? Long.MAX_VALUE : Long.parseLong(limit);
+                return offset == null ? String.valueOf(count) : Long.parseLong(offset) + "," + count;
+            }
+
+        SQLiteQueryBuilder only takes digits in the limit, so an offset without a
+        limit skips the rows and returns all the rest with the largest count:
+
+        >>> import sqlite3
+        >>> db = sqlite3.connect(':memory:')
+        >>> _ = db.executescript('CREATE TABLE user (_id INTEGER PRIMARY KEY); INSERT INTO user VALUES (1);'
+        ...     'INSERT INTO user VALUES (2); INSERT INTO user VALUES (3);')
+        >>> print db.execute('SELECT _id FROM user ORDER BY _id LIMIT 1,%d' % (2 ** 63 - 1)).fetchall()
+        [(2,), (3,)]
+
+        A table with ``"fts"`` columns is searched through its search URI
+        (notes/search?q=...): the FTS table finds the ids, the rows are read
+        from the table by id.
+
+        >>> from schema import Table
+        >>> provider = AndroidContentProvider('com.example.test', 'test', [Table('note',
+        ...     {'columns': [{'name': 'body', 'type': 'text', 'fts': True}]})])
+        >>> print SEARCH_QUERY_CASES.render(provider.searchable[0]),
+                case NOTE_SEARCH:
+                    String noteSearch = uri.getQueryParameter(QUERY_PARAMETER_SEARCH);
+                    if (TextUtils.isEmpty(noteSearch)) {
+                        throw new IllegalArgumentException("Missing search query: " + uri);
+                    }
+                    queryBuilder.setTables(NoteTable.TABLE_NAME);
+                    queryBuilder.appendWhere(BaseColumns._ID + " IN (SELECT rowid FROM " + NoteTable.FTS_TABLE_NAME
+                        + " WHERE " + NoteTable.FTS_TABLE_NAME + " MATCH ");
+                    queryBuilder.appendWhereEscapeString(noteSearch);
+                    queryBuilder.appendWhere(")");
+                    notificationUri = NOTE_CONTENT_URI;
+                    break;
         '''
         result = '''\
     @Override
     public Cursor query(Uri uri, String[] projection, String selection, String[] selectionArgs, String sortOrder) {
         int uriType = sURIMatcher.match(uri);
         SQLiteQueryBuilder queryBuilder = new SQLiteQueryBuilder();
+        Uri notificationUri = uri;
+        String idColumn = BaseColumns._ID;
         switch (uriType) {
 %s
         default:
             throw new IllegalArgumentException("Unknown URI: " + uri);        
         }
-        Cursor cursor = queryBuilder.query(database, projection, selection, selectionArgs, null, null, sortOrder);
-        cursor.setNotificationUri(getContext().getContentResolver(), uri);
+        String afterId = uri.getQueryParameter(QUERY_PARAMETER_AFTER_ID);
+        if (afterId != null) {
+            String keyset = idColumn + ">" + Long.parseLong(afterId);
+            selection = TextUtils.isEmpty(selection) ? keyset : "(" + selection + ") AND " + keyset;
+            if (TextUtils.isEmpty(sortOrder)) {
+                sortOrder = idColumn;
+            }
+        }
+        String limit = limit(uri);
+        if (TRUE.equals(uri.getQueryParameter(QUERY_PARAMETER_COUNT))) {
+            projection = COUNT_PROJECTION;
+            sortOrder = null;
+            limit = null;
+        }
+        Cursor cursor = queryBuilder.query(database, projection, selection, selectionArgs, null, null, sortOrder, limit);
+        cursor.setNotificationUri(getContext().getContentResolver(), notificationUri);
         return cursor;
+    }
+
+    private static String limit(Uri uri) {
+        String limit = uri.getQueryParameter(QUERY_PARAMETER_LIMIT);
+        String offset = uri.getQueryParameter(QUERY_PARAMETER_OFFSET);
+        if (limit == null && offset == null) {
+            return null;
+        }
+        long count = limit == null ? Long.MAX_VALUE : Long.parseLong(limit);
+        return offset == null ? String.valueOf(count) : Long.parseLong(offset) + "," + count;
     }'''
-        cases = ''
-        for table in self.tables:
-            cases += self.query_cases_string(table)
-        return result % (cases.rstrip())
+        out = writer or SourceWriter()
+        relation_cases = [RELATION_QUERY_CASES % relation_fields(table, column) for table, column in self.relations]
+        out.write_template(result, QUERY_CASES.render_all(self.tables) + relation_cases
+            + SEARCH_QUERY_CASES.render_all(self.searchable))
+        return out.getvalue()
         
     def update_cases_string(self, table):
-        result = '''\
-        case %sS:
-            rowsUpdated = database.update(%sTable.TABLE_NAME, values, selection, selectionArgs);
-            break;
-        case %s_ID:
-            String %sId = uri.getLastPathSegment();
-            if (TextUtils.isEmpty(selection)) {
-                rowsUpdated = database.update(%sTable.TABLE_NAME, values, BaseColumns._ID + "=" + %sId, null);
-            } else {
-                rowsUpdated = database.update(%sTable.TABLE_NAME, values, BaseColumns._ID + "=" + %sId + " AND " + selection, selectionArgs);
-            }
-            break;\n''' % (
-                table.upper(), camel_variable_name(table, upper=True), table.upper(), camel_variable_name(table),
-                camel_variable_name(table, upper=True), camel_variable_name(table), camel_variable_name(table, upper=True), camel_variable_name(table)
-            )
-        return result        
+        return UPDATE_CASES.render(table)
         
-    def update_string(self):
+    @streaming
+    def update_string(self, writer=None):
         '''
         >>> provider = AndroidContentProvider('com.example.test', 'test', ['user', 'group'])
         >>> print provider.update_string()
@@ -308,7 +664,7 @@ class AndroidContentProvider(AndroidClassGenerator):
                 case USER_ID:
                     String userId = uri.getLastPathSegment();
                     if (TextUtils.isEmpty(selection)) {
-                        rowsUpdated = database.update(UserTable.TABLE_NAME, values, BaseColumns._ID + "=" + userId, null);
+                        rowsUpdated = UserTable.statements(database).updateById(Long.parseLong(userId), values);
                     } else {
                         rowsUpdated = database.update(UserTable.TABLE_NAME, values, BaseColumns._ID + "=" + userId + " AND " + selection, selectionArgs);
                     }
@@ -319,7 +675,7 @@ class AndroidContentProvider(AndroidClassGenerator):
                 case GROUP_ID:
                     String groupId = uri.getLastPathSegment();
                     if (TextUtils.isEmpty(selection)) {
-                        rowsUpdated = database.update(GroupTable.TABLE_NAME, values, BaseColumns._ID + "=" + groupId, null);
+                        rowsUpdated = GroupTable.statements(database).updateById(Long.parseLong(groupId), values);
                     } else {
                         rowsUpdated = database.update(GroupTable.TABLE_NAME, values, BaseColumns._ID + "=" + groupId + " AND " + selection, selectionArgs);
                     }
@@ -327,7 +683,9 @@ class AndroidContentProvider(AndroidClassGenerator):
                 default:
                     throw new IllegalArgumentException("Unknown URI: " + uri);
                 }
-                getContext().getContentResolver().notifyChange(uri, null);
+                if (rowsUpdated > 0) {
+                    notifyChange(uri);
+                }
                 return rowsUpdated;
             }
         '''
@@ -341,33 +699,20 @@ class AndroidContentProvider(AndroidClassGenerator):
         default:
             throw new IllegalArgumentException("Unknown URI: " + uri);
         }
-        getContext().getContentResolver().notifyChange(uri, null);
+        if (rowsUpdated > 0) {
+            notifyChange(uri);
+        }
         return rowsUpdated;
     }'''
-        cases = ''
-        for table in self.tables:
-            cases += self.update_cases_string(table)
-        return result % (cases.rstrip())
+        out = writer or SourceWriter()
+        out.write_template(result, UPDATE_CASES.render_all(self.tables))
+        return out.getvalue()
 
     def delete_cases_string(self, table):
-        result = '''\
-        case %sS:
-            rowsDeleted = database.delete(%sTable.TABLE_NAME, selection, selectionArgs);
-            break;
-        case %s_ID:
-            String %sId = uri.getLastPathSegment();
-            if (TextUtils.isEmpty(selection)) {
-                rowsDeleted = database.delete(%sTable.TABLE_NAME, BaseColumns._ID + "=" + %sId, null);
-            } else {
-                rowsDeleted = database.delete(%sTable.TABLE_NAME, BaseColumns._ID + "=" + %sId + " AND " + selection, selectionArgs);
-            }
-            break;\n''' % (
-                table.upper(), camel_variable_name(table, upper=True), table.upper(), camel_variable_name(table),
-                camel_variable_name(table, upper=True), camel_variable_name(table), camel_variable_name(table, upper=True), camel_variable_name(table)
-            )
-        return result
+        return DELETE_CASES.render(table)
         
-    def delete_string(self):
+    @streaming
+    def delete_string(self, writer=None):
         '''
         >>> provider = AndroidContentProvider('com.example.test', 'test', ['user', 'group'])
         >>> print provider.delete_string() 
@@ -382,7 +727,7 @@ class AndroidContentProvider(AndroidClassGenerator):
                 case USER_ID:
                     String userId = uri.getLastPathSegment();
                     if (TextUtils.isEmpty(selection)) {
-                        rowsDeleted = database.delete(UserTable.TABLE_NAME, BaseColumns._ID + "=" + userId, null);
+                        rowsDeleted = UserTable.statements(database).deleteById(Long.parseLong(userId));
                     } else {
                         rowsDeleted = database.delete(UserTable.TABLE_NAME, BaseColumns._ID + "=" + userId + " AND " + selection, selectionArgs);
                     }
@@ -393,7 +738,7 @@ class AndroidContentProvider(AndroidClassGenerator):
                 case GROUP_ID:
                     String groupId = uri.getLastPathSegment();
                     if (TextUtils.isEmpty(selection)) {
-                        rowsDeleted = database.delete(GroupTable.TABLE_NAME, BaseColumns._ID + "=" + groupId, null);
+                        rowsDeleted = GroupTable.statements(database).deleteById(Long.parseLong(groupId));
                     } else {
                         rowsDeleted = database.delete(GroupTable.TABLE_NAME, BaseColumns._ID + "=" + groupId + " AND " + selection, selectionArgs);
                     }
@@ -401,7 +746,9 @@ class AndroidContentProvider(AndroidClassGenerator):
                 default:
                     throw new IllegalArgumentException("Unknown URI: " + uri);      
                 }
-                getContext().getContentResolver().notifyChange(uri, null);
+                if (rowsDeleted > 0) {
+                    notifyChange(uri);
+                }
                 return rowsDeleted;
             }
         '''
@@ -415,13 +762,165 @@ class AndroidContentProvider(AndroidClassGenerator):
         default:
             throw new IllegalArgumentException("Unknown URI: " + uri);      
         }
-        getContext().getContentResolver().notifyChange(uri, null);
+        if (rowsDeleted > 0) {
+            notifyChange(uri);
+        }
         return rowsDeleted;
     }'''
-        cases = ''
-        for table in self.tables:
-            cases += self.delete_cases_string(table)
-        return result % (cases.rstrip())
+        out = writer or SourceWriter()
+        out.write_template(result, DELETE_CASES.render_all(self.tables))
+        return out.getvalue()
+        
+    def apply_batch_string(self):
+        '''
+        Run a batch in one transaction, yielding to other threads every
+        BATCH_YIELD_SIZE operations or where the batch allows it. Changes are
+        collected while the batch runs and notified once per URI after commit;
+        when an operation fails, the changes committed at a yield are still
+        notified.
+
+        >>> provider = AndroidContentProvider('com.example.test', 'test', ['user'])
+        >>> print provider.apply_batch_string()
+            private static final int BATCH_YIELD_SIZE = 500;
+        <BLANKLINE>
+            private void notifyChange(Uri uri) {
+                Set<Uri> pending = pendingNotifications.get();
+                if (pending != null) {
+                    pending.add(uri.buildUpon().clearQuery().build());
+                } else if (TRUE.equals(uri.getQueryParameter(QUERY_PARAMETER_DEFER_NOTIFY))) {
+                    synchronized (deferredNotifications) {
+                        deferredNotifications.add(uri.buildUpon().clearQuery().build());
+                    }
+                } else {
+                    getContext().getContentResolver().notifyChange(uri, null);
+                }
+            }
+        <BLANKLINE>
+            @Override
+            public ContentProviderResult[] applyBatch(ArrayList<ContentProviderOperation> operations)
+                    throws OperationApplicationException {
+                Set<Uri> notifications = new LinkedHashSet<Uri>();
+                Set<Uri> committed = new LinkedHashSet<Uri>();
+                ContentProviderResult[] results = new ContentProviderResult[operations.size()];
+                pendingNotifications.set(notifications);
+                database.beginTransaction();
+                try {
+                    for (int i = 0; i < operations.size(); i++) {
+                        ContentProviderOperation operation = operations.get(i);
+                        if (i > 0 && (operation.isYieldAllowed() || i % BATCH_YIELD_SIZE == 0)
+                                && database.yieldIfContendedSafely()) {
+                            // the work so far is committed even if a later operation fails
+                            committed.addAll(notifications);
+                        }
+                        results[i] = operation.apply(this, results, i);
+                    }
+                    database.setTransactionSuccessful();
+                    committed = notifications;
+                } finally {
+                    database.endTransaction();
+                    pendingNotifications.remove();
+                    for (Uri uri : committed) {
+                        getContext().getContentResolver().notifyChange(uri, null);
+                    }
+                }
+                return results;
+            }
+        '''
+        return '''\
+    private static final int BATCH_YIELD_SIZE = 500;
+
+    private void notifyChange(Uri uri) {
+        Set<Uri> pending = pendingNotifications.get();
+        if (pending != null) {
+            pending.add(uri.buildUpon().clearQuery().build());
+        } else if (TRUE.equals(uri.getQueryParameter(QUERY_PARAMETER_DEFER_NOTIFY))) {
+            synchronized (deferredNotifications) {
+                deferredNotifications.add(uri.buildUpon().clearQuery().build());
+            }
+        } else {
+            getContext().getContentResolver().notifyChange(uri, null);
+        }
+    }
+
+    @Override
+    public ContentProviderResult[] applyBatch(ArrayList<ContentProviderOperation> operations)
+            throws OperationApplicationException {
+        Set<Uri> notifications = new LinkedHashSet<Uri>();
+        Set<Uri> committed = new LinkedHashSet<Uri>();
+        ContentProviderResult[] results = new ContentProviderResult[operations.size()];
+        pendingNotifications.set(notifications);
+        database.beginTransaction();
+        try {
+            for (int i = 0; i < operations.size(); i++) {
+                ContentProviderOperation operation = operations.get(i);
+                if (i > 0 && (operation.isYieldAllowed() || i % BATCH_YIELD_SIZE == 0)
+                        && database.yieldIfContendedSafely()) {
+                    // the work so far is committed even if a later operation fails
+                    committed.addAll(notifications);
+                }
+                results[i] = operation.apply(this, results, i);
+            }
+            database.setTransactionSuccessful();
+            committed = notifications;
+        } finally {
+            database.endTransaction();
+            pendingNotifications.remove();
+            for (Uri uri : committed) {
+                getContext().getContentResolver().notifyChange(uri, null);
+            }
+        }
+        return results;
+    }'''
+
+    def call_string(self):
+        '''
+        Writes to a URI with defer_notify=true are notified only when the
+        caller flushes them, once per URI, e.g. at the end of a sync:
+        ``resolver.call(Uri.parse("content://" + AUTHORITY), METHOD_FLUSH_NOTIFICATIONS, null, null)``.
+        Writes that change no rows are never notified.
+
+        >>> provider = AndroidContentProvider('com.example.test', 'test', ['user'])
+        >>> print provider.call_string()
+            @Override
+            public Bundle call(String method, String arg, Bundle extras) {
+                if (METHOD_FLUSH_NOTIFICATIONS.equals(method)) {
+                    flushNotifications();
+                    return null;
+                }
+                return super.call(method, arg, extras);
+            }
+        <BLANKLINE>
+            private void flushNotifications() {
+                Uri[] uris;
+                synchronized (deferredNotifications) {
+                    uris = deferredNotifications.toArray(new Uri[deferredNotifications.size()]);
+                    deferredNotifications.clear();
+                }
+                for (Uri uri : uris) {
+                    getContext().getContentResolver().notifyChange(uri, null);
+                }
+            }
+        '''
+        return '''\
+    @Override
+    public Bundle call(String method, String arg, Bundle extras) {
+        if (METHOD_FLUSH_NOTIFICATIONS.equals(method)) {
+            flushNotifications();
+            return null;
+        }
+        return super.call(method, arg, extras);
+    }
+
+    private void flushNotifications() {
+        Uri[] uris;
+        synchronized (deferredNotifications) {
+            uris = deferredNotifications.toArray(new Uri[deferredNotifications.size()]);
+            deferredNotifications.clear();
+        }
+        for (Uri uri : uris) {
+            getContext().getContentResolver().notifyChange(uri, null);
+        }
+    }'''
 
 if __name__ == '__main__':
     doctest.testmod()
@@ -0,0 +1,116 @@
+#!/usr/bin/env python
+
+import doctest
+
+# suffixes of the triggers syncing the FTS tables, of either module
+FTS_TRIGGERS = ('ai', 'ad', 'bd', 'bu', 'au')
+
+def column_definition(column):
+    '''
+    >>> from schema import Column
+    >>> print column_definition(Column({'name': 'added_at', 'type': 'timestamp', 'options': 'default current_timestamp'}))
+    added_at_column TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    '''
+    if column.sql_options:
+        return '%s %s %s' % (column.sql_name, column.sql_type, column.sql_options)
+    return '%s %s' % (column.sql_name, column.sql_type)
+
+def create_table_sql(table, sql_name=None):
+    '''
+    The CREATE TABLE statement the generated XxxTable.onCreate runs.
+
+    >>> from schema import Table
+    >>> print create_table_sql(Table('dot', {'columns': [{'name': 'coord_x', 'type': 'integer', 'options': 'unique'}]}))
+    CREATE TABLE dot_table (_id INTEGER PRIMARY KEY, coord_x_column INTEGER UNIQUE)
+    '''
+    definitions = ['_id INTEGER PRIMARY KEY'] + [column_definition(column) for column in table.columns]
+    return 'CREATE TABLE %s (%s)' % (sql_name or table.sql_name, ', '.join(definitions))
+
+def create_index_sql(table, index):
+    '''
+    >>> from schema import Table
+    >>> table = Table('dot', {'columns': [], 'indexes': [{'columns': ['coord_x', 'coord_y'], 'unique': True}]})
+    >>> print create_index_sql(table, table.indexes[0])
+    CREATE UNIQUE INDEX dot__coord_x__coord_y__idx ON dot_table (coord_x_column,coord_y_column)
+    '''
+    return 'CREATE %sINDEX %s ON %s (%s)' % ('UNIQUE ' if index.unique else '', index.name_value,
+        table.sql_name, ','.join(index.sql_columns))
+
+def fts_ddl(table):
+    '''
+    The external content FTS table indexing the table's ``"fts"`` columns and
+    the triggers keeping it in sync. FTS4 deletes the old terms before the
+    row changes (it reads them from the base table), FTS5 is given them.
+
+    >>> from schema import Table
+    >>> table = Table('note', {'columns': [{'name': 'body', 'type': 'text', 'fts': True}]})
+    >>> for sql in fts_ddl(table):
+    ...     print sql
+    CREATE VIRTUAL TABLE note_fts USING fts4(content='note_table', body_column)
+    CREATE TRIGGER note_fts_ai AFTER INSERT ON note_table BEGIN INSERT INTO note_fts(docid, body_column) VALUES (new._id, new.body_column); END
+    CREATE TRIGGER note_fts_bd BEFORE DELETE ON note_table BEGIN DELETE FROM note_fts WHERE docid = old._id; END
+    CREATE TRIGGER note_fts_bu BEFORE UPDATE OF body_column ON note_table BEGIN DELETE FROM note_fts WHERE docid = old._id; END
+    CREATE TRIGGER note_fts_au AFTER UPDATE OF body_column ON note_table BEGIN INSERT INTO note_fts(docid, body_column) VALUES (new._id, new.body_column); END
+    >>> table.fts_module = 'fts5'
+    >>> for sql in fts_ddl(table):
+    ...     print sql
+    CREATE VIRTUAL TABLE note_fts USING fts5(body_column, content='note_table', content_rowid='_id')
+    CREATE TRIGGER note_fts_ai AFTER INSERT ON note_table BEGIN INSERT INTO note_fts(rowid, body_column) VALUES (new._id, new.body_column); END
+    CREATE TRIGGER note_fts_ad AFTER DELETE ON note_table BEGIN INSERT INTO note_fts(note_fts, rowid, body_column) VALUES ('delete', old._id, old.body_column); END
+    CREATE TRIGGER note_fts_au AFTER UPDATE OF body_column ON note_table BEGIN INSERT INTO note_fts(note_fts, rowid, body_column) VALUES ('delete', old._id, old.body_column); INSERT INTO note_fts(rowid, body_column) VALUES (new._id, new.body_column); END
+    '''
+    if not table.fts_columns:
+        return []
+    fts, base = table.fts_name, table.sql_name
+    names = ', '.join(column.sql_name for column in table.fts_columns)
+    trigger = 'CREATE TRIGGER %s_%%s %%s ON %s BEGIN %%s END' % (fts, base)
+    update = '%%s UPDATE OF %s' % (names)
+    if table.fts_module == 'fts4':
+        insert = 'INSERT INTO %s(docid, %s) VALUES (%s);' % (fts, names, fts_values('new', table))
+        delete = 'DELETE FROM %s WHERE docid = old._id;' % (fts)
+        return [
+            "CREATE VIRTUAL TABLE %s USING fts4(content='%s', %s)" % (fts, base, names),
+            trigger % ('ai', 'AFTER INSERT', insert),
+            trigger % ('bd', 'BEFORE DELETE', delete),
+            trigger % ('bu', update % ('BEFORE'), delete),
+            trigger % ('au', update % ('AFTER'), insert),
+        ]
+    insert = 'INSERT INTO %s(rowid, %s) VALUES (%s);' % (fts, names, fts_values('new', table))
+    delete = "INSERT INTO %s(%s, rowid, %s) VALUES ('delete', %s);" % (fts, fts, names, fts_values('old', table))
+    return [
+        "CREATE VIRTUAL TABLE %s USING fts5(%s, content='%s', content_rowid='_id')" % (fts, names, base),
+        trigger % ('ai', 'AFTER INSERT', insert),
+        trigger % ('ad', 'AFTER DELETE', delete),
+        trigger % ('au', update % ('AFTER'), '%s %s' % (delete, insert)),
+    ]
+
+def fts_values(row, table):
+    return ', '.join('%s.%s' % (row, column) for column in ['_id'] + [column.sql_name for column in table.fts_columns])
+
+def drop_fts_sql(table):
+    '''
+    Drop the FTS table; its triggers go with the base table or are dropped
+    here when the base table stays.
+
+    >>> from schema import Table
+    >>> print drop_fts_sql(Table('note', {'columns': [{'name': 'body', 'type': 'text', 'fts': True}]}))
+    ['DROP TRIGGER IF EXISTS note_fts_ai', 'DROP TRIGGER IF EXISTS note_fts_ad', 'DROP TRIGGER IF EXISTS note_fts_bd', 'DROP TRIGGER IF EXISTS note_fts_bu', 'DROP TRIGGER IF EXISTS note_fts_au', 'DROP TABLE IF EXISTS note_fts']
+    '''
+    if not table.fts_columns:
+        return []
+    return ['DROP TRIGGER IF EXISTS %s_%s' % (table.fts_name, suffix) for suffix in FTS_TRIGGERS] + [
+        'DROP TABLE IF EXISTS %s' % (table.fts_name)]
+
+def rebuild_fts_sql(table):
+    '''
+    >>> from schema import Table
+    >>> print rebuild_fts_sql(Table('note', {'columns': [{'name': 'body', 'type': 'text', 'fts': True}]}))
+    INSERT INTO note_fts(note_fts) VALUES ('rebuild')
+    '''
+    return "INSERT INTO %s(%s) VALUES ('rebuild')" % (table.fts_name, table.fts_name)
+
+def table_ddl(table):
+    return [create_table_sql(table)] + [create_index_sql(table, index) for index in table.indexes] + fts_ddl(table)
+
+if __name__ == '__main__':
+    doctest.testmod()
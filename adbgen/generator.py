@@ -1,26 +1,72 @@
 #!/usr/bin/env python
 
+import time
+from writer import SourceWriter
+from sink import DirectorySink
+
 class AndroidClassGenerator(object):
-    
+
+    # objects notified of the cost of every section, class and create_file
+    # (see adbgen.stats.Stats); nothing is timed while the list is empty
+    observers = []
+
     def __init__(self):
         self.string_attrs = []
         self.file_name = None
-        
-    def create_file(self):
+
+    def emit(self, writer):
+        if not self.observers:
+            return self.emit_class(writer)
+        start, size = time.time(), writer.bytes_written
+        self.emit_class(writer)
+        for observer in self.observers:
+            observer.emitted(self, time.time() - start, writer.bytes_written - size)
+
+    def emit_class(self, writer):
         text  = self.header_string()
         text += '\n\n'
         text += self.class_string()
-        
-        body = ''
+        head, tail = text.split('%s', 1)
+
+        writer.write(head)
         for string_attr in self.string_attrs:
-            body += getattr(self, string_attr)()
-            body += '\n\n'
-        
-        with open(self.file_name, 'w') as fout:
-            fout.write(text % (body))
-            
+            self.emit_section(writer, string_attr)
+            writer.write('\n\n')
+        writer.write(tail)
+
+    def emit_section(self, writer, string_attr):
+        if not self.observers:
+            return self.call_section(writer, string_attr)
+        start, size = time.time(), writer.bytes_written
+        self.call_section(writer, string_attr)
+        for observer in self.observers:
+            observer.section(self, string_attr, time.time() - start, writer.bytes_written - size)
+
+    def call_section(self, writer, string_attr):
+        method = getattr(self, string_attr)
+        if getattr(method, 'streaming', False):
+            method(writer)
+        else:
+            writer.write(method())
+
+    def render(self):
+        writer = SourceWriter()
+        self.emit(writer)
+        return writer.getvalue()
+
+    def create_file(self, sink=None, unchanged=None):
+        if sink is None:
+            sink = DirectorySink('.', package_layout=False)
+        if not self.observers:
+            return sink.create_file(self, unchanged)
+        start = time.time()
+        result = sink.create_file(self, unchanged)
+        for observer in self.observers:
+            observer.created(self, time.time() - start)
+        return result
+
     def header_string(self):
         raise NotImplementedError
-        
+
     def class_string(self):
         raise NotImplementedError
@@ -0,0 +1,83 @@
+#!/usr/bin/env python
+
+import doctest
+import json
+import os
+
+_fragments = {}
+
+def load_fragment(path):
+    '''
+    Parse a table file, reusing the previous parse while the file's mtime
+    and size are unchanged.
+    '''
+    stat = os.stat(path)
+    key = (stat.st_mtime, stat.st_size)
+    cached = _fragments.get(path)
+    if cached is not None and cached[0] == key:
+        return cached[1]
+    with open(path) as fin:
+        definition = json.load(fin)
+    _fragments[path] = (key, definition)
+    return definition
+
+class LazySchema(dict):
+    '''
+    Schema root whose tables may point at one file per table, e.g.
+    ``"album": "tables/album.js"``. A table file is only read when the table
+    itself is looked up.
+
+    >>> schema = LazySchema({'tables': ['dot', 'dash'], 'dot': {'columns': []}, 'dash': 'dash.js'}, '/schema')
+    >>> print schema['dot'], schema.table_file('dot'), schema.table_file('dash')
+    {'columns': []} None /schema/dash.js
+    '''
+
+    def __init__(self, json_object, base_dir=''):
+        dict.__init__(self, json_object)
+        self.base_dir = base_dir
+
+    def table_file(self, name):
+        entry = dict.get(self, name)
+        if isinstance(entry, basestring) and name in dict.get(self, 'tables', ()):
+            return os.path.join(self.base_dir, entry)
+        return None
+
+    def table_files(self):
+        return [path for path in map(self.table_file, dict.__getitem__(self, 'tables')) if path]
+
+    def __getitem__(self, key):
+        path = self.table_file(key)
+        if path is not None:
+            return load_fragment(path)
+        return dict.__getitem__(self, key)
+
+    def get(self, key, default=None):
+        if key in self:
+            return self[key]
+        return default
+
+def table_source(json_object, name):
+    '''
+    What identifies the definition of a table without parsing it: the inline
+    definition, or the path, mtime and size of its table file.
+
+    >>> print table_source({'dot': {'columns': []}}, 'dot')
+    {'columns': []}
+    >>> print table_source(LazySchema({'tables': ['dot'], 'dot': '/nonexistent/dot.js'}), 'dot')
+    {'file': '/nonexistent/dot.js'}
+    '''
+    path = json_object.table_file(name) if isinstance(json_object, LazySchema) else None
+    if path is None:
+        return json_object[name]
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return {'file': path}
+    return {'file': path, 'mtime': stat.st_mtime, 'size': stat.st_size}
+
+def load_schema(schema_file):
+    with open(schema_file) as fin:
+        return LazySchema(json.load(fin), os.path.dirname(schema_file))
+
+if __name__ == '__main__':
+    doctest.testmod()
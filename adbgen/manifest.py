@@ -0,0 +1,110 @@
+#!/usr/bin/env python
+
+import doctest
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = '.adbgen_manifest.json'
+
+def content_hash(text):
+    '''
+    >>> print content_hash('public class Dot {}')
+    b54b051c9e2716da04cbe06b4125fa8199cf96f5
+    '''
+    return hashlib.sha1(text).hexdigest()
+
+def schema_hash(schema_slice):
+    '''
+    >>> schema_hash({'columns': [], 'indexes': None}) == schema_hash({'indexes': None, 'columns': []})
+    True
+    '''
+    return content_hash(json.dumps(schema_slice, sort_keys=True))
+
+class Manifest(object):
+    '''
+    Remember what the last run generated (.adbgen_manifest.json)
+    '''
+
+    def __init__(self, path=MANIFEST_NAME):
+        self.path = path
+        self.files = {}
+        self.slices = {}
+        self.regenerated = []
+        self.skipped = []
+
+    @classmethod
+    def load(cls, path=MANIFEST_NAME):
+        manifest = cls(path)
+        if os.path.exists(path):
+            with open(path) as fin:
+                json_object = json.load(fin)
+            manifest.files = json_object.get('files', {})
+            manifest.slices = json_object.get('slices', {})
+        return manifest
+
+    def save(self):
+        directory = os.path.dirname(self.path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        with open(self.path, 'w') as fout:
+            json.dump({'files': self.files, 'slices': self.slices}, fout, indent=4, sort_keys=True)
+
+    def is_fresh(self, key, slice_hash, paths, sink=None):
+        '''
+        >>> manifest = Manifest('/nonexistent/manifest.json')
+        >>> manifest.is_fresh('table:dot', 'abc', [])
+        False
+        >>> manifest.slices['table:dot'] = 'abc'
+        >>> manifest.is_fresh('table:dot', 'abc', [])
+        True
+        >>> manifest.is_fresh('table:dot', 'abc', ['/nonexistent/DotTable.java'])
+        False
+        '''
+        exists = sink.exists if sink is not None else os.path.exists
+        if self.slices.get(key) != slice_hash:
+            return False
+        for path in paths:
+            if path not in self.files or not exists(path):
+                return False
+        return True
+
+    def skip(self, key, slice_hash, paths):
+        self.slices[key] = slice_hash
+        self.skipped.extend(paths)
+
+    def unchanged(self, sink, path):
+        return lambda digest: self.files.get(path) == digest and sink.exists(path)
+
+    def record(self, path, result):
+        written, digest = result
+        self.files[path] = digest
+        (self.regenerated if written else self.skipped).append(path)
+        return written
+
+    def create_file(self, generator, sink):
+        path = sink.path(generator.package, generator.file_name)
+        return self.record(path, generator.create_file(sink, self.unchanged(sink, path)))
+
+    def write(self, package, file_name, text, sink):
+        path = sink.path(package, file_name)
+        return self.record(path, sink.write(package, file_name, text, self.unchanged(sink, path)))
+
+    def report(self):
+        '''
+        >>> manifest = Manifest()
+        >>> manifest.regenerated = ['DotTable.java']
+        >>> manifest.skipped = ['Dot.java', 'TestProvider.java']
+        >>> print manifest.report()
+        regenerated: DotTable.java
+        skipped: Dot.java
+        skipped: TestProvider.java
+        1 regenerated, 2 skipped
+        '''
+        lines = ['regenerated: %s' % (file_name) for file_name in self.regenerated]
+        lines += ['skipped: %s' % (file_name) for file_name in self.skipped]
+        lines.append('%d regenerated, %d skipped' % (len(self.regenerated), len(self.skipped)))
+        return '\n'.join(lines)
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -0,0 +1,266 @@
+#!/usr/bin/env python
+
+import doctest
+import json
+import os
+import re
+from schema import Table
+from loader import load_fragment
+from ddl import column_definition, create_table_sql, create_index_sql, table_ddl, fts_ddl, drop_fts_sql, rebuild_fts_sql
+
+HISTORY_DIR = 'schema_history'
+SNAPSHOT_PATTERN = re.compile(r'^(\d+)\.json$')
+NON_CONSTANT_DEFAULT = re.compile(r'DEFAULT\s+(CURRENT_|\()')
+
+def schema_version(json_object):
+    return int(json_object.get('version', 1))
+
+def history_dir(json_object):
+    '''
+    Directory holding the snapshots of the released schemas, ``"history"``
+    in schema.js (default: schema_history next to the schema file).
+    '''
+    base_dir = getattr(json_object, 'base_dir', None)
+    if base_dir is None:
+        return json_object.get('history')
+    return os.path.join(base_dir, json_object.get('history', HISTORY_DIR))
+
+def history_files(json_object):
+    directory = history_dir(json_object)
+    if not directory or not os.path.isdir(directory):
+        return []
+    files = []
+    for file_name in os.listdir(directory):
+        match = SNAPSHOT_PATTERN.match(file_name)
+        if match:
+            files.append((int(match.group(1)), os.path.join(directory, file_name)))
+    return sorted(files)
+
+def history_source(json_object):
+    '''
+    What identifies the history without parsing it, for the manifest and
+    --watch.
+    '''
+    source = []
+    for version, path in history_files(json_object):
+        stat = os.stat(path)
+        source.append([path, stat.st_mtime, stat.st_size])
+    return source
+
+def load_history(json_object):
+    return dict((version, load_fragment(path)) for version, path in history_files(json_object))
+
+def snapshot(json_object):
+    '''
+    The schema with every table inlined, as stored in the history.
+
+    >>> print sorted(snapshot({'package': 'com.example', 'prefix': 'test', 'database': 'test.db',
+    ...     'tables': ['dot'], 'dot': {'columns': []}}).items())
+    [('dot', {'columns': []}), ('tables', ['dot']), ('version', 1)]
+    '''
+    result = {'version': schema_version(json_object), 'tables': list(json_object['tables'])}
+    for name in json_object['tables']:
+        result[name] = json_object[name]
+    return result
+
+def save_snapshot(json_object):
+    '''
+    Record the schema as released under its version. A different schema is
+    never written over an existing snapshot: the version has to be bumped.
+    '''
+    directory = history_dir(json_object) or HISTORY_DIR
+    version = schema_version(json_object)
+    path = os.path.join(directory, '%d.json' % (version))
+    current = json.loads(json.dumps(snapshot(json_object)))
+    if os.path.exists(path):
+        with open(path) as fin:
+            if json.load(fin) != current:
+                raise ValueError('%s differs from the schema; bump "version" before taking a new snapshot' % (path))
+        return path
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(path, 'w') as fout:
+        json.dump(current, fout, indent=4, sort_keys=True)
+    return path
+
+def can_add_column(column):
+    '''
+    Whether ALTER TABLE ADD COLUMN can add the column (SQLite refuses unique
+    and primary key columns and non-constant defaults).
+
+    >>> from schema import Column
+    >>> print can_add_column(Column({'name': 'x', 'type': 'integer', 'options': 'default 0'}))
+    True
+    >>> print can_add_column(Column({'name': 'x', 'type': 'timestamp', 'options': 'default current_timestamp'}))
+    False
+    '''
+    options = column.sql_options or ''
+    return not ('UNIQUE' in options or 'PRIMARY KEY' in options or NON_CONSTANT_DEFAULT.search(options))
+
+def check_new_column(table, column):
+    options = column.sql_options or ''
+    if 'NOT NULL' in options and 'DEFAULT' not in options:
+        raise ValueError('%s.%s is NOT NULL without a DEFAULT and cannot be added to existing rows' % (
+            table.name, column.name))
+
+def rebuild_steps(old, new):
+    '''
+    Rebuild the table through a copy, following SQLite's table rebuild
+    procedure. With foreign keys on, DROP TABLE deletes the rows first,
+    cascading to (or failing on) the rows referencing them, so the steps run
+    with foreign keys off and are checked afterwards, as the open helper does:
+
+    >>> import sqlite3
+    >>> album = Table('album', {'columns': [{'name': 'name', 'type': 'text'}]})
+    >>> content = Table('content', {'columns': [{'name': 'album_id', 'type': 'integer',
+    ...     'references': 'album', 'on_delete': 'cascade'}]})
+    >>> db = sqlite3.connect(':memory:', isolation_level=None)
+    >>> for sql in table_ddl(album) + table_ddl(content):
+    ...     _ = db.execute(sql)
+    >>> _ = db.execute("INSERT INTO album_table VALUES (1, 'a')")
+    >>> _ = db.execute('INSERT INTO content_table VALUES (1, 1)')
+    >>> _ = db.execute('PRAGMA foreign_keys = OFF')
+    >>> _ = db.execute('BEGIN')
+    >>> for sql in rebuild_steps(album, Table('album', {'columns': [{'name': 'name', 'type': 'varchar(100)'}]})):
+    ...     _ = db.execute(sql)
+    >>> print db.execute('PRAGMA foreign_key_check').fetchall()
+    []
+    >>> _ = db.execute('COMMIT')
+    >>> _ = db.execute('PRAGMA foreign_keys = ON')
+    >>> print db.execute('SELECT COUNT(*) FROM album_table').fetchone(), db.execute('SELECT COUNT(*) FROM content_table').fetchone()
+    (1,) (1,)
+    '''
+    old_names = set(column.name for column in old.columns)
+    copied = ', '.join(['_id'] + [column.sql_name for column in new.columns if column.name in old_names])
+    temp_name = '%s__new' % (new.sql_name)
+    steps = [
+        create_table_sql(new, temp_name),
+        'INSERT INTO %s (%s) SELECT %s FROM %s' % (temp_name, copied, copied, old.sql_name),
+        'DROP TABLE %s' % (old.sql_name),
+        'ALTER TABLE %s RENAME TO %s' % (temp_name, new.sql_name),
+    ]
+    return steps + [create_index_sql(new, index) for index in new.indexes]
+
+def table_steps(old, new):
+    '''
+    SQL statements turning table ``old`` into ``new`` (either may be None).
+    New columns are added in place when SQLite allows it; removed or changed
+    columns rebuild the table, keeping the rows.
+
+    >>> old = Table('dot', {'columns': [{'name': 'x', 'type': 'integer'}]})
+    >>> for sql in table_steps(old, Table('dot', {'columns': [{'name': 'x', 'type': 'integer'},
+    ...         {'name': 'y', 'type': 'integer'}], 'indexes': [{'columns': ['y']}]})):
+    ...     print sql
+    ALTER TABLE dot_table ADD COLUMN y_column INTEGER
+    CREATE INDEX dot__y__idx ON dot_table (y_column)
+    >>> for sql in table_steps(old, Table('dot', {'columns': [{'name': 'x', 'type': 'text'}]})):
+    ...     print sql
+    CREATE TABLE dot_table__new (_id INTEGER PRIMARY KEY, x_column TEXT)
+    INSERT INTO dot_table__new (_id, x_column) SELECT _id, x_column FROM dot_table
+    DROP TABLE dot_table
+    ALTER TABLE dot_table__new RENAME TO dot_table
+    >>> print table_steps(old, None)
+    ['DROP TABLE IF EXISTS dot_table']
+
+    A changed FTS table, or one whose base table is rebuilt, is recreated and
+    rebuilt from the rows:
+
+    >>> for sql in table_steps(old, Table('dot', {'columns': [{'name': 'x', 'type': 'integer', 'fts': True}]}))[-2:]:
+    ...     print sql
+    CREATE TRIGGER dot_fts_au AFTER UPDATE OF x_column ON dot_table BEGIN INSERT INTO dot_fts(docid, x_column) VALUES (new._id, new.x_column); END
+    INSERT INTO dot_fts(dot_fts) VALUES ('rebuild')
+    '''
+    if new is None:
+        return drop_fts_sql(old) + ['DROP TABLE IF EXISTS %s' % (old.sql_name)]
+    if old is None:
+        return table_ddl(new)
+    steps = column_steps(old, new)
+    if (steps and steps[0].startswith('CREATE TABLE')) or fts_ddl(old) != fts_ddl(new):
+        steps += drop_fts_sql(old)
+        if new.fts_columns:
+            steps += fts_ddl(new) + [rebuild_fts_sql(new)]
+    return steps
+
+def column_steps(old, new):
+    '''
+    The table_steps of the columns and indexes of a table present on both
+    sides, leaving its FTS table alone.
+    '''
+    old_columns = dict((column.name, column) for column in old.columns)
+    new_names = set(column.name for column in new.columns)
+    rebuild = any(name not in new_names for name in old_columns)
+    added = []
+    for column in new.columns:
+        previous = old_columns.get(column.name)
+        if previous is None:
+            check_new_column(new, column)
+            if can_add_column(column):
+                added.append(column)
+            else:
+                rebuild = True
+        elif (previous.sql_type, previous.sql_options) != (column.sql_type, column.sql_options):
+            rebuild = True
+    if rebuild:
+        return rebuild_steps(old, new)
+
+    steps = ['ALTER TABLE %s ADD COLUMN %s' % (new.sql_name, column_definition(column)) for column in added]
+    old_indexes = [create_index_sql(old, index) for index in old.indexes]
+    new_indexes = [create_index_sql(new, index) for index in new.indexes]
+    for index, sql in zip(old.indexes, old_indexes):
+        if sql not in new_indexes:
+            steps.append('DROP INDEX IF EXISTS %s' % (index.name_value))
+    steps += [sql for sql in new_indexes if sql not in old_indexes]
+    return steps
+
+def schema_steps(old_json, new_json):
+    '''
+    Return ``[(table name, [sql, ...]), ...]`` for the tables that changed
+    between two schemas, dropped tables last.
+    '''
+    steps = []
+    for name in new_json['tables']:
+        definition = new_json[name]
+        if name in old_json['tables']:
+            if old_json[name] == definition:
+                continue
+            sql = table_steps(Table(name, old_json[name]), Table(name, definition))
+        else:
+            sql = table_steps(None, Table(name, definition))
+        if sql:
+            steps.append((name, sql))
+    for name in old_json['tables']:
+        if name not in new_json['tables']:
+            steps.append((name, table_steps(Table(name, old_json[name]), None)))
+    return steps
+
+class Migrations(object):
+    '''
+    Upgrade steps from every version of the history to the schema's version.
+    ``oldest`` is the oldest version they can upgrade from; databases older
+    than that are dropped and recreated.
+
+    >>> old = {'version': 1, 'tables': ['dot'], 'dot': {'columns': []}}
+    >>> new = {'version': 2, 'tables': ['dot', 'dash'], 'dot': {'columns': []}, 'dash': {'columns': []}}
+    >>> migrations = Migrations(new, {1: old})
+    >>> print migrations.version, migrations.oldest, migrations.steps
+    2 1 [(2, [('dash', ['CREATE TABLE dash_table (_id INTEGER PRIMARY KEY)'])])]
+    >>> print Migrations(new, {}).oldest
+    2
+    '''
+    __slots__ = ('version', 'oldest', 'steps')
+
+    def __init__(self, json_object, history=None):
+        self.version = schema_version(json_object)
+        snapshots = dict(load_history(json_object) if history is None else history)
+        snapshots[self.version] = json_object
+        self.oldest = self.version
+        while self.oldest - 1 in snapshots:
+            self.oldest -= 1
+        self.steps = []
+        for version in range(self.oldest + 1, self.version + 1):
+            steps = schema_steps(snapshots[version - 1], snapshots[version])
+            if steps:
+                self.steps.append((version, steps))
+
+if __name__ == '__main__':
+    doctest.testmod()
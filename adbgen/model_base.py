@@ -2,20 +2,23 @@
 
 import doctest
 from generator import AndroidClassGenerator
-from utils import camel_variable_name
+from writer import SourceWriter, streaming
+from schema import as_table
 
 class AndroidModelBase(AndroidClassGenerator):
     '''
     Generate model base file ([TableName].java)
     '''
     
-    def __init__(self, package, table, columns):
+    def __init__(self, package, table, columns=None):
         self.package = package
-        self.table = table
-        self.columns = columns
-        self.file_name = '%s.java' % (camel_variable_name(self.table, upper=True))
-        self.string_attrs = ['properties_string','constructor_string','get_id_string',
-            'from_cursor_string','to_content_values_string', 'new_instance_from_cursor_string']
+        self.table = as_table(table, columns)
+        self.file_name = '%s.java' % (self.table.class_name)
+        self.string_attrs = ['properties_string','constructor_string','factory_string','get_id_string',
+            'from_cursor_string','to_content_values_string', 'new_instance_from_cursor_string',
+            'cursor_reader_string']
+        if self.table.relations:
+            self.string_attrs.insert(4, 'relations_string')
         
     def header_string(self):
         '''
@@ -43,12 +46,13 @@ import android.database.Cursor;''' % (self.package)
         %s
         }
         '''
-        result  = 'public class %s extends ModelBase {\n' % (camel_variable_name(self.table, upper=True))
+        result  = 'public class %s extends ModelBase {\n' % (self.table.class_name)
         result += '%s\n'
         result += '}'
         return result
 
-    def properties_string(self):
+    @streaming
+    def properties_string(self, writer=None):
         '''
         >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'Album', [{"name": "done","type": "boolean"},{"name": "name","type": "varchar(100)","options": "unique"},{"name": "added_at","type": "timestamp","options": "default current_timestamp"},{"name": "updated_at","type": "timestamp","options": "default current_timestamp"}])
         >>> print model_base.properties_string()
@@ -60,24 +64,14 @@ import android.database.Cursor;''' % (self.package)
             private Date updatedAt;
         <BLANKLINE>
         '''
-        import re
-        result  = '    private Context context;\n'
-        result += '    private int id;\n'
-        for column in self.columns:
-            var_type = 'Object'
-            if re.match(r'varchar.*',column['type']) or column['type'] == 'text':
-                var_type = 'String'
-            elif column['type'] == 'integer':
-                var_type = 'int'
-            elif column['type'] == 'timestamp':
-                var_type = 'Date'
-            elif column['type'] == 'float' or column['type'] == 'real':
-                var_type = 'float'
-            elif column['type'] == 'boolean':
-                var_type = 'boolean'
-                
-            result += '    private %s %s;\n' % (var_type, camel_variable_name(column['name']))
-        return result
+        out = writer or SourceWriter()
+        out.write('    private Context context;\n')
+        out.write('    private int id;\n')
+        for column in self.table.columns:
+            out.write('    private %s %s;\n' % (column.java_type, column.variable))
+        for column in self.table.relations:
+            out.write('    private %s %s;\n' % (column.references_class, column.relation_variable))
+        return out.getvalue()
         
     def constructor_string(self):
         '''
@@ -90,8 +84,29 @@ import android.database.Cursor;''' % (self.package)
         return '''\
     public %s() {
         super();
-    }''' % (camel_variable_name(self.table, upper=True))
+    }''' % (self.table.class_name)
     
+    def factory_string(self):
+        '''
+        Creates models for Dao without reflection.
+
+        >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'my_book', [])
+        >>> print model_base.factory_string()
+            public static final Factory<MyBook> FACTORY = new Factory<MyBook>() {
+                @Override
+                public MyBook newInstance() {
+                    return new MyBook();
+                }
+            };
+        '''
+        return '''\
+    public static final Factory<%(class_name)s> FACTORY = new Factory<%(class_name)s>() {
+        @Override
+        public %(class_name)s newInstance() {
+            return new %(class_name)s();
+        }
+    };''' % {'class_name': self.table.class_name}
+
     def get_id_string(self):
         '''
         >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'Album', [{"name": "name","type": "varchar(100)","options": "unique"},{"name": "added_at","type": "timestamp","options": "default current_timestamp"},{"name": "updated_at","type": "timestamp","options": "default current_timestamp"}])
@@ -107,59 +122,217 @@ import android.database.Cursor;''' % (self.package)
         return id;
     }'''
     
-    def new_instance_from_cursor_string(self):
+    def relations_string(self):
+        '''
+        The referenced rows, read when the model comes from a joined query
+        (e.g. contents_with_album) and null otherwise.
+
+        >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'content', [{"name": "album_id", "type": "integer", "references": "album"}])
+        >>> print model_base.relations_string()
+            public Album getAlbum() {
+                return album;
+            }
+        '''
+        return '\n\n'.join('''\
+    public %s get%s() {
+        return %s;
+    }''' % (column.references_class, column.relation_variable[0].upper() + column.relation_variable[1:],
+            column.relation_variable) for column in self.table.relations)
+
+    @streaming
+    def new_instance_from_cursor_string(self, writer=None):
         '''
         >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'my_book', [{"name": "done","type": "boolean"},{"name": "name","type": "varchar(100)","options": "unique"},{"name": "added_at","type": "timestamp","options": "default current_timestamp"},{"name": "updated_at","type": "timestamp","options": "default current_timestamp"}])
         >>> print model_base.new_instance_from_cursor_string()
             public static MyBook newInstance(Cursor cursor, Context context) {
+                return newInstance(cursor, new MyBookCursorReader(cursor), context);
+            }
+        <BLANKLINE>
+            public static MyBook newInstance(Cursor cursor, MyBookCursorReader reader, Context context) {
                 MyBook myBook = new MyBook();
-                myBook.fromCursor(cursor, context);
+                reader.read(cursor, myBook, context);
                 return myBook;
             }
         '''
-        result  = '    public static %s newInstance(Cursor cursor, Context context) {\n' % (camel_variable_name(self.table, upper=True))
-        result += '        %s %s = new %s();\n' % (camel_variable_name(self.table, upper=True), camel_variable_name(self.table, upper=False), camel_variable_name(self.table, upper=True))
-        result += '        %s.fromCursor(cursor, context);\n' % (camel_variable_name(self.table, upper=False))
-        result += '        return %s;\n' % (camel_variable_name(self.table, upper=False))
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        table = self.table
+        reader = '%sCursorReader' % (table.class_name)
+        out.write('    public static %s newInstance(Cursor cursor, Context context) {\n' % (table.class_name))
+        out.write('        return newInstance(cursor, new %s(cursor), context);\n' % (reader))
+        out.write('    }\n\n')
+        out.write('    public static %s newInstance(Cursor cursor, %s reader, Context context) {\n' % (table.class_name, reader))
+        out.write('        %s %s = new %s();\n' % (table.class_name, table.variable, table.class_name))
+        out.write('        reader.read(cursor, %s, context);\n' % (table.variable))
+        out.write('        return %s;\n' % (table.variable))
+        out.write('    }')
+        return out.getvalue()
+
+    @streaming
+    def cursor_reader_string(self, writer=None):
+        '''
+        Columns missing from the cursor's projection are left untouched, so
+        models can be read from a partial projection. A prefix reads the
+        columns of a joined table (see XxxTable.YYY_PREFIX).
+
+        >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'my_book', [{"name": "done","type": "boolean"},{"name": "name","type": "varchar(100)","options": "unique"}])
+        >>> print model_base.cursor_reader_string()
+            @Override
+            public CursorReader newCursorReader(Cursor cursor) {
+                return new MyBookCursorReader(cursor);
+            }
+        <BLANKLINE>
+            public static class MyBookCursorReader implements CursorReader {
+                private final int idIndex;
+                private final int doneIndex;
+                private final int nameIndex;
+        <BLANKLINE>
+                public MyBookCursorReader(Cursor cursor) {
+                    this(cursor, "");
+                }
+        <BLANKLINE>
+                public MyBookCursorReader(Cursor cursor, String prefix) {
+                    idIndex = cursor.getColumnIndex(prefix + BaseColumns._ID);
+                    doneIndex = cursor.getColumnIndex(prefix + MyBookTable.MyBookColumns.DONE);
+                    nameIndex = cursor.getColumnIndex(prefix + MyBookTable.MyBookColumns.NAME);
+                }
+        <BLANKLINE>
+                @Override
+                public void read(Cursor cursor, ModelBase object, Context context) {
+                    read(cursor, (MyBook) object, context);
+                }
+        <BLANKLINE>
+                public void read(Cursor cursor, MyBook myBook, Context context) {
+                    if (idIndex != -1) {
+                        myBook.id = cursor.getInt(idIndex);
+                    }
+                    if (doneIndex != -1) {
+                        myBook.done = cursor.getInt(doneIndex) == 1;
+                    }
+                    if (nameIndex != -1) {
+                        myBook.name = cursor.getString(nameIndex);
+                    }
+                    myBook.context = context;
+                }
+            }
+
+        Referenced rows are read when the cursor has their columns; a row
+        without a match in the LEFT OUTER JOIN reads as null:
+
+        >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'content', [{"name": "album_id", "type": "integer", "references": "album"}])
+        >>> print model_base.cursor_reader_string()
+            @Override
+            public CursorReader newCursorReader(Cursor cursor) {
+                return new ContentCursorReader(cursor);
+            }
+        <BLANKLINE>
+            public static class ContentCursorReader implements CursorReader {
+                private final int idIndex;
+                private final int albumIdIndex;
+                private final int albumIndex;
+                private final Album.AlbumCursorReader albumReader;
+        <BLANKLINE>
+                public ContentCursorReader(Cursor cursor) {
+                    this(cursor, "");
+                }
+        <BLANKLINE>
+                public ContentCursorReader(Cursor cursor, String prefix) {
+                    idIndex = cursor.getColumnIndex(prefix + BaseColumns._ID);
+                    albumIdIndex = cursor.getColumnIndex(prefix + ContentTable.ContentColumns.ALBUM_ID);
+                    albumIndex = cursor.getColumnIndex(prefix + ContentTable.ALBUM_PREFIX + BaseColumns._ID);
+                    albumReader = albumIndex == -1 ? null : new Album.AlbumCursorReader(cursor, prefix + ContentTable.ALBUM_PREFIX);
+                }
+        <BLANKLINE>
+                @Override
+                public void read(Cursor cursor, ModelBase object, Context context) {
+                    read(cursor, (Content) object, context);
+                }
+        <BLANKLINE>
+                public void read(Cursor cursor, Content content, Context context) {
+                    if (idIndex != -1) {
+                        content.id = cursor.getInt(idIndex);
+                    }
+                    if (albumIdIndex != -1) {
+                        content.albumId = cursor.getInt(albumIdIndex);
+                    }
+                    if (albumReader != null) {
+                        content.album = cursor.isNull(albumIndex) ? null : Album.newInstance(cursor, albumReader, context);
+                    }
+                    content.context = context;
+                }
+            }
+        '''
+        out = writer or SourceWriter()
+        table = self.table
+        reader = '%sCursorReader' % (table.class_name)
+        out.write('    @Override\n')
+        out.write('    public CursorReader newCursorReader(Cursor cursor) {\n')
+        out.write('        return new %s(cursor);\n' % (reader))
+        out.write('    }\n\n')
+        out.write('    public static class %s implements CursorReader {\n' % (reader))
+        out.write('        private final int idIndex;\n')
+        for column in table.columns:
+            out.write('        private final int %sIndex;\n' % (column.variable))
+        for column in table.relations:
+            out.write('        private final int %sIndex;\n' % (column.relation_variable))
+            out.write('        private final %s.%sCursorReader %sReader;\n' % (column.references_class,
+                column.references_class, column.relation_variable))
+        out.write('\n')
+        out.write('        public %s(Cursor cursor) {\n' % (reader))
+        out.write('            this(cursor, "");\n')
+        out.write('        }\n\n')
+        out.write('        public %s(Cursor cursor, String prefix) {\n' % (reader))
+        out.write('            idIndex = cursor.getColumnIndex(prefix + BaseColumns._ID);\n')
+        for column in table.columns:
+            out.write('            %sIndex = cursor.getColumnIndex(prefix + %sTable.%s.%s);\n' % (column.variable,
+                table.class_name, table.columns_class, column.constant))
+        for column in table.relations:
+            prefix = 'prefix + %sTable.%s' % (table.class_name, column.prefix_constant)
+            out.write('            %sIndex = cursor.getColumnIndex(%s + BaseColumns._ID);\n' % (column.relation_variable, prefix))
+            out.write('            %sReader = %sIndex == -1 ? null : new %s.%sCursorReader(cursor, %s);\n' % (
+                column.relation_variable, column.relation_variable, column.references_class, column.references_class, prefix))
+        out.write('        }\n\n')
+        out.write('        @Override\n')
+        out.write('        public void read(Cursor cursor, ModelBase object, Context context) {\n')
+        out.write('            read(cursor, (%s) object, context);\n' % (table.class_name))
+        out.write('        }\n\n')
+        out.write('        public void read(Cursor cursor, %s %s, Context context) {\n' % (table.class_name, table.variable))
+        out.write('            if (idIndex != -1) {\n')
+        out.write('                %s.id = cursor.getInt(idIndex);\n' % (table.variable))
+        out.write('            }\n')
+        for column in table.columns:
+            out.write('            if (%sIndex != -1) {\n' % (column.variable))
+            out.write('                %s.%s = %s;\n' % (table.variable, column.variable, column.getter % ('%sIndex' % (column.variable))))
+            out.write('            }\n')
+        for column in table.relations:
+            out.write('            if (%sReader != null) {\n' % (column.relation_variable))
+            out.write('                %s.%s = cursor.isNull(%sIndex) ? null : %s.newInstance(cursor, %sReader, context);\n' % (
+                table.variable, column.relation_variable, column.relation_variable, column.references_class,
+                column.relation_variable))
+            out.write('            }\n')
+        out.write('            %s.context = context;\n' % (table.variable))
+        out.write('        }\n')
+        out.write('    }')
+        return out.getvalue()
     
-    def from_cursor_string(self):
+    @streaming
+    def from_cursor_string(self, writer=None):
         '''
         >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'my_book', [{"name": "done","type": "boolean"},{"name": "name","type": "varchar(100)","options": "unique"},{"name": "added_at","type": "timestamp","options": "default current_timestamp"},{"name": "updated_at","type": "timestamp","options": "default current_timestamp"}])
         >>> print model_base.from_cursor_string()
             @Override
             public void fromCursor(Cursor cursor, Context context) {
-                this.id = cursor.getInt(cursor.getColumnIndex(BaseColumns._ID));
-                this.done = cursor.getInt(cursor.getColumnIndex(MyBookTable.MyBookColumns.DONE)) == 1;
-                this.name = cursor.getString(cursor.getColumnIndex(MyBookTable.MyBookColumns.NAME));
-                this.addedAt = new Date(cursor.getLong(cursor.getColumnIndex(MyBookTable.MyBookColumns.ADDED_AT)));
-                this.updatedAt = new Date(cursor.getLong(cursor.getColumnIndex(MyBookTable.MyBookColumns.UPDATED_AT)));
-                this.context = context;
+                new MyBookCursorReader(cursor).read(cursor, this, context);
             }
         '''
-        import re
-        result  = '    @Override\n'
-        result += '    public void fromCursor(Cursor cursor, Context context) {\n'
-        result += '        this.id = cursor.getInt(cursor.getColumnIndex(BaseColumns._ID));\n'
-        for column in self.columns:
-            result += '        this.%s = ' % (camel_variable_name(column['name']))
-            column_index = 'cursor.getColumnIndex(%sTable.%sColumns.%s)' % (camel_variable_name(self.table, upper=True), camel_variable_name(self.table, upper=True), column['name'].upper())
-            if re.match(r'varchar.*',column['type']) or column['type'] == 'text':
-                result += 'cursor.getString(%s);\n' % (column_index)
-            elif column['type'] == 'integer':
-                result += 'cursor.getInt(%s);\n' % (column_index)
-            elif column['type'] == 'timestamp':
-                result += 'new Date(cursor.getLong(%s));\n' % (column_index)
-            elif column['type'] == 'float' or column['type'] == 'real':
-                result += 'cursor.getFloat(%s);\n' % (column_index)
-            elif column['type'] == 'boolean':
-                result += 'cursor.getInt(%s) == 1;\n' % (column_index)
-        result += '        this.context = context;\n'
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        out.write('    @Override\n')
+        out.write('    public void fromCursor(Cursor cursor, Context context) {\n')
+        out.write('        new %sCursorReader(cursor).read(cursor, this, context);\n' % (self.table.class_name))
+        out.write('    }')
+        return out.getvalue()
         
-    def to_content_values_string(self):
+    @streaming
+    def to_content_values_string(self, writer=None):
         '''
         >>> model_base = AndroidModelBase('com.touchsi.android.opd.model', 'my_book', [{"name": "done","type": "boolean"},{"name": "name","type": "varchar(100)","options": "unique"},{"name": "added_at","type": "timestamp","options": "default current_timestamp"},{"name": "updated_at","type": "timestamp","options": "default current_timestamp"}])
         >>> print model_base.to_content_values_string()
@@ -173,17 +346,16 @@ import android.database.Cursor;''' % (self.package)
             	return values;
             }
         '''
-        result  = '    @Override\n'
-        result += '    public ContentValues toContentValues() {\n'
-        result += '        ContentValues values = new ContentValues();\n'
-        for column in self.columns:
-            if column['type'] == 'timestamp':
-                result += '        values.put(%sTable.%sColumns.%s, this.%s.getTime());\n' % (camel_variable_name(self.table, upper=True), camel_variable_name(self.table, upper=True), column['name'].upper(), camel_variable_name(column['name']))
-            else:
-                result += '        values.put(%sTable.%sColumns.%s, this.%s);\n' % (camel_variable_name(self.table, upper=True), camel_variable_name(self.table, upper=True), column['name'].upper(), camel_variable_name(column['name']))
-        result += '        return values;\n'
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        out.write('    @Override\n')
+        out.write('    public ContentValues toContentValues() {\n')
+        out.write('        ContentValues values = new ContentValues();\n')
+        for column in self.table.columns:
+            out.write('        values.put(%sTable.%s.%s, this.%s%s);\n' % (self.table.class_name, self.table.columns_class,
+                column.constant, column.variable, column.value_suffix))
+        out.write('        return values;\n')
+        out.write('    }')
+        return out.getvalue()
 
 if __name__ == '__main__':
     doctest.testmod()
\ No newline at end of file
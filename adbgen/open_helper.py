@@ -2,21 +2,59 @@
 
 import doctest
 from generator import AndroidClassGenerator
+from writer import SourceWriter, streaming
 from utils import camel_variable_name
+from schema import as_table, Settings
+from migration import Migrations
+
+def drop_order(tables):
+    '''
+    The tables, the ones referencing another table before it (in schema order
+    otherwise), so that dropping them one by one never drops a table that
+    still has rows referencing it.
+
+    >>> from schema import Table
+    >>> album = Table('album', {'columns': []})
+    >>> content = Table('content', {'columns': [{'name': 'album_id', 'type': 'integer', 'references': 'album'}]})
+    >>> print [table.name for table in drop_order([album, Table('user'), content])]
+    ['user', 'content', 'album']
+    '''
+    remaining = list(tables)
+    ordered = []
+    while remaining:
+        for table in remaining:
+            if not any(column.references == table.name for other in remaining if other is not table
+                    for column in other.relations):
+                break
+        else:
+            # a cycle of references: foreign keys are off anyway
+            table = remaining[0]
+        remaining.remove(table)
+        ordered.append(table)
+    return ordered
 
 class AndroidOpenHelper(AndroidClassGenerator):
     '''
     Generate open helper file (XXXOpenHelper.java)
     '''
     
-    def __init__(self, package, prefix, db_name, tables):
+    def __init__(self, package, prefix, db_name, tables, settings=None, migrations=None, asset=None):
         self.package = package
         self.prefix = prefix
-        self.tables = tables
+        self.tables = [as_table(table) for table in tables]
         self.db_name = db_name
+        self.settings = settings if isinstance(settings, Settings) else Settings(settings)
+        self.migrations = migrations
+        self.asset = asset
         self.file_name = '%sOpenHelper.java' % (camel_variable_name(self.prefix, upper=True))
         self.string_attrs = ['properties_string', 'constructor_string', 'create_string', 'upgrade_string']
+        if asset:
+            self.string_attrs.insert(2, 'asset_string')
                         
+    def checks_foreign_keys(self):
+        # the upgrade steps rebuild tables with foreign keys off
+        return self.settings.foreign_keys and bool(self.migrations and self.migrations.steps)
+
     def header_string(self):
         '''
         >>> helper = AndroidOpenHelper('com.example.dot', 'Test', 'test.db', ['user','group'])
@@ -26,11 +64,30 @@ class AndroidOpenHelper(AndroidClassGenerator):
         import android.content.Context;
         import android.database.sqlite.SQLiteDatabase;
         import android.database.sqlite.SQLiteOpenHelper;
+        >>> helper = AndroidOpenHelper('com.example.dot', 'Test', 'test.db', ['user','group'], {'wal': True})
+        >>> print helper.header_string()
+        package com.example.dot;
+        <BLANKLINE>
+        import android.content.Context;
+        import android.database.sqlite.SQLiteDatabase;
+        import android.database.sqlite.SQLiteOpenHelper;
+        import android.os.Build;
         '''
         result  = 'package %s;\n\n' % (self.package)
         result += 'import android.content.Context;\n'
+        if self.checks_foreign_keys():
+            result += 'import android.database.Cursor;\n'
+            result += 'import android.database.sqlite.SQLiteConstraintException;\n'
         result += 'import android.database.sqlite.SQLiteDatabase;\n'
         result += 'import android.database.sqlite.SQLiteOpenHelper;'
+        if self.settings:
+            result += '\nimport android.os.Build;'
+        if self.asset:
+            result += '\n\nimport java.io.File;\n'
+            result += 'import java.io.FileOutputStream;\n'
+            result += 'import java.io.IOException;\n'
+            result += 'import java.io.InputStream;\n'
+            result += 'import java.io.OutputStream;'
         return result
     
     def class_string(self):
@@ -53,24 +110,218 @@ class AndroidOpenHelper(AndroidClassGenerator):
             private static final String DATABASE_NAME = "test.db";
             private static final int DATABASE_VERSION = 1;
         '''
+        migrations = self.migrations
         result  = '    private static final String DATABASE_NAME = "%s";\n' % (self.db_name)
-        result += '    private static final int DATABASE_VERSION = 1;'
+        result += '    private static final int DATABASE_VERSION = %d;' % (migrations.version if migrations else 1)
+        if migrations and migrations.steps:
+            result += '\n    private static final int OLDEST_UPGRADABLE_VERSION = %d;' % (migrations.oldest)
+        if self.asset:
+            result += '\n    private static final String DATABASE_ASSET = "%s";\n\n' % (self.asset)
+            result += '    private final Context context;\n'
+            result += '    private boolean assetChecked;'
         return result
         
-    def constructor_string(self):
+    @streaming
+    def constructor_string(self, writer=None):
         '''
         >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user','group'])
         >>> print helper.constructor_string()
             public TestOpenHelper(Context context) {
                 super(context, DATABASE_NAME, null, DATABASE_VERSION);
             }
+
+        The database settings are applied in onConfigure, or in onOpen before
+        Jelly Bean, where onConfigure is not called. Foreign keys are only
+        turned on in onOpen: onCreate and onUpgrade run with SQLite's default
+        (off), so that rebuilding or dropping a table in an upgrade neither
+        cascades to nor fails on the rows referencing it.
+
+        >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user','group'],
+        ...     {'wal': True, 'synchronous': 'normal', 'foreign_keys': True, 'lookaside': {'slot_size': 1200, 'slot_count': 100}})
+        >>> print helper.constructor_string()
+            public TestOpenHelper(Context context) {
+                super(context, DATABASE_NAME, null, DATABASE_VERSION);
+                if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.JELLY_BEAN) {
+                    setWriteAheadLoggingEnabled(true);
+                }
+                if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.O_MR1) {
+                    setLookasideConfig(1200, 100);
+                }
+            }
+        <BLANKLINE>
+            @Override
+            public void onConfigure(SQLiteDatabase db) {
+                super.onConfigure(db);
+                configure(db);
+            }
+        <BLANKLINE>
+            @Override
+            public void onOpen(SQLiteDatabase db) {
+                super.onOpen(db);
+                if (Build.VERSION.SDK_INT < Build.VERSION_CODES.JELLY_BEAN) {
+                    configure(db);
+                    db.enableWriteAheadLogging();
+                }
+                db.execSQL("PRAGMA foreign_keys = ON");
+            }
+        <BLANKLINE>
+            private static void configure(SQLiteDatabase db) {
+                db.execSQL("PRAGMA synchronous = NORMAL");
+            }
         '''
-        result  = '    public %sOpenHelper(Context context) {\n' % (camel_variable_name(self.prefix, upper=True))
-        result += '        super(context, DATABASE_NAME, null, DATABASE_VERSION);\n'
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        settings = self.settings
+        out.write('    public %sOpenHelper(Context context) {\n' % (camel_variable_name(self.prefix, upper=True)))
+        out.write('        super(context, DATABASE_NAME, null, DATABASE_VERSION);\n')
+        if self.asset:
+            out.write('        this.context = context.getApplicationContext();\n')
+        if settings.wal:
+            out.write('        if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.JELLY_BEAN) {\n')
+            out.write('            setWriteAheadLoggingEnabled(true);\n')
+            out.write('        }\n')
+        if settings.lookaside is not None:
+            out.write('        if (Build.VERSION.SDK_INT >= Build.VERSION_CODES.O_MR1) {\n')
+            out.write('            setLookasideConfig(%d, %d);\n' % settings.lookaside)
+            out.write('        }\n')
+        out.write('    }')
+        if not (settings.pragmas or settings.foreign_keys or settings.wal):
+            return out.getvalue()
+
+        out.write('\n\n')
+        if settings.pragmas:
+            out.write('    @Override\n')
+            out.write('    public void onConfigure(SQLiteDatabase db) {\n')
+            out.write('        super.onConfigure(db);\n')
+            out.write('        configure(db);\n')
+            out.write('    }\n\n')
+        out.write('    @Override\n')
+        out.write('    public void onOpen(SQLiteDatabase db) {\n')
+        out.write('        super.onOpen(db);\n')
+        if settings.pragmas or settings.wal:
+            out.write('        if (Build.VERSION.SDK_INT < Build.VERSION_CODES.JELLY_BEAN) {\n')
+            if settings.pragmas:
+                out.write('            configure(db);\n')
+            if settings.wal:
+                out.write('            db.enableWriteAheadLogging();\n')
+            out.write('        }\n')
+        if settings.foreign_keys:
+            out.write('        db.execSQL("PRAGMA foreign_keys = ON");\n')
+        out.write('    }')
+        if settings.pragmas:
+            out.write('\n\n    private static void configure(SQLiteDatabase db) {\n')
+            for pragma in settings.pragmas:
+                out.write('        db.execSQL("PRAGMA %s");\n' % (pragma))
+            out.write('    }')
+        return out.getvalue()
         
-    def create_string(self):
+    @streaming
+    def asset_string(self, writer=None):
+        '''
+        With a prebuilt database (``"asset"``, see adbgen.asset), the asset is
+        copied in place before the database is first opened. It is stamped
+        with DATABASE_VERSION, so onCreate is not called, and later versions
+        go through onUpgrade as usual.
+
+        >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user'], asset='test.db')
+        >>> print helper.asset_string()
+            @Override
+            public synchronized SQLiteDatabase getWritableDatabase() {
+                copyDatabaseAsset();
+                return super.getWritableDatabase();
+            }
+        <BLANKLINE>
+            @Override
+            public synchronized SQLiteDatabase getReadableDatabase() {
+                copyDatabaseAsset();
+                return super.getReadableDatabase();
+            }
+        <BLANKLINE>
+            private synchronized void copyDatabaseAsset() {
+                if (assetChecked) {
+                    return;
+                }
+                File file = context.getDatabasePath(DATABASE_NAME);
+                if (!file.exists()) {
+                    File parent = file.getParentFile();
+                    if (parent != null) {
+                        parent.mkdirs();
+                    }
+                    File temp = new File(file.getPath() + ".tmp");
+                    try {
+                        InputStream in = context.getAssets().open(DATABASE_ASSET);
+                        try {
+                            OutputStream out = new FileOutputStream(temp);
+                            try {
+                                byte[] buffer = new byte[64 * 1024];
+                                int count;
+                                while ((count = in.read(buffer)) != -1) {
+                                    out.write(buffer, 0, count);
+                                }
+                            } finally {
+                                out.close();
+                            }
+                        } finally {
+                            in.close();
+                        }
+                        if (!temp.renameTo(file)) {
+                            throw new IOException("cannot rename " + temp + " to " + file);
+                        }
+                    } catch (IOException e) {
+                        temp.delete();
+                        throw new RuntimeException("cannot copy the database asset " + DATABASE_ASSET, e);
+                    }
+                }
+                assetChecked = true;
+            }
+        '''
+        out = writer or SourceWriter()
+        for mode in ('Writable', 'Readable'):
+            out.write('    @Override\n')
+            out.write('    public synchronized SQLiteDatabase get%sDatabase() {\n' % (mode))
+            out.write('        copyDatabaseAsset();\n')
+            out.write('        return super.get%sDatabase();\n' % (mode))
+            out.write('    }\n\n')
+        out.write('    private synchronized void copyDatabaseAsset() {\n')
+        out.write('        if (assetChecked) {\n')
+        out.write('            return;\n')
+        out.write('        }\n')
+        out.write('        File file = context.getDatabasePath(DATABASE_NAME);\n')
+        out.write('        if (!file.exists()) {\n')
+        out.write('            File parent = file.getParentFile();\n')
+        out.write('            if (parent != null) {\n')
+        out.write('                parent.mkdirs();\n')
+        out.write('            }\n')
+        out.write('            File temp = new File(file.getPath() + ".tmp");\n')
+        out.write('            try {\n')
+        out.write('                InputStream in = context.getAssets().open(DATABASE_ASSET);\n')
+        out.write('                try {\n')
+        out.write('                    OutputStream out = new FileOutputStream(temp);\n')
+        out.write('                    try {\n')
+        out.write('                        byte[] buffer = new byte[64 * 1024];\n')
+        out.write('                        int count;\n')
+        out.write('                        while ((count = in.read(buffer)) != -1) {\n')
+        out.write('                            out.write(buffer, 0, count);\n')
+        out.write('                        }\n')
+        out.write('                    } finally {\n')
+        out.write('                        out.close();\n')
+        out.write('                    }\n')
+        out.write('                } finally {\n')
+        out.write('                    in.close();\n')
+        out.write('                }\n')
+        out.write('                if (!temp.renameTo(file)) {\n')
+        out.write('                    throw new IOException("cannot rename " + temp + " to " + file);\n')
+        out.write('                }\n')
+        out.write('            } catch (IOException e) {\n')
+        out.write('                temp.delete();\n')
+        out.write('                throw new RuntimeException("cannot copy the database asset " + DATABASE_ASSET, e);\n')
+        out.write('            }\n')
+        out.write('        }\n')
+        out.write('        assetChecked = true;\n')
+        out.write('    }')
+        return out.getvalue()
+
+    @streaming
+    def create_string(self, writer=None):
         '''
         >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user','group'])
         >>> print helper.create_string()
@@ -80,14 +331,16 @@ class AndroidOpenHelper(AndroidClassGenerator):
                 GroupTable.onCreate(db);
             }
         '''
-        result  = '    @Override\n'
-        result += '    public void onCreate(SQLiteDatabase db) {\n'
+        out = writer or SourceWriter()
+        out.write('    @Override\n')
+        out.write('    public void onCreate(SQLiteDatabase db) {\n')
         for table in self.tables:
-            result += '        %sTable.onCreate(db);\n' % (camel_variable_name(table, upper=True))
-        result += '    }'
-        return result
+            out.write('        %sTable.onCreate(db);\n' % (table.class_name))
+        out.write('    }')
+        return out.getvalue()
 
-    def upgrade_string(self):
+    @streaming
+    def upgrade_string(self, writer=None):
         '''
         >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user','group'])
         >>> print helper.upgrade_string()
@@ -96,13 +349,120 @@ class AndroidOpenHelper(AndroidClassGenerator):
                 UserTable.onUpgrade(db, oldVersion, newVersion);
                 GroupTable.onUpgrade(db, oldVersion, newVersion);
             }
+
+        Tables are dropped and recreated children first (see drop_order).
+
+        With a schema history, the versions it covers are upgraded step by step
+        and only the tables that changed are touched:
+
+        >>> old = {'version': 1, 'tables': ['user'], 'user': {'columns': []}}
+        >>> new = {'version': 2, 'tables': ['user'], 'user': {'columns': [{'name': 'age', 'type': 'integer'}]}}
+        >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user'], migrations=Migrations(new, {1: old}))
+        >>> print helper.upgrade_string()
+            @Override
+            public void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {
+                if (oldVersion < OLDEST_UPGRADABLE_VERSION) {
+                    UserTable.onUpgrade(db, oldVersion, newVersion);
+                    return;
+                }
+                for (int version = oldVersion + 1; version <= newVersion; version++) {
+                    switch (version) {
+                    case 2:
+                        upgradeToVersion2(db);
+                        break;
+                    }
+                }
+            }
+        <BLANKLINE>
+            private static void upgradeToVersion2(SQLiteDatabase db) {
+                // user
+                db.execSQL("ALTER TABLE user_table ADD COLUMN age_column INTEGER");
+            }
+
+        With foreign keys on, the steps run with them off (see
+        constructor_string) and are checked once they are done, rolling the
+        upgrade back if a row references a missing one:
+
+        >>> helper = AndroidOpenHelper('com.example.dot', 'test', 'test.db', ['user'], {'foreign_keys': True},
+        ...     migrations=Migrations(new, {1: old}))
+        >>> print helper.upgrade_string()
+            @Override
+            public void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {
+                if (oldVersion < OLDEST_UPGRADABLE_VERSION) {
+                    UserTable.onUpgrade(db, oldVersion, newVersion);
+                    return;
+                }
+                for (int version = oldVersion + 1; version <= newVersion; version++) {
+                    switch (version) {
+                    case 2:
+                        upgradeToVersion2(db);
+                        break;
+                    }
+                }
+                checkForeignKeys(db);
+            }
+        <BLANKLINE>
+            private static void checkForeignKeys(SQLiteDatabase db) {
+                Cursor cursor = db.rawQuery("PRAGMA foreign_key_check", null);
+                try {
+                    if (cursor.moveToFirst()) {
+                        throw new SQLiteConstraintException("FOREIGN KEY constraint failed in " + cursor.getString(0));
+                    }
+                } finally {
+                    cursor.close();
+                }
+            }
+        <BLANKLINE>
+            private static void upgradeToVersion2(SQLiteDatabase db) {
+                // user
+                db.execSQL("ALTER TABLE user_table ADD COLUMN age_column INTEGER");
+            }
         '''
-        result  = '    @Override\n'
-        result += '    public void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {\n'
-        for table in self.tables:
-            result += '        %sTable.onUpgrade(db, oldVersion, newVersion);\n' % (camel_variable_name(table, upper=True))        
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        migrations = self.migrations
+        out.write('    @Override\n')
+        out.write('    public void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {\n')
+        if not (migrations and migrations.steps):
+            for table in drop_order(self.tables):
+                out.write('        %sTable.onUpgrade(db, oldVersion, newVersion);\n' % (table.class_name))
+            out.write('    }')
+            return out.getvalue()
+
+        out.write('        if (oldVersion < OLDEST_UPGRADABLE_VERSION) {\n')
+        for table in drop_order(self.tables):
+            out.write('            %sTable.onUpgrade(db, oldVersion, newVersion);\n' % (table.class_name))
+        out.write('            return;\n')
+        out.write('        }\n')
+        out.write('        for (int version = oldVersion + 1; version <= newVersion; version++) {\n')
+        out.write('            switch (version) {\n')
+        for version, _ in migrations.steps:
+            out.write('            case %d:\n' % (version))
+            out.write('                upgradeToVersion%d(db);\n' % (version))
+            out.write('                break;\n')
+        out.write('            }\n')
+        out.write('        }\n')
+        if self.checks_foreign_keys():
+            out.write('        checkForeignKeys(db);\n')
+        out.write('    }')
+        if self.checks_foreign_keys():
+            out.write('\n\n    private static void checkForeignKeys(SQLiteDatabase db) {\n')
+            out.write('        Cursor cursor = db.rawQuery("PRAGMA foreign_key_check", null);\n')
+            out.write('        try {\n')
+            out.write('            if (cursor.moveToFirst()) {\n')
+            out.write('                throw new SQLiteConstraintException("FOREIGN KEY constraint failed in " + cursor.getString(0));\n')
+            out.write('            }\n')
+            out.write('        } finally {\n')
+            out.write('            cursor.close();\n')
+            out.write('        }\n')
+            out.write('    }')
+        for version, steps in migrations.steps:
+            out.write('\n\n    private static void upgradeToVersion%d(SQLiteDatabase db) {\n' % (version))
+            for table, statements in steps:
+                out.write('        // %s\n' % (table))
+                for sql in statements:
+                    out.write('        db.execSQL("%s");\n' % (sql.replace('\\', '\\\\').replace('"', '\\"')))
+            out.write('    }')
+        return out.getvalue()
                 
 if __name__ == '__main__':
     doctest.testmod()
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+
+import doctest
+import multiprocessing
+import traceback
+from table import AndroidTable
+from content_provider import AndroidContentProvider, reference_errors
+from open_helper import AndroidOpenHelper
+from model_base import AndroidModelBase
+from manifest import schema_hash
+from schema import Table
+from loader import table_source
+from migration import Migrations, history_source, schema_version
+from sink import DirectorySink
+from stats import Stats
+from generator import AndroidClassGenerator
+from utils import camel_variable_name
+
+class GenerationError(Exception):
+    '''
+    Raised after a run when one or more tables failed to render
+    '''
+
+    def __init__(self, errors):
+        self.errors = errors
+        Exception.__init__(self, '%d table(s) failed to generate:\n%s' % (len(errors),
+            '\n'.join('%s: %s' % (table, error) for table, error in errors)))
+
+def table_file_names(table):
+    '''
+    >>> print table_file_names(Table('my_dot'))
+    ['MyDotTable.java', 'MyDot.java']
+    '''
+    return ['%sTable.java' % (table.class_name), '%s.java' % (table.class_name)]
+
+def global_file_names(json_object):
+    '''
+    >>> print global_file_names({'prefix': 'omu'})
+    ['OmuOpenHelper.java', 'OmuProvider.java']
+    '''
+    prefix_class = camel_variable_name(json_object['prefix'], upper=True)
+    return ['%sOpenHelper.java' % (prefix_class), '%sProvider.java' % (prefix_class)]
+
+def table_slice(json_object, name):
+    return {'package': json_object['package'], 'table': name, 'definition': table_source(json_object, name)}
+
+def table_links(table):
+    '''
+    What the provider uses of a table besides its name: the columns
+    referencing other tables and the full-text search columns.
+
+    >>> print sorted(table_links(Table('content', {'columns': [{'name': 'album_id', 'type': 'integer',
+    ...     'references': 'album', 'on_delete': 'cascade'}, {'name': 'uri', 'type': 'text', 'fts': True}]})).items())
+    [('fts', ['uri']), ('references', [['album_id', 'INTEGER', 'REFERENCES album_table(_id) ON DELETE CASCADE']])]
+    '''
+    return {'references': [[column.name, column.sql_type, column.sql_options] for column in table.relations],
+        'fts': [column.name for column in table.fts_columns]}
+
+def global_slice(json_object, links):
+    '''
+    What the provider and open helper depend on. ``links`` maps every table
+    to its table_links (or a hash of them).
+    '''
+    history = history_source(json_object)
+    # the upgrade steps of the open helper depend on the table definitions
+    # as soon as there is a history to diff them against
+    definitions = [table_source(json_object, name) for name in json_object['tables']] if history else None
+    return {'package': json_object['package'], 'prefix': json_object['prefix'],
+        'database': json_object['database'], 'settings': json_object.get('settings'),
+        'asset': json_object.get('asset'),
+        'version': schema_version(json_object), 'history': history, 'definitions': definitions,
+        'tables': list(json_object['tables']), 'links': [links.get(name) for name in json_object['tables']]}
+
+def table_generators(package, table):
+    return [
+        AndroidTable(package, table),
+        AndroidModelBase(package, table)
+    ]
+
+def global_generators(json_object, tables):
+    return [
+        AndroidOpenHelper(
+            json_object['package'],
+            json_object['prefix'],
+            json_object['database'],
+            tables,
+            json_object.get('settings'),
+            Migrations(json_object),
+            json_object.get('asset')),
+        AndroidContentProvider(
+            json_object['package'],
+            json_object['prefix'],
+            tables)
+    ]
+
+def compile_table(json_object, name, errors):
+    '''
+    Load and compile one table of the schema, collecting the failure
+    instead of raising it.
+
+    >>> errors = []
+    >>> json_object = {'dot': {'columns': []}, 'dash': {'columns': [{'name': 'x'}]}}
+    >>> print compile_table(json_object, 'dot', errors).name, compile_table(json_object, 'dash', errors)
+    dot None
+    >>> print [(table, error.splitlines()[-1]) for table, error in errors]
+    [('dash', "KeyError: 'type'")]
+    '''
+    try:
+        return Table(name, json_object[name])
+    except Exception:
+        errors.append((name, traceback.format_exc()))
+        return None
+
+def render_table(job):
+    '''
+    Render the classes of one table. Runs inside a pool worker, so failures are
+    returned instead of raised, and so are the statistics when generation is
+    observed.
+
+    >>> files, error, stats = render_table(('com.example', Table('dot', {'columns': []})))
+    >>> print [file_name for file_name, _ in files], error, stats
+    ['DotTable.java', 'Dot.java'] None None
+    >>> files, error, stats = render_table(('com.example', None))
+    >>> print files, error.splitlines()[-1]
+    [] AttributeError: 'NoneType' object has no attribute 'split'
+    '''
+    package, table = job
+    observers = AndroidClassGenerator.observers
+    stats = Stats() if observers else None
+    if stats is not None:
+        AndroidClassGenerator.observers = [stats]
+    try:
+        files = [(generator.file_name, generator.render())
+            for generator in table_generators(package, table)]
+        error = None
+    except Exception:
+        files, error = [], traceback.format_exc()
+    finally:
+        AndroidClassGenerator.observers = observers
+    return files, error, stats.to_json() if stats is not None else None
+
+def merge_stats(stats):
+    if stats is not None:
+        for observer in AndroidClassGenerator.observers:
+            observer.merge(stats)
+
+def render_tables(jobs, processes=1):
+    if processes > 1 and len(jobs) > 1:
+        pool = multiprocessing.Pool(processes)
+        try:
+            return pool.map(render_table, jobs)
+        finally:
+            pool.close()
+            pool.join()
+    return [render_table(job) for job in jobs]
+
+def create_file(generator, sink, manifest=None):
+    if manifest is not None:
+        return manifest.create_file(generator, sink)
+    return generator.create_file(sink)[0]
+
+def create_table(job, sink, manifest=None):
+    '''
+    Stream the classes of one table straight to disk, returning the error
+    instead of raising it like render_table does.
+    '''
+    package, table = job
+    try:
+        for generator in table_generators(package, table):
+            create_file(generator, sink, manifest)
+    except Exception:
+        return traceback.format_exc()
+    return None
+
+def write_file(package, file_name, text, sink, manifest=None):
+    if manifest is not None:
+        return manifest.write(package, file_name, text, sink)
+    return sink.write(package, file_name, text)[0]
+
+def table_done(errors, manifest, key, slice_hash, job, error):
+    if error is not None:
+        errors.append((job[1].name, error))
+    elif manifest is not None:
+        manifest.slices[key] = slice_hash
+
+def generate(json_object, manifest=None, processes=1, sink=None):
+    '''
+    Generate every class of the schema. With a manifest, only the tables whose
+    schema slice changed are loaded and rendered, and only changed files are
+    written.
+    Without a pool every class is streamed straight to its file; with a pool of
+    ``processes`` workers the tables are rendered in the workers and written in
+    schema order. The provider and open helper always come last. Files go to
+    ``sink``, by default the current directory.
+
+    The provider and open helper are given every table compiled, including
+    the tables an incremental run skipped:
+
+    >>> from manifest import Manifest
+    >>> from sink import MemorySink
+    >>> json_object = {'package': 'com.example', 'prefix': 'test', 'database': 'test.db',
+    ...     'tables': ['album', 'content'], 'album': {'columns': []},
+    ...     'content': {'columns': [{'name': 'album_id', 'type': 'integer', 'references': 'album'}]}}
+    >>> manifest, sink = Manifest('/nonexistent/manifest.json'), MemorySink()
+    >>> generate(json_object, manifest, sink=sink)
+    >>> json_object['tables'].append('user')
+    >>> json_object['user'] = {'columns': []}
+    >>> generate(json_object, manifest, sink=sink)
+    >>> print 'CONTENTS_WITH_ALBUM' in sink.files['com/example/TestProvider.java']
+    True
+
+    A change of the references of a table renders the provider again:
+
+    >>> json_object['user'] = {'columns': [{'name': 'album_id', 'type': 'integer', 'references': 'album'}]}
+    >>> manifest.regenerated = []
+    >>> generate(json_object, manifest, sink=sink)
+    >>> print manifest.regenerated
+    ['com/example/UserTable.java', 'com/example/User.java', 'com/example/TestOpenHelper.java', 'com/example/TestProvider.java']
+    >>> print 'USERS_WITH_ALBUM' in sink.files['com/example/TestProvider.java']
+    True
+
+    So does turning on full-text search for a column:
+
+    >>> json_object['album'] = {'columns': [{'name': 'name', 'type': 'text', 'fts': True}]}
+    >>> generate(json_object, manifest, sink=sink)
+    >>> print 'ALBUM_SEARCH_URI' in sink.files['com/example/TestProvider.java']
+    True
+
+    A reference to a table missing from the schema fails the run like a
+    table that failed to render, naming the table and column:
+
+    >>> json_object['user'] = {'columns': [{'name': 'group_id', 'type': 'integer', 'references': 'group'}]}
+    >>> generate(json_object, manifest, sink=sink)
+    Traceback (most recent call last):
+    ...
+    GenerationError: 1 table(s) failed to generate:
+    user: group_id references unknown table group
+    '''
+    if sink is None:
+        sink = DirectorySink('.', package_layout=False)
+    package = json_object['package']
+    errors = []
+    tables = []
+    jobs = []
+    stubs = set()
+    links = {}
+    for name in json_object['tables']:
+        key = 'table:%s' % (name)
+        slice_hash = schema_hash(table_slice(json_object, name))
+        paths = [sink.path(package, file_name) for file_name in table_file_names(Table(name))]
+        fresh = manifest is not None and manifest.is_fresh(key, slice_hash, paths, sink)
+        if fresh:
+            manifest.skip(key, slice_hash, paths)
+            links[name] = manifest.slices.get('links:%s' % (name))
+            if links[name] is not None:
+                # a stub naming the table until something needs its definition
+                stubs.add(name)
+                tables.append(Table(name))
+                continue
+        table = compile_table(json_object, name, errors)
+        if table is None:
+            continue
+        links[name] = schema_hash(table_links(table))
+        if manifest is not None:
+            manifest.slices['links:%s' % (name)] = links[name]
+        if not fresh:
+            jobs.append((key, slice_hash, (package, table)))
+        tables.append(table)
+
+    if processes > 1 and len(jobs) > 1:
+        results = render_tables([job for _, _, job in jobs], processes)
+        for (key, slice_hash, job), (files, error, stats) in zip(jobs, results):
+            merge_stats(stats)
+            if error is None:
+                for file_name, text in files:
+                    write_file(package, file_name, text, sink, manifest)
+            table_done(errors, manifest, key, slice_hash, job, error)
+    else:
+        for key, slice_hash, job in jobs:
+            table_done(errors, manifest, key, slice_hash, job, create_table(job, sink, manifest))
+
+    slice_hash = schema_hash(global_slice(json_object, links))
+    paths = [sink.path(package, file_name) for file_name in global_file_names(json_object)]
+    if manifest is not None and manifest.is_fresh('global', slice_hash, paths, sink):
+        manifest.skip('global', slice_hash, paths)
+    else:
+        # built only here: the migrations load the history and every table,
+        # and the provider needs the columns of the tables skipped above
+        tables = [table for table in (compile_table(json_object, table.name, errors) if table.name in stubs else table
+            for table in tables) if table is not None]
+        broken = reference_errors(tables)
+        errors.extend(broken)
+        if not broken:
+            for generator in global_generators(json_object, tables):
+                create_file(generator, sink, manifest)
+        if manifest is not None and not errors:
+            manifest.slices['global'] = slice_hash
+
+    if manifest is not None:
+        live_keys = set('%s:%s' % (kind, table) for table in json_object['tables'] for kind in ('table', 'links'))
+        live_keys.add('global')
+        for key in list(manifest.slices):
+            if key not in live_keys:
+                del manifest.slices[key]
+
+    if errors:
+        raise GenerationError(errors)
+
+if __name__ == '__main__':
+    doctest.testmod()
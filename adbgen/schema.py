@@ -0,0 +1,273 @@
+#!/usr/bin/env python
+
+import doctest
+import re
+from utils import camel_variable_name
+
+VARCHAR_PATTERN = re.compile(r'varchar.*')
+FTS_MODULES = ('fts4', 'fts5')
+
+# column type -> (java type, cursor getter, content value suffix)
+JAVA_TYPES = {
+    'text': ('String', 'cursor.getString(%s)', ''),
+    'integer': ('int', 'cursor.getInt(%s)', ''),
+    'timestamp': ('Date', 'new Date(cursor.getLong(%s))', '.getTime()'),
+    'float': ('float', 'cursor.getFloat(%s)', ''),
+    'real': ('float', 'cursor.getFloat(%s)', ''),
+    'boolean': ('boolean', 'cursor.getInt(%s) == 1', ''),
+}
+
+def sql_column_name(name):
+    return '%s_column' % (name)
+
+def java_type(column_type):
+    '''
+    >>> print java_type('varchar(100)')
+    ('String', 'cursor.getString(%s)', '')
+    >>> print java_type('timestamp')
+    ('Date', 'new Date(cursor.getLong(%s))', '.getTime()')
+    >>> print java_type('blob')
+    ('Object', 'cursor.getString(%s)', '')
+    '''
+    if VARCHAR_PATTERN.match(column_type):
+        return JAVA_TYPES['text']
+    return JAVA_TYPES.get(column_type, ('Object', 'cursor.getString(%s)', ''))
+
+class Column(object):
+    '''
+    Compiled column of a table
+
+    >>> column = Column({'name': 'added_at', 'type': 'timestamp', 'options': 'default current_timestamp'})
+    >>> print column.constant, column.variable, column.java_type, column.sql_name
+    ADDED_AT addedAt Date added_at_column
+    >>> print column.sql_type, column.sql_options
+    TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+
+    A column referencing another table (``"references"``, optionally with
+    ``"on_delete"``) is a relation, named after the column without ``_id``:
+
+    >>> column = Column({'name': 'album_id', 'type': 'integer', 'references': 'album', 'on_delete': 'cascade'})
+    >>> print column.sql_options
+    REFERENCES album_table(_id) ON DELETE CASCADE
+    >>> print column.relation, column.relation_variable, column.relation_prefix, column.prefix_constant
+    album album album__ ALBUM_PREFIX
+    >>> print column.references_class, Column({'name': 'author', 'type': 'integer', 'references': 'user'}).relation
+    Album author_ref
+
+    ``"fts": true`` indexes the column in the table's full-text search table:
+
+    >>> print Column({'name': 'description', 'type': 'text', 'fts': True}).fts
+    True
+    '''
+    __slots__ = ('name', 'type', 'options', 'constant', 'variable', 'sql_name',
+        'sql_type', 'sql_options', 'java_type', 'getter', 'value_suffix',
+        'references', 'references_class', 'relation', 'relation_variable', 'relation_prefix', 'prefix_constant',
+        'fts')
+
+    def __init__(self, column):
+        self.name = column['name']
+        self.type = column['type']
+        self.options = column.get('options')
+        self.constant = self.name.upper()
+        self.variable = camel_variable_name(self.name)
+        self.sql_name = sql_column_name(self.name)
+        self.sql_type = self.type.upper()
+        self.sql_options = self.options.upper() if self.options else None
+        self.fts = bool(column.get('fts'))
+        self.references = column.get('references')
+        self.references_class = self.relation = self.relation_variable = None
+        self.relation_prefix = self.prefix_constant = None
+        if self.references:
+            clause = 'REFERENCES %s_table(_id)' % (self.references)
+            if column.get('on_delete'):
+                clause += ' ON DELETE %s' % (column['on_delete'].upper())
+            self.sql_options = '%s %s' % (self.sql_options, clause) if self.sql_options else clause
+            self.references_class = camel_variable_name(self.references, upper=True)
+            # the relation must not take the name of the column's own field
+            self.relation = self.name[:-len('_id')] if self.name.endswith('_id') else '%s_ref' % (self.name)
+            self.relation_variable = camel_variable_name(self.relation)
+            self.relation_prefix = '%s__' % (self.relation)
+            self.prefix_constant = '%s_PREFIX' % (self.relation.upper())
+        self.java_type, self.getter, self.value_suffix = java_type(self.type)
+
+class Index(object):
+    '''
+    Compiled index of a table
+
+    >>> index = Index('my_dot', 'MyDot', {'columns': ['coord_x', 'coord_y'], 'unique': False})
+    >>> print index.name_constant, index.name_value
+    MY_DOT_COORD_X_COORD_Y_INDEX_NAME my_dot__coord_x__coord_y__idx
+    >>> print index.create_constant
+    INDEX_MY_DOT_COORD_X_COORD_Y_CREATE
+    >>> print index.column_constants, index.sql_columns
+    ['MyDotColumns.COORD_X', 'MyDotColumns.COORD_Y'] ['coord_x_column', 'coord_y_column']
+    '''
+    __slots__ = ('columns', 'unique', 'name_constant', 'name_value', 'create_constant',
+        'column_constants', 'sql_columns')
+
+    def __init__(self, table_name, class_name, index):
+        self.columns = list(index['columns'])
+        self.unique = bool(index.get('unique'))
+        upper_columns = ''.join('_' + column.upper() for column in self.columns)
+        self.name_constant = '%s%s_INDEX_NAME' % (table_name.upper(), upper_columns)
+        self.name_value = '%s%s__idx' % (table_name, ''.join('__' + column for column in self.columns))
+        self.create_constant = 'INDEX_%s%s_CREATE' % (table_name.upper(), upper_columns)
+        self.column_constants = ['%sColumns.%s' % (class_name, column.upper()) for column in self.columns]
+        self.sql_columns = [sql_column_name(column) for column in self.columns]
+
+class Projection(object):
+    '''
+    Compiled named projection of a table, always including ``_id``
+
+    >>> projection = Projection('MyDotColumns', 'list', ['coord_x'])
+    >>> print projection.constant, projection.column_constants
+    PROJECTION_LIST ['BaseColumns._ID', 'MyDotColumns.COORD_X']
+    '''
+    __slots__ = ('name', 'columns', 'constant', 'column_constants')
+
+    def __init__(self, columns_class, name, columns):
+        self.name = name
+        self.columns = list(columns)
+        self.constant = 'PROJECTION_%s' % (name.upper())
+        self.column_constants = ['BaseColumns._ID'] + ['%s.%s' % (columns_class, column.upper())
+            for column in self.columns]
+
+class Table(object):
+    '''
+    Compiled table of a schema
+
+    >>> table = Table('my_dot', {'columns': [{'name': 'coord_x', 'type': 'integer'}]})
+    >>> print table.class_name, table.variable, table.constant, table.sql_name
+    MyDot myDot MY_DOT my_dot_table
+    >>> print table.columns_class, [column.constant for column in table.columns]
+    MyDotColumns ['COORD_X']
+    >>> print [projection.constant for projection in table.projections]
+    ['PROJECTION_ALL']
+    >>> print table.relations, table.fts_columns
+    [] []
+
+    Tables with ``"fts"`` columns get an FTS4 shadow table, or FTS5 with
+    ``"fts_module": "fts5"`` (not built into Android's SQLite):
+
+    >>> table = Table('note', {'columns': [{'name': 'body', 'type': 'text', 'fts': True}]})
+    >>> print table.fts_name, table.fts_module, [column.name for column in table.fts_columns]
+    note_fts fts4 ['body']
+    >>> Table('note', {'columns': [], 'fts_module': 'fts3'})
+    Traceback (most recent call last):
+    ...
+    ValueError: note: fts_module must be one of fts4, fts5
+    '''
+    __slots__ = ('name', 'definition', 'class_name', 'variable', 'constant', 'sql_name',
+        'columns_class', 'columns', 'indexes', 'projections', 'relations',
+        'fts_columns', 'fts_name', 'fts_module')
+
+    def __init__(self, name, definition=None):
+        self.name = name
+        self.definition = definition or {}
+        self.class_name = camel_variable_name(name, upper=True)
+        self.variable = camel_variable_name(name)
+        self.constant = name.upper()
+        self.sql_name = '%s_table' % (name)
+        self.columns_class = '%sColumns' % (self.class_name)
+        self.columns = [Column(column) for column in self.definition.get('columns', [])]
+        self.relations = [column for column in self.columns if column.references]
+        self.fts_columns = [column for column in self.columns if column.fts]
+        self.fts_name = '%s_fts' % (name)
+        self.fts_module = self.definition.get('fts_module', 'fts4')
+        if self.fts_module not in FTS_MODULES:
+            raise ValueError('%s: fts_module must be one of %s' % (name, ', '.join(FTS_MODULES)))
+        self.indexes = [Index(name, self.class_name, index)
+            for index in self.definition.get('indexes') or []]
+        self.projections = [Projection(self.columns_class, 'all', [column.name for column in self.columns])]
+        for projection_name, columns in sorted((self.definition.get('projections') or {}).items()):
+            self.projections.append(Projection(self.columns_class, projection_name, columns))
+
+# setting -> allowed values (None: any integer), in the order the pragmas run;
+# page_size comes first as it only applies before the database is created
+PRAGMAS = (
+    ('page_size', None),
+    ('synchronous', ('off', 'normal', 'full', 'extra')),
+    ('cache_size', None),
+    ('temp_store', ('default', 'file', 'memory')),
+)
+
+class Settings(object):
+    '''
+    Compiled database settings (``"settings"`` in schema.js)
+
+    >>> settings = Settings({'wal': True, 'synchronous': 'normal', 'cache_size': -8000,
+    ...     'foreign_keys': True, 'lookaside': {'slot_size': 1200, 'slot_count': 100}})
+    >>> print settings.wal, settings.foreign_keys, settings.lookaside
+    True True (1200, 100)
+    >>> print settings.pragmas
+    ['synchronous = NORMAL', 'cache_size = -8000']
+    >>> Settings({'synchronous': 'sometimes'})
+    Traceback (most recent call last):
+    ...
+    ValueError: synchronous must be one of off, normal, full, extra
+    >>> Settings({'journal': 'wal'})
+    Traceback (most recent call last):
+    ...
+    ValueError: unknown database setting(s): journal
+    '''
+    __slots__ = ('wal', 'foreign_keys', 'pragmas', 'lookaside')
+
+    def __init__(self, settings=None):
+        settings = settings or {}
+        unknown = set(settings) - set(name for name, _ in PRAGMAS) - set(['wal', 'foreign_keys', 'lookaside'])
+        if unknown:
+            raise ValueError('unknown database setting(s): %s' % (', '.join(sorted(unknown))))
+        self.wal = bool(settings.get('wal'))
+        self.foreign_keys = bool(settings.get('foreign_keys'))
+        self.pragmas = []
+        for name, values in PRAGMAS:
+            value = settings.get(name)
+            if value is None:
+                continue
+            if values is None:
+                value = int(value)
+            elif str(value).lower() in values:
+                value = str(value).upper()
+            else:
+                raise ValueError('%s must be one of %s' % (name, ', '.join(values)))
+            self.pragmas.append('%s = %s' % (name, value))
+        lookaside = settings.get('lookaside')
+        self.lookaside = (int(lookaside['slot_size']), int(lookaside['slot_count'])) if lookaside else None
+
+    def __nonzero__(self):
+        return self.wal or self.foreign_keys or bool(self.pragmas) or self.lookaside is not None
+
+class Schema(object):
+    '''
+    Compiled schema (schema.js)
+
+    >>> schema = Schema({'package': 'com.example', 'prefix': 'test', 'database': 'test.db',
+    ...     'tables': ['dot'], 'dot': {'columns': []}})
+    >>> print schema.prefix_class, [table.class_name for table in schema.tables]
+    Test ['Dot']
+    '''
+    __slots__ = ('package', 'prefix', 'prefix_class', 'database', 'settings', 'tables')
+
+    def __init__(self, json_object):
+        self.package = json_object['package']
+        self.prefix = json_object['prefix']
+        self.prefix_class = camel_variable_name(self.prefix, upper=True)
+        self.database = json_object['database']
+        self.settings = Settings(json_object.get('settings'))
+        self.tables = [Table(table, json_object[table]) for table in json_object['tables']]
+
+def as_table(table, columns=None, indexes=None, projections=None):
+    '''
+    Return ``table`` if it is already compiled, otherwise compile it from a
+    table name and its raw column and index definitions.
+
+    >>> table = as_table('dot', [{'name': 'coord_x', 'type': 'integer'}])
+    >>> as_table(table) is table
+    True
+    '''
+    if isinstance(table, Table):
+        return table
+    return Table(table, {'columns': columns or [], 'indexes': indexes, 'projections': projections})
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -0,0 +1,170 @@
+#!/usr/bin/env python
+
+import doctest
+import hashlib
+import os
+import zipfile
+from writer import SourceWriter, BUFFER_SIZE
+
+def package_path(package, file_name):
+    '''
+    >>> print package_path('com.example.test', 'DotTable.java')
+    com/example/test/DotTable.java
+    '''
+    return '/'.join(package.split('.') + [file_name])
+
+class Sink(object):
+    '''
+    Destination of the generated classes. ``unchanged`` is an optional
+    callback taking the digest of the new content and returning True when
+    the file must not be written. ``close(commit=False)`` ends a failed run,
+    discarding what a sink only publishes on close.
+    '''
+
+    def path(self, package, file_name):
+        raise NotImplementedError
+
+    def exists(self, path):
+        return False
+
+    def digest(self, path):
+        return None
+
+    def create_file(self, generator, unchanged=None):
+        return self.write(generator.package, generator.file_name, generator.render(), unchanged)
+
+    def write(self, package, file_name, text, unchanged=None):
+        raise NotImplementedError
+
+    def close(self, commit=True):
+        pass
+
+class DirectorySink(Sink):
+    '''
+    Write every class to its own file under ``root``, in the package's
+    directory unless ``package_layout`` is off. Files are streamed to a
+    temporary file and renamed into place, so a reader never sees a half
+    written class.
+    '''
+
+    def __init__(self, root='.', package_layout=True):
+        self.root = root
+        self.package_layout = package_layout
+
+    def path(self, package, file_name):
+        if self.package_layout:
+            return os.path.normpath(os.path.join(self.root, *package_path(package, file_name).split('/')))
+        return os.path.normpath(os.path.join(self.root, file_name))
+
+    def exists(self, path):
+        return os.path.exists(path)
+
+    def digest(self, path):
+        if not os.path.exists(path):
+            return None
+        digest = hashlib.sha1()
+        with open(path, 'rb') as fin:
+            for block in iter(lambda: fin.read(BUFFER_SIZE), ''):
+                digest.update(block)
+        return digest.hexdigest()
+
+    def commit(self, path, emit, unchanged):
+        directory = os.path.dirname(path)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        temp_path = '%s.%d.tmp' % (path, os.getpid())
+        try:
+            with open(temp_path, 'w', BUFFER_SIZE) as fout:
+                writer = SourceWriter(fout, hashlib.sha1())
+                emit(writer)
+            digest = writer.hexdigest()
+            if unchanged is not None and unchanged(digest):
+                os.remove(temp_path)
+                return False, digest
+            os.rename(temp_path, path)
+        except:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return True, digest
+
+    def create_file(self, generator, unchanged=None):
+        return self.commit(self.path(generator.package, generator.file_name), generator.emit, unchanged)
+
+    def write(self, package, file_name, text, unchanged=None):
+        return self.commit(self.path(package, file_name), lambda writer: writer.write(text), unchanged)
+
+class ZipSink(Sink):
+    '''
+    Write every class into a single source jar (zip), in one pass. The jar
+    is built next to its destination and renamed into place on close, or
+    deleted, keeping the previous jar, when the run failed.
+
+    >>> import tempfile
+    >>> file_name = os.path.join(tempfile.mkdtemp(), 'classes.jar')
+    >>> sink = ZipSink(file_name)
+    >>> print sink.write('com.example', 'Dot.java', 'class Dot {}')[0]
+    True
+    >>> sink.close(commit=False)
+    >>> print os.listdir(os.path.dirname(file_name))
+    []
+    '''
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.temp_name = '%s.%d.tmp' % (file_name, os.getpid())
+        self.archive = zipfile.ZipFile(self.temp_name, 'w', zipfile.ZIP_DEFLATED)
+
+    def path(self, package, file_name):
+        return package_path(package, file_name)
+
+    def write(self, package, file_name, text, unchanged=None):
+        digest = hashlib.sha1(text).hexdigest()
+        if unchanged is not None and unchanged(digest):
+            return False, digest
+        self.archive.writestr(self.path(package, file_name), text)
+        return True, digest
+
+    def close(self, commit=True):
+        self.archive.close()
+        if commit:
+            os.rename(self.temp_name, self.file_name)
+        else:
+            os.remove(self.temp_name)
+
+class MemorySink(Sink):
+    '''
+    Keep every class in memory, keyed by its package path.
+
+    >>> sink = MemorySink()
+    >>> print sink.write('com.example', 'Dot.java', 'class Dot {}')
+    (True, '362ea12df2072554ed2d54fd39fd37e5d5016312')
+    >>> print sink.files
+    {'com/example/Dot.java': 'class Dot {}'}
+    >>> print sink.write('com.example', 'Dot.java', 'class Dot {}', lambda digest: digest == sink.digest('com/example/Dot.java'))
+    (False, '362ea12df2072554ed2d54fd39fd37e5d5016312')
+    '''
+
+    def __init__(self):
+        self.files = {}
+
+    def path(self, package, file_name):
+        return package_path(package, file_name)
+
+    def exists(self, path):
+        return path in self.files
+
+    def digest(self, path):
+        if path not in self.files:
+            return None
+        return hashlib.sha1(self.files[path]).hexdigest()
+
+    def write(self, package, file_name, text, unchanged=None):
+        digest = hashlib.sha1(text).hexdigest()
+        if unchanged is not None and unchanged(digest):
+            return False, digest
+        self.files[self.path(package, file_name)] = text
+        return True, digest
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -0,0 +1,106 @@
+#!/usr/bin/env python
+
+import doctest
+import json
+
+GLOBAL_TABLE = '(global)'
+
+def new_entry():
+    return {'seconds': 0.0, 'bytes': 0, 'calls': 0}
+
+def add_entry(entry, seconds, size, calls=1):
+    entry['seconds'] += seconds
+    entry['bytes'] += size
+    entry['calls'] += calls
+
+def merge_entries(entries, other):
+    for key, entry in other.items():
+        add_entry(entries.setdefault(key, new_entry()), entry['seconds'], entry['bytes'], entry['calls'])
+
+def table_of(generator):
+    table = getattr(generator, 'table', None)
+    return table.name if table is not None else GLOBAL_TABLE
+
+class Stats(object):
+    '''
+    Generation statistics, recorded through AndroidClassGenerator.observers
+
+    >>> stats = Stats()
+    >>> class Generator(object):
+    ...     table = None
+    >>> stats.section(Generator(), 'create_string', 0.5, 100)
+    >>> stats.section(Generator(), 'create_string', 0.25, 50)
+    >>> stats.emitted(Generator(), 1.0, 200)
+    >>> print stats.sections['Generator.create_string']
+    {'seconds': 0.75, 'bytes': 150, 'calls': 2}
+    >>> other = Stats()
+    >>> other.merge(stats.to_json())
+    >>> print other.generators['Generator'], other.tables['(global)']['calls']
+    {'seconds': 1.0, 'bytes': 200, 'calls': 1} 1
+    '''
+
+    def __init__(self):
+        self.generators = {}
+        self.sections = {}
+        self.tables = {}
+        self.writes = {}
+
+    def section(self, generator, string_attr, seconds, size):
+        key = '%s.%s' % (generator.__class__.__name__, string_attr)
+        add_entry(self.sections.setdefault(key, new_entry()), seconds, size)
+
+    def emitted(self, generator, seconds, size):
+        add_entry(self.generators.setdefault(generator.__class__.__name__, new_entry()), seconds, size)
+        add_entry(self.tables.setdefault(table_of(generator), new_entry()), seconds, size)
+
+    def created(self, generator, seconds):
+        add_entry(self.writes.setdefault(generator.__class__.__name__, new_entry()), seconds, 0)
+
+    def to_json(self):
+        return {'generators': self.generators, 'sections': self.sections,
+            'tables': self.tables, 'create_file': self.writes}
+
+    def merge(self, json_object):
+        merge_entries(self.generators, json_object['generators'])
+        merge_entries(self.sections, json_object['sections'])
+        merge_entries(self.tables, json_object['tables'])
+        merge_entries(self.writes, json_object['create_file'])
+
+    def save(self, file_name):
+        with open(file_name, 'w') as fout:
+            json.dump(self.to_json(), fout, indent=4, sort_keys=True)
+
+    def summary(self, top_tables=10):
+        '''
+        >>> stats = Stats()
+        >>> class Generator(object):
+        ...     table = None
+        >>> stats.emitted(Generator(), 0.5, 1024)
+        >>> stats.section(Generator(), 'create_string', 0.25, 512)
+        >>> print stats.summary()
+        generator                                           calls    seconds       bytes
+        Generator                                               1     0.5000        1024
+        <BLANKLINE>
+        section                                             calls    seconds       bytes
+        Generator.create_string                                 1     0.2500         512
+        <BLANKLINE>
+        table (10 slowest)                                  calls    seconds       bytes
+        (global)                                                1     0.5000        1024
+        '''
+        def block(title, entries, keys):
+            lines = ['%-48s %8s %10s %11s' % (title, 'calls', 'seconds', 'bytes')]
+            for key in keys:
+                entry = entries[key]
+                lines.append('%-48s %8d %10.4f %11d' % (key, entry['calls'], entry['seconds'], entry['bytes']))
+            return lines
+
+        tables = sorted(self.tables, key=lambda table: -self.tables[table]['seconds'])[:top_tables]
+        lines = block('generator', self.generators, sorted(self.generators))
+        lines.append('')
+        lines += block('section', self.sections, sorted(self.sections))
+        lines.append('')
+        lines += block('table (%d slowest)' % (top_tables), self.tables, tables)
+        return '\n'.join(lines)
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -2,36 +2,72 @@
 
 import doctest
 from generator import AndroidClassGenerator
+from writer import SourceWriter, streaming
+from schema import as_table
+from ddl import fts_ddl
 from utils import camel_variable_name
 
+# java type -> statement binding of a value, by position
+BINDERS = {
+    'int': 'statement.bindLong(%(position)d, %(value)s);',
+    'float': 'statement.bindDouble(%(position)d, %(value)s);',
+    'boolean': 'statement.bindLong(%(position)d, %(value)s ? 1 : 0);',
+    'String': 'statement.bindString(%(position)d, %(value)s);',
+    'Date': 'statement.bindLong(%(position)d, %(value)s.getTime());',
+}
+
+# widest table whose inserts are cached per set of columns (a long mask)
+MAX_MASKED_COLUMNS = 64
+
+def java_string(sql):
+    return '"%s"' % (sql.replace('\\', '\\\\').replace('"', '\\"'))
+
 class AndroidTable(AndroidClassGenerator):
     '''
     Generate table file (XXXTable.java)
     '''
     
-    def __init__(self, package, name, columns, indexes=None):
+    def __init__(self, package, name, columns=None, indexes=None, projections=None):
         self.package = package
-        self.name = name
-        self.columns = columns
-        self.indexes = indexes
-        self.index_create_string_vars = []
-        self.index_names = []
-        self.file_name = '%sTable.java' % (camel_variable_name(self.name, upper=True))
-        self.string_attrs = ['name_string', 'columns_class_string', 'indexs_create_string', 
-            'create_string', 'upgrade_string']
+        self.table = as_table(name, columns, indexes, projections)
+        self.name = self.table.name
+        self.file_name = '%sTable.java' % (self.table.class_name)
+        self.string_attrs = ['name_string', 'columns_class_string', 'projections_string', 'indexs_create_string', 
+            'create_string', 'upgrade_string', 'statements_string']
+        if self.table.relations:
+            self.string_attrs.insert(3, 'relations_string')
+        if self.table.fts_columns:
+            self.string_attrs.insert(self.string_attrs.index('create_string'), 'fts_string')
         
     def header_string(self):
         '''
         >>> table = AndroidTable('th.ac.ku.sci.cs.android.sutee.demolistview', 'dot', [])
         >>> print table.header_string()
         package th.ac.ku.sci.cs.android.sutee.demolistview;
+        import android.content.ContentValues;
+        import android.database.DatabaseUtils;
+        import android.database.SQLException;
         import android.database.sqlite.SQLiteDatabase;
+        import android.database.sqlite.SQLiteStatement;
         import android.provider.BaseColumns;
+        import android.util.Log;
         <BLANKLINE>
         '''
         result = 'package ' + self.package + ';\n'
+        result += 'import android.content.ContentValues;\n'
+        result += 'import android.database.DatabaseUtils;\n'
+        result += 'import android.database.SQLException;\n'
         result += 'import android.database.sqlite.SQLiteDatabase;\n'
+        result += 'import android.database.sqlite.SQLiteStatement;\n'
         result += 'import android.provider.BaseColumns;\n'
+        result += 'import android.util.Log;\n'
+        imports = []
+        if any(column.java_type == 'Date' for column in self.table.columns):
+            imports.append('java.util.Date')
+        if 0 < len(self.table.columns) <= MAX_MASKED_COLUMNS:
+            imports += ['java.util.HashMap', 'java.util.Map']
+        if imports:
+            result += '\n' + ''.join('import %s;\n' % (name) for name in imports)
         return result
         
     def class_string(self):
@@ -42,7 +78,7 @@ class AndroidTable(AndroidClassGenerator):
         %s
         }
         '''
-        result  = 'public final class %sTable {\n' % (camel_variable_name(self.name, upper=True))
+        result  = 'public final class %sTable {\n' % (self.table.class_name)
         result += '%s\n'
         result += '}'
         return result
@@ -58,7 +94,8 @@ class AndroidTable(AndroidClassGenerator):
         '''
         return '    public static final String TABLE_NAME = "%s_table";' % (self.name)
         
-    def columns_class_string(self):
+    @streaming
+    def columns_class_string(self, writer=None):
         '''
         >>> table = AndroidTable('com.example.android', 'my_dot', [{'name':'coord_x','type':'integer','options':'unique'}, {'name':'coord_y','type':'integer'}])
         >>> print table.columns_class_string()
@@ -67,13 +104,52 @@ class AndroidTable(AndroidClassGenerator):
                 public static final String COORD_Y = "coord_y";
             }
         '''
-        result = '    public static class %sColumns implements BaseColumns {\n' % (camel_variable_name(self.name, upper=True))
-        for column in self.columns:
-            result += '        public static final String ' + column['name'].upper() + ' = "' + column['name'] + '_column";\n'
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        out.write('    public static class %s implements BaseColumns {\n' % (self.table.columns_class))
+        for column in self.table.columns:
+            out.write('        public static final String %s = "%s";\n' % (column.constant, column.sql_name))
+        out.write('    }')
+        return out.getvalue()
         
-    def upgrade_string(self):
+    @streaming
+    def projections_string(self, writer=None):
+        '''
+        >>> table = AndroidTable('com.example.android', 'my_dot', [{'name':'coord_x','type':'integer'}, {'name':'coord_y','type':'integer'}], projections={'x': ['coord_x']})
+        >>> print table.projections_string()
+            public static final String[] PROJECTION_ALL = {
+                BaseColumns._ID,
+                MyDotColumns.COORD_X,
+                MyDotColumns.COORD_Y
+            };
+            public static final String[] PROJECTION_X = {
+                BaseColumns._ID,
+                MyDotColumns.COORD_X
+            };
+        '''
+        out = writer or SourceWriter()
+        last = len(self.table.projections) - 1
+        for index, projection in enumerate(self.table.projections):
+            out.write('    public static final String[] %s = {\n' % (projection.constant))
+            out.write(',\n'.join('        %s' % (constant) for constant in projection.column_constants))
+            out.write('\n    };')
+            if index < last:
+                out.write('\n')
+        return out.getvalue()
+
+    def relations_string(self):
+        '''
+        Prefix of the columns of a referenced table in the provider's joined
+        queries (e.g. album__name_column).
+
+        >>> table = AndroidTable('com.example.android', 'content', [{'name': 'album_id', 'type': 'integer', 'references': 'album'}])
+        >>> print table.relations_string()
+            public static final String ALBUM_PREFIX = "album__";
+        '''
+        return '\n'.join('    public static final String %s = "%s";' % (column.prefix_constant, column.relation_prefix)
+            for column in self.table.relations)
+
+    @streaming
+    def upgrade_string(self, writer=None):
         '''
         >>> table = AndroidTable('com.example.android', 'my_dot', [{'name':'coord_x','type':'integer','options':'unique'}, {'name':'coord_y','type':'integer'}])
         >>> print table.upgrade_string()
@@ -90,15 +166,19 @@ class AndroidTable(AndroidClassGenerator):
                 MyDotTable.onCreate(db);
             }
         '''
-        result  = '    public static void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {\n'
-        result += '        db.execSQL("DROP TABLE IF EXISTS " + %sTable.TABLE_NAME);\n' % (camel_variable_name(self.name, upper=True))
-        for index_name in self.index_names:
-            result += '        db.execSQL("DROP INDEX IF EXISTS " + %s);\n' % (index_name)        
-        result += '        %sTable.onCreate(db);\n' % (camel_variable_name(self.name, upper=True))
-        result += '    }'
-        return result
+        out = writer or SourceWriter()
+        out.write('    public static void onUpgrade(SQLiteDatabase db, int oldVersion, int newVersion) {\n')
+        out.write('        db.execSQL("DROP TABLE IF EXISTS " + %sTable.TABLE_NAME);\n' % (self.table.class_name))
+        for index in self.table.indexes:
+            out.write('        db.execSQL("DROP INDEX IF EXISTS " + %s);\n' % (index.name_constant))
+        if self.table.fts_columns:
+            out.write('        db.execSQL("DROP TABLE IF EXISTS " + FTS_TABLE_NAME);\n')
+        out.write('        %sTable.onCreate(db);\n' % (self.table.class_name))
+        out.write('    }')
+        return out.getvalue()
         
-    def create_string(self):
+    @streaming
+    def create_string(self, writer=None):
         '''
         >>> table = AndroidTable('com.example.android', 'dot', [{'name':'coord_x','type':'integer','options':'unique'}, {'name':'coord_y','type':'integer'}])
         >>> _ = table.indexs_create_string()
@@ -140,27 +220,456 @@ class AndroidTable(AndroidClassGenerator):
                 db.execSQL(INDEX_MY_DOT_COORD_X_COORD_Y_CREATE);
             }
         '''
-        result  = '    public static void onCreate(SQLiteDatabase db) {\n'
-        result += '        StringBuilder sb = new StringBuilder();\n'
-        result += '        sb.append("CREATE TABLE " + %sTable.TABLE_NAME + " (");\n' % (camel_variable_name(self.name, upper=True))
-        result += '        sb.append(BaseColumns._ID + " INTEGER PRIMARY KEY, ");\n'
+        out = writer or SourceWriter()
+        out.write('    public static void onCreate(SQLiteDatabase db) {\n')
+        out.write('        StringBuilder sb = new StringBuilder();\n')
+        out.write('        sb.append("CREATE TABLE " + %sTable.TABLE_NAME + " (");\n' % (self.table.class_name))
+        out.write('        sb.append(BaseColumns._ID + " INTEGER PRIMARY KEY, ");\n')
 
-        for index, column in enumerate(self.columns):
+        last = len(self.table.columns) - 1
+        for index, column in enumerate(self.table.columns):
             tails = ''
-            if 'options' in column:
-                tails += ' %s' % (column['options'].upper())
-            if index < len(self.columns) - 1:
+            if column.sql_options:
+                tails += ' %s' % (column.sql_options)
+            if index < last:
                 tails += ', '
-            result += '        sb.append(%sColumns.%s + " %s%s");\n' % (camel_variable_name(self.name, upper=True), 
-                column['name'].upper(), column['type'].upper(), tails)
-        result += '        sb.append(");");\n'
-        result += '        db.execSQL(sb.toString());\n'
-        for index_create_string_var in self.index_create_string_vars:
-            result += '        db.execSQL(%s);\n' % (index_create_string_var)
-        result += '    }'
-        return result
+            out.write('        sb.append(%s.%s + " %s%s");\n' % (self.table.columns_class,
+                column.constant, column.sql_type, tails))
+        out.write('        sb.append(");");\n')
+        out.write('        db.execSQL(sb.toString());\n')
+        for index in self.table.indexes:
+            out.write('        db.execSQL(%s);\n' % (index.create_constant))
+        if self.table.fts_columns:
+            out.write('        for (String sql : FTS_CREATE) {\n')
+            out.write('            db.execSQL(sql);\n')
+            out.write('        }\n')
+        out.write('    }')
+        return out.getvalue()
+
+    @streaming
+    def fts_string(self, writer=None):
+        '''
+        The full-text search table of the ``"fts"`` columns and the triggers
+        keeping it in sync with the table.
+
+        >>> table = AndroidTable('com.example.android', 'note', [{'name': 'body', 'type': 'text', 'fts': True}])
+        >>> print table.fts_string()
+            public static final String FTS_TABLE_NAME = "note_fts";
+            private static final String[] FTS_CREATE = {
+                "CREATE VIRTUAL TABLE note_fts USING fts4(content='note_table', body_column)",
+                "CREATE TRIGGER note_fts_ai AFTER INSERT ON note_table BEGIN INSERT INTO note_fts(docid, body_column) VALUES (new._id, new.body_column); END",
+                "CREATE TRIGGER note_fts_bd BEFORE DELETE ON note_table BEGIN DELETE FROM note_fts WHERE docid = old._id; END",
+                "CREATE TRIGGER note_fts_bu BEFORE UPDATE OF body_column ON note_table BEGIN DELETE FROM note_fts WHERE docid = old._id; END",
+                "CREATE TRIGGER note_fts_au AFTER UPDATE OF body_column ON note_table BEGIN INSERT INTO note_fts(docid, body_column) VALUES (new._id, new.body_column); END"
+            };
+        '''
+        out = writer or SourceWriter()
+        out.write('    public static final String FTS_TABLE_NAME = "%s";\n' % (self.table.fts_name))
+        out.write('    private static final String[] FTS_CREATE = {\n')
+        out.write(',\n'.join('        %s' % (java_string(sql)) for sql in fts_ddl(self.table)))
+        out.write('\n    };')
+        return out.getvalue()
+
+    def statements_sql(self):
+        '''
+        Insert (of every column), update by id and delete by id statements.
+        Columns are bound by position (``?1`` is the first column, the id
+        comes last), the same for insert and update. Inserts of fewer columns
+        keep the positions (see statements_string), so the columns left out
+        get their default and a NULL stays NULL.
+
+        >>> table = AndroidTable('com.example.android', 'dot', [{'name': 'coord_x', 'type': 'integer'},
+        ...     {'name': 'added_at', 'type': 'timestamp', 'options': 'not null default current_timestamp'}])
+        >>> for sql in table.statements_sql():
+        ...     print sql
+        INSERT INTO dot_table (coord_x_column, added_at_column) VALUES (?1, ?2)
+        UPDATE dot_table SET coord_x_column = ?1, added_at_column = ?2 WHERE _id = ?3
+        DELETE FROM dot_table WHERE _id = ?1
+        >>> print AndroidTable('com.example.android', 'dot', []).statements_sql()[:2]
+        ('INSERT INTO dot_table DEFAULT VALUES', None)
+        '''
+        table = self.table
+        if not table.columns:
+            insert, update = 'INSERT INTO %s DEFAULT VALUES' % (table.sql_name), None
+        else:
+            insert = 'INSERT INTO %s (%s) VALUES (%s)' % (table.sql_name,
+                ', '.join(column.sql_name for column in table.columns),
+                ', '.join('?%d' % (position) for position in range(1, len(table.columns) + 1)))
+            update = 'UPDATE %s SET %s WHERE _id = ?%d' % (table.sql_name, ', '.join('%s = ?%d' % (column.sql_name, position)
+                for position, column in enumerate(table.columns, 1)), len(table.columns) + 1)
+        return insert, update, 'DELETE FROM %s WHERE _id = ?1' % (table.sql_name)
+
+    @streaming
+    def statements_string(self, writer=None):
+        '''
+        Compiled statements reused for the writes by id, one set per thread
+        and database, as a statement holds its bindings. ``insert`` and
+        ``updateById`` take the ContentValues the provider gets and fall back
+        to SQLiteDatabase when the values name columns the statement does not
+        bind (``_id`` or unknown columns, or a partial update). There is one
+        insert per set of columns the values name, so the columns left out
+        get their default and an explicit NULL stays NULL.
+
+        >>> table = AndroidTable('com.example.android', 'dot', [{'name': 'label', 'type': 'text'},
+        ...     {'name': 'added_at', 'type': 'timestamp', 'options': 'default current_timestamp'}])
+        >>> print table.statements_string()
+            private static final String INSERT_SQL = "INSERT INTO dot_table (label_column, added_at_column) VALUES (?1, ?2)";
+            private static final String UPDATE_BY_ID_SQL = "UPDATE dot_table SET label_column = ?1, added_at_column = ?2 WHERE _id = ?3";
+            private static final String DELETE_BY_ID_SQL = "DELETE FROM dot_table WHERE _id = ?1";
+            private static final int COLUMN_COUNT = 2;
+            private static final long ALL_COLUMNS = (1L << COLUMN_COUNT) - 1;
+            private static final String[] COLUMNS = {
+                DotColumns.LABEL,
+                DotColumns.ADDED_AT
+            };
+        <BLANKLINE>
+            private static final ThreadLocal<Statements> STATEMENTS = new ThreadLocal<Statements>();
+        <BLANKLINE>
+            public static Statements statements(SQLiteDatabase db) {
+                Statements statements = STATEMENTS.get();
+                if (statements == null || statements.db != db) {
+                    if (statements != null) {
+                        statements.close();
+                    }
+                    statements = new Statements(db);
+                    STATEMENTS.set(statements);
+                }
+                return statements;
+            }
+        <BLANKLINE>
+            public static final class Statements {
+                private final SQLiteDatabase db;
+                private final Map<Long, SQLiteStatement> inserts = new HashMap<Long, SQLiteStatement>();
+                private SQLiteStatement updateById;
+                private SQLiteStatement deleteById;
+        <BLANKLINE>
+                private Statements(SQLiteDatabase db) {
+                    this.db = db;
+                }
+        <BLANKLINE>
+                public SQLiteStatement insertStatement() {
+                    return insertStatement(ALL_COLUMNS);
+                }
+        <BLANKLINE>
+                public SQLiteStatement insertStatement(long columns) {
+                    SQLiteStatement statement = inserts.get(columns);
+                    if (statement == null) {
+                        statement = db.compileStatement(insertSql(columns));
+                        inserts.put(columns, statement);
+                    }
+                    statement.clearBindings();
+                    return statement;
+                }
+        <BLANKLINE>
+                public SQLiteStatement updateByIdStatement(long id) {
+                    if (updateById == null) {
+                        updateById = db.compileStatement(UPDATE_BY_ID_SQL);
+                    }
+                    updateById.clearBindings();
+                    updateById.bindLong(COLUMN_COUNT + 1, id);
+                    return updateById;
+                }
+        <BLANKLINE>
+                public long insert(ContentValues values) {
+                    long columns = columns(values);
+                    if (Long.bitCount(columns) != values.size()) {
+                        return db.insert(TABLE_NAME, null, values);
+                    }
+                    SQLiteStatement statement = insertStatement(columns);
+                    bindColumns(statement, values);
+                    try {
+                        return statement.executeInsert();
+                    } catch (SQLException e) {
+                        Log.e(TABLE_NAME, "Error inserting " + values, e);
+                        return -1;
+                    }
+                }
+        <BLANKLINE>
+                public int updateById(long id, ContentValues values) {
+                    if (values.size() != COLUMN_COUNT) {
+                        return db.update(TABLE_NAME, values, BaseColumns._ID + "=" + id, null);
+                    }
+                    SQLiteStatement statement = updateByIdStatement(id);
+                    if (bindColumns(statement, values) != COLUMN_COUNT) {
+                        return db.update(TABLE_NAME, values, BaseColumns._ID + "=" + id, null);
+                    }
+                    return statement.executeUpdateDelete();
+                }
+        <BLANKLINE>
+                public int deleteById(long id) {
+                    if (deleteById == null) {
+                        deleteById = db.compileStatement(DELETE_BY_ID_SQL);
+                    }
+                    deleteById.bindLong(1, id);
+                    return deleteById.executeUpdateDelete();
+                }
+        <BLANKLINE>
+                private void close() {
+                    for (SQLiteStatement statement : inserts.values()) {
+                        statement.close();
+                    }
+                    inserts.clear();
+                    if (updateById != null) {
+                        updateById.close();
+                    }
+                    if (deleteById != null) {
+                        deleteById.close();
+                    }
+                }
+            }
+        <BLANKLINE>
+            public static void bindLabel(SQLiteStatement statement, String label) {
+                if (label == null) {
+                    statement.bindNull(1);
+                } else {
+                    statement.bindString(1, label);
+                }
+            }
+        <BLANKLINE>
+            public static void bindAddedAt(SQLiteStatement statement, Date addedAt) {
+                if (addedAt == null) {
+                    statement.bindNull(2);
+                } else {
+                    statement.bindLong(2, addedAt.getTime());
+                }
+            }
+        <BLANKLINE>
+            private static String insertSql(long columns) {
+                if (columns == ALL_COLUMNS) {
+                    return INSERT_SQL;
+                }
+                if (columns == 0) {
+                    return "INSERT INTO " + TABLE_NAME + " DEFAULT VALUES";
+                }
+                StringBuilder names = new StringBuilder();
+                StringBuilder params = new StringBuilder();
+                for (int i = 0; i < COLUMN_COUNT; i++) {
+                    if ((columns & (1L << i)) != 0) {
+                        if (names.length() > 0) {
+                            names.append(", ");
+                            params.append(", ");
+                        }
+                        names.append(COLUMNS[i]);
+                        params.append('?').append(i + 1);
+                    }
+                }
+                return "INSERT INTO " + TABLE_NAME + " (" + names + ") VALUES (" + params + ")";
+            }
+        <BLANKLINE>
+            private static long columns(ContentValues values) {
+                long columns = 0;
+                if (values.containsKey(DotColumns.LABEL)) {
+                    columns |= 1L << 0;
+                }
+                if (values.containsKey(DotColumns.ADDED_AT)) {
+                    columns |= 1L << 1;
+                }
+                return columns;
+            }
+        <BLANKLINE>
+            private static int bindColumns(SQLiteStatement statement, ContentValues values) {
+                int bound = 0;
+                if (values.containsKey(DotColumns.LABEL)) {
+                    DatabaseUtils.bindObjectToProgram(statement, 1, values.get(DotColumns.LABEL));
+                    bound++;
+                }
+                if (values.containsKey(DotColumns.ADDED_AT)) {
+                    DatabaseUtils.bindObjectToProgram(statement, 2, values.get(DotColumns.ADDED_AT));
+                    bound++;
+                }
+                return bound;
+            }
+        '''
+        out = writer or SourceWriter()
+        table = self.table
+        insert, update, delete = self.statements_sql()
+        # one insert per set of columns, keyed by a mask of the columns
+        masked = 0 < len(table.columns) <= MAX_MASKED_COLUMNS
+        out.write('    private static final String INSERT_SQL = %s;\n' % (java_string(insert)))
+        if update:
+            out.write('    private static final String UPDATE_BY_ID_SQL = %s;\n' % (java_string(update)))
+        out.write('    private static final String DELETE_BY_ID_SQL = %s;\n' % (java_string(delete)))
+        out.write('    private static final int COLUMN_COUNT = %d;\n' % (len(table.columns)))
+        if masked:
+            out.write('    private static final long ALL_COLUMNS = %s;\n' % (
+                '-1L' if len(table.columns) == 64 else '(1L << COLUMN_COUNT) - 1'))
+            out.write('    private static final String[] COLUMNS = {\n')
+            out.write(',\n'.join('        %s.%s' % (table.columns_class, column.constant) for column in table.columns))
+            out.write('\n    };\n')
+        out.write('\n')
+        out.write('    private static final ThreadLocal<Statements> STATEMENTS = new ThreadLocal<Statements>();\n\n')
+        out.write('    public static Statements statements(SQLiteDatabase db) {\n')
+        out.write('        Statements statements = STATEMENTS.get();\n')
+        out.write('        if (statements == null || statements.db != db) {\n')
+        out.write('            if (statements != null) {\n')
+        out.write('                statements.close();\n')
+        out.write('            }\n')
+        out.write('            statements = new Statements(db);\n')
+        out.write('            STATEMENTS.set(statements);\n')
+        out.write('        }\n')
+        out.write('        return statements;\n')
+        out.write('    }\n\n')
 
-    def indexs_create_string(self):
+        out.write('    public static final class Statements {\n')
+        out.write('        private final SQLiteDatabase db;\n')
+        if masked:
+            out.write('        private final Map<Long, SQLiteStatement> inserts = new HashMap<Long, SQLiteStatement>();\n')
+        else:
+            out.write('        private SQLiteStatement insert;\n')
+        if update:
+            out.write('        private SQLiteStatement updateById;\n')
+        out.write('        private SQLiteStatement deleteById;\n\n')
+        out.write('        private Statements(SQLiteDatabase db) {\n')
+        out.write('            this.db = db;\n')
+        out.write('        }\n\n')
+        if masked:
+            out.write('        public SQLiteStatement insertStatement() {\n')
+            out.write('            return insertStatement(ALL_COLUMNS);\n')
+            out.write('        }\n\n')
+            out.write('        public SQLiteStatement insertStatement(long columns) {\n')
+            out.write('            SQLiteStatement statement = inserts.get(columns);\n')
+            out.write('            if (statement == null) {\n')
+            out.write('                statement = db.compileStatement(insertSql(columns));\n')
+            out.write('                inserts.put(columns, statement);\n')
+            out.write('            }\n')
+            out.write('            statement.clearBindings();\n')
+            out.write('            return statement;\n')
+            out.write('        }\n\n')
+        else:
+            out.write('        public SQLiteStatement insertStatement() {\n')
+            out.write('            if (insert == null) {\n')
+            out.write('                insert = db.compileStatement(INSERT_SQL);\n')
+            out.write('            }\n')
+            out.write('            insert.clearBindings();\n')
+            out.write('            return insert;\n')
+            out.write('        }\n\n')
+        if update:
+            out.write('        public SQLiteStatement updateByIdStatement(long id) {\n')
+            out.write('            if (updateById == null) {\n')
+            out.write('                updateById = db.compileStatement(UPDATE_BY_ID_SQL);\n')
+            out.write('            }\n')
+            out.write('            updateById.clearBindings();\n')
+            out.write('            updateById.bindLong(COLUMN_COUNT + 1, id);\n')
+            out.write('            return updateById;\n')
+            out.write('        }\n\n')
+        out.write('        public long insert(ContentValues values) {\n')
+        if masked:
+            out.write('            long columns = columns(values);\n')
+            out.write('            if (Long.bitCount(columns) != values.size()) {\n')
+            out.write('                return db.insert(TABLE_NAME, null, values);\n')
+            out.write('            }\n')
+            out.write('            SQLiteStatement statement = insertStatement(columns);\n')
+            out.write('            bindColumns(statement, values);\n')
+        else:
+            # every column has to be bound: an unbound one would be NULL
+            out.write('            if (values.size() != COLUMN_COUNT) {\n')
+            out.write('                return db.insert(TABLE_NAME, null, values);\n')
+            out.write('            }\n')
+            out.write('            SQLiteStatement statement = insertStatement();\n')
+            out.write('            if (bindColumns(statement, values) != COLUMN_COUNT) {\n')
+            out.write('                return db.insert(TABLE_NAME, null, values);\n')
+            out.write('            }\n')
+        out.write('            try {\n')
+        out.write('                return statement.executeInsert();\n')
+        out.write('            } catch (SQLException e) {\n')
+        out.write('                Log.e(TABLE_NAME, "Error inserting " + values, e);\n')
+        out.write('                return -1;\n')
+        out.write('            }\n')
+        out.write('        }\n\n')
+        out.write('        public int updateById(long id, ContentValues values) {\n')
+        if update:
+            out.write('            if (values.size() != COLUMN_COUNT) {\n')
+            out.write('                return db.update(TABLE_NAME, values, BaseColumns._ID + "=" + id, null);\n')
+            out.write('            }\n')
+            out.write('            SQLiteStatement statement = updateByIdStatement(id);\n')
+            out.write('            if (bindColumns(statement, values) != COLUMN_COUNT) {\n')
+            out.write('                return db.update(TABLE_NAME, values, BaseColumns._ID + "=" + id, null);\n')
+            out.write('            }\n')
+            out.write('            return statement.executeUpdateDelete();\n')
+        else:
+            out.write('            return db.update(TABLE_NAME, values, BaseColumns._ID + "=" + id, null);\n')
+        out.write('        }\n\n')
+        out.write('        public int deleteById(long id) {\n')
+        out.write('            if (deleteById == null) {\n')
+        out.write('                deleteById = db.compileStatement(DELETE_BY_ID_SQL);\n')
+        out.write('            }\n')
+        out.write('            deleteById.bindLong(1, id);\n')
+        out.write('            return deleteById.executeUpdateDelete();\n')
+        out.write('        }\n\n')
+        out.write('        private void close() {\n')
+        if masked:
+            out.write('            for (SQLiteStatement statement : inserts.values()) {\n')
+            out.write('                statement.close();\n')
+            out.write('            }\n')
+            out.write('            inserts.clear();\n')
+        for name in (() if masked else ('insert',)) + (('updateById', 'deleteById') if update else ('deleteById',)):
+            out.write('            if (%s != null) {\n' % (name))
+            out.write('                %s.close();\n' % (name))
+            out.write('            }\n')
+        out.write('        }\n')
+        out.write('    }\n\n')
+
+        for position, column in enumerate(table.columns, 1):
+            fields = {'position': position, 'value': column.variable}
+            out.write('    public static void bind%s(SQLiteStatement statement, %s %s) {\n' % (
+                camel_variable_name(column.name, upper=True), column.java_type, column.variable))
+            binder = BINDERS.get(column.java_type)
+            if binder is None:
+                out.write('        DatabaseUtils.bindObjectToProgram(statement, %d, %s);\n' % (position, column.variable))
+            elif column.java_type in ('String', 'Date'):
+                out.write('        if (%s == null) {\n' % (column.variable))
+                out.write('            statement.bindNull(%d);\n' % (position))
+                out.write('        } else {\n')
+                out.write('            %s\n' % (binder % fields))
+                out.write('        }\n')
+            else:
+                out.write('        %s\n' % (binder % fields))
+            out.write('    }\n\n')
+
+        if masked:
+            out.write('    private static String insertSql(long columns) {\n')
+            out.write('        if (columns == ALL_COLUMNS) {\n')
+            out.write('            return INSERT_SQL;\n')
+            out.write('        }\n')
+            out.write('        if (columns == 0) {\n')
+            out.write('            return "INSERT INTO " + TABLE_NAME + " DEFAULT VALUES";\n')
+            out.write('        }\n')
+            out.write('        StringBuilder names = new StringBuilder();\n')
+            out.write('        StringBuilder params = new StringBuilder();\n')
+            out.write('        for (int i = 0; i < COLUMN_COUNT; i++) {\n')
+            out.write('            if ((columns & (1L << i)) != 0) {\n')
+            out.write('                if (names.length() > 0) {\n')
+            out.write('                    names.append(", ");\n')
+            out.write('                    params.append(", ");\n')
+            out.write('                }\n')
+            out.write('                names.append(COLUMNS[i]);\n')
+            out.write('                params.append(\'?\').append(i + 1);\n')
+            out.write('            }\n')
+            out.write('        }\n')
+            out.write('        return "INSERT INTO " + TABLE_NAME + " (" + names + ") VALUES (" + params + ")";\n')
+            out.write('    }\n\n')
+            out.write('    private static long columns(ContentValues values) {\n')
+            out.write('        long columns = 0;\n')
+            for position, column in enumerate(table.columns):
+                out.write('        if (values.containsKey(%s.%s)) {\n' % (table.columns_class, column.constant))
+                out.write('            columns |= 1L << %d;\n' % (position))
+                out.write('        }\n')
+            out.write('        return columns;\n')
+            out.write('    }\n\n')
+        out.write('    private static int bindColumns(SQLiteStatement statement, ContentValues values) {\n')
+        out.write('        int bound = 0;\n')
+        for position, column in enumerate(table.columns, 1):
+            constant = '%s.%s' % (table.columns_class, column.constant)
+            out.write('        if (values.containsKey(%s)) {\n' % (constant))
+            out.write('            DatabaseUtils.bindObjectToProgram(statement, %d, values.get(%s));\n' % (position, constant))
+            out.write('            bound++;\n')
+            out.write('        }\n')
+        out.write('        return bound;\n')
+        out.write('    }')
+        return out.getvalue()
+
+    @streaming
+    def indexs_create_string(self, writer=None):
         '''
         >>> table = AndroidTable('com.example.android', 'dot', [], [{'columns': ['coord_x'], 'unique': True}])
         >>> print table.indexs_create_string()
@@ -177,47 +686,14 @@ class AndroidTable(AndroidClassGenerator):
                 + " (" + DotColumns.COORD_X + "," + DotColumns.COORD_Y + ");";
         <BLANKLINE>                
         '''
-        
-        def index_var_name(table_name, column_names):
-            result = table_name.upper()
-            for column_name in column_names:
-                result += '_' + column_name.upper()
-            return result + '_INDEX_NAME'
-            
-        def index_string_value(table_name, column_names):
-            result = '"' + table_name
-            for column_name in column_names:
-                result += '__' + column_name            
-            return result + '__idx"'
-        
-        def index_create_var_name(table_name, column_names):
-            result = 'INDEX_' + table_name.upper()
-            for column_name in column_names:
-                result += '_' + column_name.upper()
-            return result + '_CREATE'
-            
-        def index_columns_string(table_name, column_names):
-            column_vars = []
-            for column_name in column_names:
-                column_vars.append(table_name.capitalize() + 'Columns.' + column_name.upper())
-            return ' + "," + '.join(column_vars)
-
-        if not self.indexes:
-            return ''
-            
-        result = ''
-        for index in self.indexes:
-            self.index_create_string_vars.append(index_create_var_name(self.name, index['columns']))
-            self.index_names.append(index_var_name(self.name, index['columns']))
-            
-            result += '    private static final String %s = %s;\n' % \
-                (index_var_name(self.name, index['columns']), (index_string_value(self.name, index['columns'])))
-            result += '    private static final String %s = "CREATE %sINDEX "\n' % \
-                (index_create_var_name(self.name, index['columns']), 'UNIQUE ' if index['unique'] else '')
-            result += '        + %s + " ON " + %sTable.TABLE_NAME\n' % \
-                (index_var_name(self.name, index['columns']), self.name.capitalize())
-            result += '        + " (" + %s + ");";\n' % (index_columns_string(self.name, index['columns']))
-        return result
+        out = writer or SourceWriter()
+        for index in self.table.indexes:
+            out.write('    private static final String %s = "%s";\n' % (index.name_constant, index.name_value))
+            out.write('    private static final String %s = "CREATE %sINDEX "\n' % \
+                (index.create_constant, 'UNIQUE ' if index.unique else ''))
+            out.write('        + %s + " ON " + %sTable.TABLE_NAME\n' % (index.name_constant, self.table.class_name))
+            out.write('        + " (" + %s + ");";\n' % (' + "," + '.join(index.column_constants)))
+        return out.getvalue()
 
 if __name__ == '__main__':
     doctest.testmod()    
\ No newline at end of file
@@ -0,0 +1,41 @@
+#!/usr/bin/env python
+
+import doctest
+
+class CaseTemplate(object):
+    '''
+    A per-table fragment with named placeholders (``%(constant)s``,
+    ``%(class_name)s``, ``%(variable)s``, ``%(name)s``), compiled once and
+    rendered for every table in one pass. Rendered fragments are cached by
+    the names they use, so a table whose names did not change reuses its
+    fragment in the next render (e.g. in --watch mode).
+
+    >>> from schema import Table
+    >>> template = CaseTemplate('case %(constant)sS: return %(class_name)sTable.TABLE_NAME;\\n')
+    >>> print ''.join(template.render_all([Table('user'), Table('user_group')])),
+    case USERS: return UserTable.TABLE_NAME;
+    case USER_GROUPS: return UserGroupTable.TABLE_NAME;
+    >>> template.render(Table('user')) is template.render(Table('user'))
+    True
+    '''
+
+    FIELDS = ('constant', 'class_name', 'variable', 'name')
+
+    def __init__(self, template):
+        self.template = template
+        # only the fields the template uses take part in the cache key
+        self.fields = tuple(field for field in self.FIELDS if '%%(%s)s' % (field) in template)
+        self.fragments = {}
+
+    def render(self, table):
+        key = tuple(getattr(table, field) for field in self.fields)
+        fragment = self.fragments.get(key)
+        if fragment is None:
+            fragment = self.fragments[key] = self.template % dict(zip(self.fields, key))
+        return fragment
+
+    def render_all(self, tables):
+        return [self.render(table) for table in tables]
+
+if __name__ == '__main__':
+    doctest.testmod()
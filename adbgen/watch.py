@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+import doctest
+import os
+import time
+import traceback
+from schema import Table
+from loader import load_schema
+from sink import DirectorySink
+from runner import global_generators, global_slice, table_links, render_tables, merge_stats
+from content_provider import reference_errors
+
+class Watcher(object):
+    '''
+    Keep the schema and the last rendered classes in memory and regenerate
+    only what a change of the schema affects.
+    '''
+
+    def __init__(self, schema_file, directories=(), interval=1.0, processes=1, sink=None):
+        self.schema_file = schema_file
+        self.directories = list(directories)
+        self.interval = interval
+        self.processes = processes
+        self.sink = sink if sink is not None else DirectorySink('.', package_layout=False)
+        self.mtimes = {}
+        self.package = None
+        self.globals = None
+        self.tables = {}
+        self.outputs = {}
+        self.table_files = []
+
+    def watched_files(self):
+        yield self.schema_file
+        for path in self.table_files:
+            yield path
+        for directory in self.directories:
+            for root, _, file_names in os.walk(directory):
+                for file_name in file_names:
+                    yield os.path.join(root, file_name)
+
+    def changed(self):
+        '''
+        Poll the watched files, returning True when any of them was added,
+        removed or modified since the last poll.
+        '''
+        mtimes = {}
+        for path in self.watched_files():
+            try:
+                mtimes[path] = os.stat(path).st_mtime
+            except OSError:
+                pass
+        if mtimes == self.mtimes:
+            return False
+        self.mtimes = mtimes
+        return True
+
+    def load(self):
+        json_object = load_schema(self.schema_file)
+        self.table_files = json_object.table_files()
+        return json_object
+
+    def diff(self, json_object):
+        '''
+        Return the tables whose definition changed and whether the provider
+        and open helper have to be rendered again.
+
+        >>> watcher = Watcher('schema.js')
+        >>> json_object = {'package': 'com.example', 'prefix': 'test', 'database': 'test.db',
+        ...     'tables': ['dot', 'dash'], 'dot': {'columns': []}, 'dash': {'columns': []}}
+        >>> tables, regenerate_globals = watcher.diff(json_object)
+        >>> print [table.name for table in tables], regenerate_globals
+        ['dot', 'dash'] True
+        >>> json_object['dash'] = {'columns': [{'name': 'x', 'type': 'integer'}]}
+        >>> tables, regenerate_globals = watcher.diff(json_object)
+        >>> print [table.name for table in tables], regenerate_globals
+        ['dash'] False
+        >>> json_object['dash'] = {'columns': [{'name': 'dot_id', 'type': 'integer', 'references': 'dot'}]}
+        >>> tables, regenerate_globals = watcher.diff(json_object)
+        >>> print [table.name for table in tables], regenerate_globals
+        ['dash'] True
+        >>> json_object['dot'] = {'columns': [{'name': 'label', 'type': 'text', 'fts': True}]}
+        >>> tables, regenerate_globals = watcher.diff(json_object)
+        >>> print [table.name for table in tables], regenerate_globals
+        ['dot'] True
+        >>> json_object['tables'].remove('dot')
+        >>> tables, regenerate_globals = watcher.diff(json_object)
+        >>> print [table.name for table in tables], regenerate_globals
+        [] True
+        '''
+        package = json_object['package']
+        tables = {}
+        changed = []
+        for name in json_object['tables']:
+            previous = self.tables.get(name)
+            if previous is not None and package == self.package and previous.definition == json_object[name]:
+                tables[name] = previous
+            else:
+                tables[name] = Table(name, json_object[name])
+                changed.append(tables[name])
+
+        globals_slice = global_slice(json_object, dict((name, table_links(table)) for name, table in tables.items()))
+        regenerate_globals = globals_slice != self.globals
+        self.package = package
+        self.globals = globals_slice
+        self.tables = tables
+        return changed, regenerate_globals
+
+    def write(self, file_name, text, report):
+        path = self.sink.path(self.package, file_name)
+        if self.outputs.get(path) == text:
+            report['skipped'].append(path)
+            return
+        # the first render of a file is compared with what is already there
+        unchanged = None if path in self.outputs else (lambda digest: digest == self.sink.digest(path))
+        written, _ = self.sink.write(self.package, file_name, text, unchanged)
+        self.outputs[path] = text
+        report['regenerated' if written else 'skipped'].append(path)
+
+    def refresh(self):
+        json_object = self.load()
+        changed, regenerate_globals = self.diff(json_object)
+        report = {'regenerated': [], 'skipped': [], 'errors': []}
+
+        jobs = [(self.package, table) for table in changed]
+        for (_, table), (files, error, stats) in zip(jobs, render_tables(jobs, self.processes)):
+            merge_stats(stats)
+            if error is not None:
+                # forget the table so the next change renders it again
+                del self.tables[table.name]
+                report['errors'].append((table.name, error))
+            for file_name, text in files:
+                self.write(file_name, text, report)
+
+        if regenerate_globals:
+            tables = [self.tables.get(name) or Table(name, json_object[name]) for name in json_object['tables']]
+            broken = reference_errors(tables)
+            if broken:
+                # forget the slice so the next change renders them again
+                self.globals = None
+                report['errors'].extend(broken)
+            else:
+                for generator in global_generators(json_object, tables):
+                    self.write(generator.file_name, generator.render(), report)
+        return report
+
+    def run(self, log):
+        while True:
+            if self.changed():
+                try:
+                    report = self.refresh()
+                except Exception:
+                    log(traceback.format_exc())
+                else:
+                    log(format_report(report))
+            time.sleep(self.interval)
+
+def format_report(report):
+    '''
+    >>> print format_report({'regenerated': ['DotTable.java'], 'skipped': ['Dot.java'], 'errors': []})
+    regenerated: DotTable.java
+    1 regenerated, 1 skipped
+    '''
+    lines = ['regenerated: %s' % (file_name) for file_name in report['regenerated']]
+    lines += ['error: %s: %s' % (table, error) for table, error in report['errors']]
+    lines.append('%d regenerated, %d skipped' % (len(report['regenerated']), len(report['skipped'])))
+    return '\n'.join(lines)
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+
+import doctest
+from cStringIO import StringIO
+
+BUFFER_SIZE = 64 * 1024
+
+class SourceWriter(object):
+    '''
+    Sink for generated source fragments. Without a stream the fragments are
+    collected in memory, otherwise they go straight to the (buffered) stream.
+
+    >>> writer = SourceWriter()
+    >>> writer.write('public class Dot {\\n')
+    >>> writer.write_all(['    int x;\\n', '}'])
+    >>> print writer.getvalue()
+    public class Dot {
+        int x;
+    }
+    >>> writer.bytes_written
+    31
+    '''
+
+    def __init__(self, stream=None, digest=None):
+        self.collecting = stream is None
+        self.stream = StringIO() if stream is None else stream
+        self.digest = digest
+        self.bytes_written = 0
+
+    def write(self, fragment):
+        self.stream.write(fragment)
+        self.bytes_written += len(fragment)
+        if self.digest is not None:
+            self.digest.update(fragment)
+
+    def write_all(self, fragments):
+        for fragment in fragments:
+            self.write(fragment)
+
+    def write_template(self, template, fragments):
+        '''
+        Stream ``template % (''.join(fragments).rstrip())`` without joining.
+
+        >>> writer = SourceWriter()
+        >>> writer.write_template('{\\n%s\\n}', ['a;\\n', 'b;\\n'])
+        >>> print writer.getvalue()
+        {
+        a;
+        b;
+        }
+        '''
+        head, tail = template.split('%s', 1)
+        self.write(head)
+        previous = None
+        for fragment in fragments:
+            if previous is not None:
+                self.write(previous)
+            previous = fragment
+        if previous is not None:
+            self.write(previous.rstrip())
+        self.write(tail)
+
+    def getvalue(self):
+        '''
+        The collected text, or None when writing to a stream.
+        '''
+        return self.stream.getvalue() if self.collecting else None
+
+    def hexdigest(self):
+        return self.digest.hexdigest()
+
+def streaming(method):
+    '''
+    Mark a ``string_attrs`` method that accepts a writer and streams its
+    fragments into it instead of returning a string.
+    '''
+    method.streaming = True
+    return method
+
+if __name__ == '__main__':
+    doctest.testmod()
@@ -1,5 +1,8 @@
+import java.io.Closeable;
 import java.util.ArrayList;
+import java.util.Iterator;
 import java.util.List;
+import java.util.NoSuchElementException;
 
 import android.content.Context;
 import android.database.Cursor;
@@ -7,21 +10,53 @@ import android.net.Uri;
 
 public class Dao<T extends ModelBase> {
 
+	public static final int DEFAULT_PAGE_SIZE = 50;
+	public static final String QUERY_PARAMETER_LIMIT = "limit";
+	public static final String QUERY_PARAMETER_OFFSET = "offset";
+	public static final String QUERY_PARAMETER_AFTER_ID = "after_id";
+	public static final String QUERY_PARAMETER_COUNT = "count";
+
 	private Context mContext;
 	private Uri mContentUri;
-	private Class<T> mClazz;
+	private ModelBase.Factory<T> mFactory;
 	private String mSelection;
 	private String mSortOrder;
+	private String mIdColumn = "_id";
+	private String[] mProjection;
+	private int mPageSize = DEFAULT_PAGE_SIZE;
+	private int mWindowStart = -1;
+	private List<T> mWindow;
 
-	public Dao(Class<T> clazz, Context context, Uri contentUri,
-			String selection, String sortOrder) {
+	/**
+	 * @param projection the columns read into the models, e.g. one of the
+	 *            generated XxxTable.PROJECTION_* constants; null reads all
+	 *            columns. Fields of columns left out keep their defaults,
+	 *            so do not update() models read with a partial projection.
+	 */
+	public Dao(ModelBase.Factory<T> factory, Context context, Uri contentUri,
+			String[] projection, String selection, String sortOrder) {
 		mContext = context;
 		mContentUri = contentUri;
-		mClazz = clazz;
+		mFactory = factory;
+		mProjection = projection;
 		mSelection = selection;
 		mSortOrder = sortOrder;
 	}
 
+	/**
+	 * Uses the FACTORY constant of the model class, looked up once here, and
+	 * only falls back to reflection for classes without one.
+	 */
+	public Dao(Class<T> clazz, Context context, Uri contentUri,
+			String[] projection, String selection, String sortOrder) {
+		this(factory(clazz), context, contentUri, projection, selection, sortOrder);
+	}
+
+	public Dao(Class<T> clazz, Context context, Uri contentUri,
+			String selection, String sortOrder) {
+		this(clazz, context, contentUri, null, selection, sortOrder);
+	}
+
 	public Dao(Class<T> clazz, Context context, Uri contentUri, String selection) {
 		this(clazz, context, contentUri, selection, null);
 	}
@@ -31,11 +66,11 @@ public class Dao<T extends ModelBase> {
 	}
 
 	public T getById(int id) {
-		String selection = mSelection == null ? "_id = " + id : "_id = " + id
-				+ " AND " + mSelection;
+		String selection = mSelection == null ? mIdColumn + " = " + id
+				: mIdColumn + " = " + id + " AND " + mSelection;
 
-		Cursor cursor = mContext.getContentResolver().query(mContentUri, null,
-				selection, null, mSortOrder);
+		Cursor cursor = mContext.getContentResolver().query(mContentUri,
+				mProjection, selection, null, mSortOrder);
 
 		if (cursor.getCount() == 0) {
 			cursor.close();
@@ -43,81 +78,246 @@ public class Dao<T extends ModelBase> {
 		}
 
 		cursor.moveToFirst();
-		T object = null;
-		try {
-			object = mClazz.newInstance();
-			object.fromCursor(cursor, mContext);
-		} catch (InstantiationException e) {
-			e.printStackTrace();
-		} catch (IllegalAccessException e) {
-			e.printStackTrace();
-		}
-
+		T object = mFactory.newInstance();
+		object.fromCursor(cursor, mContext);
 		cursor.close();
 		return object;
 	}
 
+	/**
+	 * Returns the row at the given position. Rows are read a page at a time
+	 * into a window, so walking through the positions queries once per page.
+	 */
 	public T get(int position) {
-		Cursor cursor = mContext.getContentResolver().query(mContentUri, null,
-				mSelection, null, mSortOrder);
-		cursor.moveToPosition(position);
-		try {
-			T object = mClazz.newInstance();
-			object.fromCursor(cursor, mContext);
-			cursor.close();
-			return object;
-		} catch (IllegalAccessException e) {
-			e.printStackTrace();
-		} catch (InstantiationException e) {
-			e.printStackTrace();
+		if (mWindow == null || position < mWindowStart
+				|| position >= mWindowStart + mWindow.size()) {
+			mWindowStart = position - position % mPageSize;
+			mWindow = getPage(mWindowStart, mPageSize);
 		}
-		cursor.close();
-		return null;
+		int index = position - mWindowStart;
+		return index < mWindow.size() ? mWindow.get(index) : null;
 	}
 
 	public List<T> get(String selection, String[] seletecionArgs) {
-		ArrayList<T> results = new ArrayList<T>();
-		String mergedSelection = null;
+		return query(mContentUri, mergeSelection(selection), seletecionArgs,
+				mSortOrder);
+	}
+
+	/**
+	 * Returns at most limit rows, skipping the first offset rows.
+	 */
+	public List<T> getPage(int offset, int limit) {
+		Uri uri = mContentUri.buildUpon()
+				.appendQueryParameter(QUERY_PARAMETER_OFFSET, String.valueOf(offset))
+				.appendQueryParameter(QUERY_PARAMETER_LIMIT, String.valueOf(limit))
+				.build();
+		return query(uri, mSelection, null, mSortOrder);
+	}
+
+	/**
+	 * Returns at most limit rows whose _id is greater than lastId, in _id
+	 * order. Unlike getPage the cost does not grow with the page number.
+	 */
+	public List<T> getPageAfter(long lastId, int limit) {
+		Uri uri = mContentUri.buildUpon()
+				.appendQueryParameter(QUERY_PARAMETER_AFTER_ID, String.valueOf(lastId))
+				.appendQueryParameter(QUERY_PARAMETER_LIMIT, String.valueOf(limit))
+				.build();
+		return query(uri, mSelection, null, mIdColumn);
+	}
+
+	public void setProjection(String[] projection) {
+		mProjection = projection;
+		invalidate();
+	}
+
+	/**
+	 * Sets the id column getById and getPageAfter select and sort on. A bare
+	 * _id is ambiguous on URIs joining other tables, such as the generated
+	 * XXX_WITH_YYY_CONTENT_URIs; set the qualified id of the main table
+	 * there, e.g. ContentTable.TABLE_NAME + "._id".
+	 */
+	public void setIdColumn(String idColumn) {
+		mIdColumn = idColumn;
+	}
+
+	public void setPageSize(int pageSize) {
+		mPageSize = pageSize;
+		invalidate();
+	}
+
+	/**
+	 * Drops the window of get(int), e.g. after the rows changed elsewhere.
+	 */
+	public void invalidate() {
+		mWindow = null;
+		mWindowStart = -1;
+	}
+
+	private String mergeSelection(String selection) {
 		if (selection != null && mSelection == null) {
-			mergedSelection = selection;
+			return selection;
 		} else if (selection == null && mSelection != null) {
-			mergedSelection = mSelection;
+			return mSelection;
 		} else if (selection != null && mSelection != null) {
-			mergedSelection = mSelection + " AND " + selection;
+			return mSelection + " AND " + selection;
 		}
-		Cursor cursor = mContext.getContentResolver().query(mContentUri, null,
-				mergedSelection, seletecionArgs, mSortOrder);
-		cursor.moveToFirst();
-		while (!cursor.isAfterLast()) {
-			try {
-				T object = mClazz.newInstance();
-				object.fromCursor(cursor, mContext);
-				results.add(object);
-				cursor.moveToNext();
-			} catch (IllegalAccessException e) {
-				e.printStackTrace();
-			} catch (InstantiationException e) {
-				e.printStackTrace();
-			}
+		return null;
+	}
+
+	private List<T> query(Uri uri, String selection, String[] selectionArgs,
+			String sortOrder) {
+		Cursor cursor = mContext.getContentResolver().query(uri, mProjection,
+				selection, selectionArgs, sortOrder);
+		ArrayList<T> results = new ArrayList<T>(cursor.getCount());
+		Rows rows = new Rows(cursor, false);
+		while (rows.hasNext()) {
+			results.add(rows.next());
 		}
-		cursor.close();
 		return results;
 	}
 
+	/**
+	 * Streams the rows matching the selection instead of reading them all
+	 * into a list. With reuse, every call to next() refills the same model
+	 * instance, so nothing is allocated per row; the caller must then copy
+	 * what it keeps before moving on. Close the iterator when stopping
+	 * early; it closes itself after the last row.
+	 */
+	public Rows iterate(String selection, String[] selectionArgs, boolean reuse) {
+		Cursor cursor = mContext.getContentResolver().query(mContentUri,
+				mProjection, mergeSelection(selection), selectionArgs, mSortOrder);
+		return new Rows(cursor, reuse);
+	}
+
+	public interface Visitor<T> {
+		/**
+		 * @return false to stop visiting
+		 */
+		boolean visit(T object);
+	}
+
+	/**
+	 * Visits the rows matching the selection with one reused model instance
+	 * and returns the number of rows visited.
+	 */
+	public int forEach(String selection, String[] selectionArgs,
+			Visitor<? super T> visitor) {
+		Rows rows = iterate(selection, selectionArgs, true);
+		int count = 0;
+		try {
+			while (rows.hasNext()) {
+				count++;
+				if (!visitor.visit(rows.next())) {
+					break;
+				}
+			}
+		} finally {
+			rows.close();
+		}
+		return count;
+	}
+
+	public class Rows implements Iterator<T>, Closeable {
+		private final Cursor mCursor;
+		private final T mShared;
+		private ModelBase.CursorReader mReader;
+		private boolean mHasNext;
+
+		private Rows(Cursor cursor, boolean reuse) {
+			mCursor = cursor;
+			mShared = reuse ? mFactory.newInstance() : null;
+			mHasNext = cursor.moveToFirst();
+			if (!mHasNext) {
+				close();
+			}
+		}
+
+		@Override
+		public boolean hasNext() {
+			return mHasNext;
+		}
+
+		@Override
+		public T next() {
+			if (!mHasNext) {
+				throw new NoSuchElementException();
+			}
+			T object = mShared != null ? mShared : mFactory.newInstance();
+			if (mReader == null) {
+				mReader = object.newCursorReader(mCursor);
+			}
+			mReader.read(mCursor, object, mContext);
+			mHasNext = mCursor.moveToNext();
+			if (!mHasNext) {
+				close();
+			}
+			return object;
+		}
+
+		@Override
+		public void remove() {
+			throw new UnsupportedOperationException();
+		}
+
+		@Override
+		public void close() {
+			mHasNext = false;
+			if (!mCursor.isClosed()) {
+				mCursor.close();
+			}
+		}
+	}
+
+	@SuppressWarnings("unchecked")
+	private static <T extends ModelBase> ModelBase.Factory<T> factory(final Class<T> clazz) {
+		try {
+			return (ModelBase.Factory<T>) clazz.getField("FACTORY").get(null);
+		} catch (NoSuchFieldException e) {
+			// not a generated model
+		} catch (IllegalAccessException e) {
+			// not a generated model
+		}
+		return new ModelBase.Factory<T>() {
+			@Override
+			public T newInstance() {
+				try {
+					return clazz.newInstance();
+				} catch (InstantiationException e) {
+					throw new RuntimeException(e);
+				} catch (IllegalAccessException e) {
+					throw new RuntimeException(e);
+				}
+			}
+		};
+	}
+
 	public int size() {
-		Cursor cursor = mContext.getContentResolver().query(mContentUri, null,
-				mSelection, null, null);
-		int size = cursor.getCount();
+		return size(null, null);
+	}
+
+	/**
+	 * Counts the rows matching the selection with a COUNT(*) query instead of
+	 * reading them into a cursor.
+	 */
+	public int size(String selection, String[] selectionArgs) {
+		Uri uri = mContentUri.buildUpon()
+				.appendQueryParameter(QUERY_PARAMETER_COUNT, "true").build();
+		Cursor cursor = mContext.getContentResolver().query(uri, null,
+				mergeSelection(selection), selectionArgs, null);
+		int size = cursor.moveToFirst() ? cursor.getInt(0) : 0;
 		cursor.close();
 		return size;
 	}
 
 	public Uri insert(T object) {
+		invalidate();
 		return mContext.getContentResolver().insert(mContentUri,
 				object.toContentValues());
 	}
 
 	public int update(T object) {
+		invalidate();
 		return mContext.getContentResolver().update(
 				Uri.withAppendedPath(mContentUri,
 						String.valueOf(object.getId())),
@@ -125,12 +325,14 @@ public class Dao<T extends ModelBase> {
 	}
 
 	public int delete(T object) {
+		invalidate();
 		return mContext.getContentResolver().delete(
 				Uri.withAppendedPath(mContentUri,
 						String.valueOf(object.getId())), null, null);
 	}
 
 	public void destroy() {
+		invalidate();
 		mContext.getContentResolver().delete(mContentUri, null, null);
 	}
 }
@@ -12,4 +12,29 @@ abstract public class ModelBase {
 	abstract public int getId();
 	abstract public ContentValues toContentValues();
 
+	/**
+	 * Reads rows of one cursor into models, with the column indexes
+	 * resolved once when the reader is created.
+	 */
+	public interface CursorReader {
+		void read(Cursor cursor, ModelBase object, Context context);
+	}
+
+	/**
+	 * Creates models without reflection; every generated model has one as
+	 * its FACTORY constant.
+	 */
+	public interface Factory<T extends ModelBase> {
+		T newInstance();
+	}
+
+	public CursorReader newCursorReader(Cursor cursor) {
+		return new CursorReader() {
+			@Override
+			public void read(Cursor cursor, ModelBase object, Context context) {
+				object.fromCursor(cursor, context);
+			}
+		};
+	}
+
 }
\ No newline at end of file
@@ -2,6 +2,11 @@
     "package": "com.touchsi.android.opd.model",
     "prefix": "OMU",
     "database": "omu.db",
+    "settings": {
+        "wal": true,
+        "synchronous": "normal",
+        "foreign_keys": true
+    },
     "tables": ["album", "content"],
     "album": {
         "columns": [
@@ -32,7 +37,9 @@
         "columns": [
         {
             "name": "album_id",
-            "type": "integer"
+            "type": "integer",
+            "references": "album",
+            "on_delete": "cascade"
         },
         {
             "name": "type",
@@ -44,7 +51,8 @@
         },
         {
             "name": "description",
-            "type": "varchar(1024)"
+            "type": "varchar(1024)",
+            "fts": true
         },
         {
             "name": "added_at",
@@ -66,6 +74,15 @@
             "columns": ["album_id", "type"],
             "unique": false
         }
+        ],
+        "projections": {
+            "list": ["album_id", "type", "uri"]
+        },
+        "queries": [
+        {
+            "where": ["album_id"],
+            "order_by": ["added_at desc"]
+        }
         ]
     }
 }
\ No newline at end of file
@@ -7,6 +7,6 @@ setup(name='ADBGen',
     description='Android Database Generator',
     author='Sutee Sudprasert',
     author_email='sutee.s@gmail.com',
-    scripts=['adbgen_run'],
+    scripts=['adbgen_run', 'adbgen_bench', 'adbgen_advise'],
     packages=['adbgen'],
 )
\ No newline at end of file